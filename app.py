@@ -7,22 +7,50 @@ from datetime import timedelta
 from controllers.admin_controller import admin_bp
 from controllers.user_controller import user_bp
 from controllers.auth_controller import auth_bp
+from controllers.api_controller import api_bp
+from models.availability_feed import AvailabilityFeedFull
+from models.instrumentation import instrument_app
+from models.metrics import render_metrics
 from models.parking_model import init_db
+from models.password_hasher import PasswordHasherBusy
 
 #using flask 
 app = Flask(__name__)
-app.secret_key = secrets.token_urlsafe(16)
+# Set SECRET_KEY so sessions survive restarts and work across workers; the
+# random fallback only suits a single process
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_urlsafe(16)
 
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
 
-# Initialize the database
-with app.app_context():
-    init_db()
+# Initialize the database (a no-op once the deploy ran models.migrate_db). It
+# runs outside an app context on its own connection, so nothing is left open
+# when gunicorn forks workers from a preloaded app
+init_db()
 
 # Register the blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(user_bp, url_prefix='/user')
+app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+# Per-route latency plus the model/SQL series; counters are per worker process
+instrument_app(app)
+
+@app.route("/metrics")
+def metrics():
+    token = os.environ.get("METRICS_TOKEN")
+    if token and not secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return "Unauthorized", 401
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    return "Server is busy, please try again shortly.", 503, {'Retry-After': '1'}
+
+@app.errorhandler(AvailabilityFeedFull)
+def availability_feed_full(error):
+    # The dashboard falls back to reconnecting later; it still works without live counts
+    return "Too many live availability streams, please try again later.", 503, {'Retry-After': '30'}
 
 @app.teardown_appcontext
 def close_db(error):
@@ -34,13 +62,15 @@ def close_db(error):
 # ---------------- NO TIMEOUT BLOCK FOR RENDER ----------------
 import threading
 import time
-import requests
 
 @app.route("/ping")
 def ping():
     return "pong"
 
 def keep_alive():
+    # Imported here: requests is the slowest import of the app and only this
+    # development-server thread needs it
+    import requests
     while True:
         try:
             url = os.environ.get("RENDER_EXTERNAL_URL")
@@ -0,0 +1,100 @@
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.common import compare_results, load_app, print_table, save_results, summarize
+
+# Times the occupancy analytics kernels on synthetic booking intervals (10M
+# by default, generated in memory so no database of that size is needed)
+# and, with --db, the cold end-to-end endpoint path on a generated database
+
+def synthetic_intervals(bookings, lots, days, seed):
+    # Arrivals skewed towards the day, stays of minutes to hours, the newest
+    # ones still active
+    from models.analytics import BookingIntervals
+    rng = np.random.default_rng(seed)
+    span = days * 86400
+    day = rng.integers(0, days, bookings) * 86400
+    hour = np.clip(rng.normal(13, 4, bookings), 0, 23.99) * 3600
+    start = (day + hour).astype(np.int64)
+    end = start + (rng.lognormal(4.5, 0.8, bookings) * 60).astype(np.int64) + 60
+    active = end > span
+    end = np.minimum(end, span)
+    lot = rng.integers(0, lots, bookings)
+    return BookingIntervals(None, np.arange(lots), lot, start, end, active)
+
+def kernels(intervals, days, weeks):
+    from models.analytics import dwell_histogram, hourly_heatmap, occupancy_matrix, seasonal_forecast
+    spots = np.full(len(intervals.lot_ids), 50)
+    # The forecast reads the last `weeks` weeks, as the endpoint does
+    recent = type(intervals)(None, intervals.lot_ids, intervals.lot, intervals.start - (days - weeks * 7) * 86400,
+                             intervals.end - (days - weeks * 7) * 86400, intervals.active)
+    return {
+        'occupancy_hourly_all_lots': lambda: occupancy_matrix(intervals, 3600, days * 24),
+        'occupancy_minute_one_week': lambda: occupancy_matrix(intervals, 60, 7 * 1440),
+        'peak_heatmap': lambda: hourly_heatmap(intervals, spots, 0, days * 24),
+        'dwell_histogram': lambda: dwell_histogram(intervals),
+        'demand_forecast': lambda: seasonal_forecast(recent, weeks, 24),
+    }
+
+def endpoints(end_day):
+    from models import analytics
+    start_day = (date.fromisoformat(end_day) - timedelta(days=27)).isoformat()
+    return {
+        'fetch_occupancy_series': lambda: analytics.fetch_occupancy_series(start_day, end_day, 60),
+        'fetch_peak_heatmap': lambda: analytics.fetch_peak_heatmap(start_day, end_day),
+        'fetch_dwell_distribution': lambda: analytics.fetch_dwell_distribution(start_day, end_day),
+        'fetch_demand_forecast': lambda: analytics.fetch_demand_forecast(),
+    }
+
+def run(calls, iterations, results, prefix=''):
+    for name, call in calls.items():
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - started)
+        results[prefix + name] = summarize(samples)
+        results[prefix + name]['ops_per_second'] = len(samples) / sum(samples)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the occupancy analytics over many bookings.")
+    parser.add_argument('--bookings', type=int, default=10_000_000)
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--weeks', type=int, default=8, help="forecast history")
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help="also time the uncached endpoints against this database")
+    parser.add_argument('--output', help="where to store the JSON results (default benchmarks/results/)")
+    parser.add_argument('--compare', help="earlier results file to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    if args.db:
+        app = load_app(args.db)
+        import models.analytics as analytics
+        # Every call computes: the result cache is what is being bypassed
+        analytics.ANALYTICS_CACHE_TTL = 0
+        with app.app_context():
+            from models.parking_model import get_db
+            last = get_db().execute('SELECT MAX(parking_timestamp) FROM reserve_parking_spot').fetchone()[0]
+            run(endpoints((last or date.today().isoformat())[:10]), args.iterations, results, 'db:')
+
+    started = time.perf_counter()
+    intervals = synthetic_intervals(args.bookings, args.lots, args.days, args.seed)
+    print(f"[*] {len(intervals)} synthetic bookings in {args.lots} lots over {args.days} days "
+          f"({time.perf_counter() - started:.1f}s to generate)")
+    run(kernels(intervals, args.days, args.weeks), args.iterations, results)
+    print_table(results)
+    path = save_results('analytics', vars(args), results, args.output)
+    print(f"[✓] Results stored in {path}")
+    if args.compare:
+        regressions = compare_results(results, args.compare, threshold=args.threshold)
+        if regressions:
+            print(f"[✗] {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,92 @@
+import json
+import logging
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+BENCH_PASSWORD = 'password'
+
+def load_app(db_path):
+    # app.py initialises whatever DATABASE points at on import, so the
+    # benchmark database has to be chosen before the app is loaded
+    os.environ['DATABASE'] = db_path
+    from app import app
+    # Bulk work trips the slow query log constantly; timings are reported instead
+    logging.getLogger('parking.slow_query').setLevel(logging.ERROR)
+    return app
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+def summarize(samples, errors=0):
+    # samples are durations in seconds; percentiles are reported in ms
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'errors': errors,
+        'mean_ms': total / len(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(kind, params, results, path=None):
+    # Results carry enough context (revision, parameters, versions) to tell
+    # whether two runs are comparable
+    report = {
+        'kind': kind,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'params': params,
+        'results': results,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def compare_results(results, baseline_path, metric='p95_ms', threshold=0.10, min_delta_ms=0.05):
+    # Prints per-benchmark changes against a stored run and returns the names
+    # that got slower by more than the threshold; sub-min_delta_ms changes are
+    # timer noise and never count
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, current in sorted(results.items()):
+        before = baseline.get(name)
+        if not before or not before.get(metric):
+            print(f"  {name:<40} {current[metric]:>10.3f} ms  (new)")
+            continue
+        change = (current[metric] - before[metric]) / before[metric]
+        flag = ''
+        if change > threshold and current[metric] - before[metric] > min_delta_ms:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"  {name:<40} {before[metric]:>10.3f} -> {current[metric]:>10.3f} ms  {change:+.1%}{flag}")
+    return regressions
+
+def print_table(results):
+    print(f"  {'benchmark':<40} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for name, row in sorted(results.items()):
+        print(f"  {name:<40} {row['count']:>7} {row['errors']:>5} {row['p50_ms']:>9.3f} "
+              f"{row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row.get('ops_per_second', 0):>9.1f}")
@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import BENCH_PASSWORD, load_app
+
+AREAS = ['Indiranagar', 'Koramangala', 'Whitefield', 'Jayanagar', 'Malleshwaram', 'Hebbal',
+         'Yelahanka', 'Banashankari', 'Marathahalli', 'Electronic City', 'Rajajinagar', 'Ulsoor']
+KINDS = ['Mall', 'Metro Station', 'Hospital', 'Tech Park', 'Market', 'Stadium', 'Airport', 'Plaza']
+VEHICLE_TYPES = ['car', 'bike', 'suv', 'ev']
+CENTER = (12.97, 77.59)
+INSERT_CHUNK = 10000
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def generate(lots=200, spots_per_lot=50, users=5000, years=2.0, bookings_per_day=500,
+             active_fraction=0.3, reservations_per_spot=20, seed=42):
+    # Builds a deterministic dataset through the model layer; call inside an
+    # app context pointed at an empty database
+    from models.parking_model import add_new_parking_lot, get_db, rebuild_usage_rollups
+    from models.password_hasher import hash_password
+
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    password = hash_password(BENCH_PASSWORD)
+    pincodes = [f"560{n:03d}" for n in rng.sample(range(1000), len(AREAS))]
+
+    conn = get_db()
+    conn.executemany('INSERT INTO users (name, email, password, address, pincode) VALUES (?, ?, ?, ?, ?)',
+                     ((f"Bench User {i}", f"user{i}@bench.test", password, f"{rng.randint(1, 999)} Main Road",
+                       rng.choice(pincodes)) for i in range(1, users + 1)))
+    conn.commit()
+
+    prices = {}
+    for i in range(1, lots + 1):
+        area = rng.randrange(len(AREAS))
+        price = round(rng.uniform(10, 120), 2)
+        lot_id = add_new_parking_lot(f"{AREAS[area]} {rng.choice(KINDS)} {i}", price,
+                                     f"{rng.randint(1, 200)} {AREAS[area]} Road", pincodes[area], spots_per_lot,
+                                     CENTER[0] + rng.uniform(-0.3, 0.3), CENTER[1] + rng.uniform(-0.3, 0.3))
+        prices[lot_id] = price
+    spots = {}
+    for row in conn.execute('SELECT id, lot_id FROM parking_spot'):
+        spots.setdefault(row['lot_id'], []).append(row['id'])
+    lot_ids = sorted(spots)
+
+    # Released history spread over the whole period, a few hours per stay
+    total = int(years * 365 * bookings_per_day)
+    span_minutes = int(years * 365 * 24 * 60)
+    conn.execute('BEGIN')
+    for chunk_start in range(0, total, INSERT_CHUNK):
+        rows = []
+        for _ in range(min(INSERT_CHUNK, total - chunk_start)):
+            lot_id = rng.choice(lot_ids)
+            parked = now - timedelta(minutes=rng.randint(24 * 60, span_minutes))
+            minutes = min(int(rng.expovariate(1 / 150)) + 10, 24 * 60)
+            rate = prices[lot_id]
+            rows.append((rng.choice(spots[lot_id]), rng.randint(1, users), _timestamp(parked),
+                         _timestamp(parked + timedelta(minutes=minutes)), rate, round(minutes / 60 * rate, 2)))
+        conn.executemany('''
+            INSERT INTO reserve_parking_spot (spot_id, user_id, parking_timestamp, leaving_timestamp,
+                                              parking_cost_per_unit_time, total_cost, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', rows)
+
+    # Currently parked vehicles occupy a share of the spots
+    occupied = [spot_id for lot_id in lot_ids for spot_id in spots[lot_id] if rng.random() < active_fraction]
+    conn.executemany("UPDATE parking_spot SET status = 'O', vehicle_type = ? WHERE id = ?",
+                     ((rng.choice(VEHICLE_TYPES), spot_id) for spot_id in occupied))
+    lot_of = {spot_id: lot_id for lot_id in lot_ids for spot_id in spots[lot_id]}
+    conn.executemany('''
+        INSERT INTO reserve_parking_spot (spot_id, user_id, parking_timestamp, parking_cost_per_unit_time, is_active)
+        VALUES (?, ?, ?, ?, 1)
+    ''', ((spot_id, rng.randint(1, users), _timestamp(now - timedelta(minutes=rng.randint(5, 600))),
+           prices[lot_of[spot_id]]) for spot_id in occupied))
+
+    # Future reservations: non-overlapping windows per spot with gaps between them
+    reservations = 0
+    for lot_id in lot_ids:
+        rows = []
+        for spot_id in spots[lot_id]:
+            start = now + timedelta(hours=rng.randint(2, 12))
+            for _ in range(reservations_per_spot):
+                end = start + timedelta(minutes=rng.choice([60, 120, 180, 240]))
+                rows.append((lot_id, spot_id, rng.randint(1, users), _timestamp(start), _timestamp(end),
+                             rng.choice(VEHICLE_TYPES), prices[lot_id]))
+                start = end + timedelta(hours=rng.randint(1, 24))
+        conn.executemany('''
+            INSERT INTO advance_reservation (lot_id, spot_id, user_id, start_ts, end_ts, vehicle_type, cost_per_unit_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        reservations += len(rows)
+    conn.commit()
+    rebuild_usage_rollups()
+    return {'lots': lots, 'spots': sum(len(ids) for ids in spots.values()), 'users': users,
+            'bookings': total + len(occupied), 'active': len(occupied), 'reservations': reservations}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic parking database for benchmarks.")
+    parser.add_argument('--db', default='benchmarks/bench.db')
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--spots-per-lot', type=int, default=50)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--years', type=float, default=2.0)
+    parser.add_argument('--bookings-per-day', type=int, default=500)
+    parser.add_argument('--active-fraction', type=float, default=0.3)
+    parser.add_argument('--reservations-per-spot', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help="replace an existing database")
+    args = parser.parse_args()
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} exists; pass --force to replace it")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    app = load_app(args.db)
+    started = time.perf_counter()
+    with app.app_context():
+        counts = generate(args.lots, args.spots_per_lot, args.users, args.years, args.bookings_per_day,
+                          args.active_fraction, args.reservations_per_spot, args.seed)
+    print(f"[✓] {counts['lots']} lots, {counts['spots']} spots, {counts['users']} users, "
+          f"{counts['bookings']} bookings ({counts['active']} active), {counts['reservations']} reservations in {time.perf_counter() - started:.1f}s "
+          f"-> {args.db}")
@@ -0,0 +1,206 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from benchmarks.common import BENCH_PASSWORD, compare_results, load_app, print_table, save_results, summarize
+from benchmarks.generate_data import AREAS, CENTER, VEHICLE_TYPES
+
+# Relative weight of each action in the replayed traffic
+MIX = {
+    'dashboard': 40,
+    'search': 15,
+    'nearest': 5,
+    'book': 14,
+    'release': 14,
+    'summary': 7,
+    'login': 5,
+}
+
+class TestClient:
+    # Drives the app in-process through Flask's test client; both clients
+    # return (status code, JSON body or None)
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path, params=None):
+        response = self.client.get(path, query_string=params)
+        return response.status_code, response.get_json(silent=True)
+
+    def post(self, path, data=None, json=None):
+        response = self.client.post(path, data=data, json=json)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpClient:
+    # Drives a running server, e.g. a local gunicorn, over HTTP
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def _result(self, response):
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    def get(self, path, params=None):
+        return self._result(self.session.get(self.base_url + path, params=params, allow_redirects=False))
+
+    def post(self, path, data=None, json=None):
+        return self._result(self.session.post(self.base_url + path, data=data, json=json, allow_redirects=False))
+
+class VirtualUser:
+    # One logged-in visitor; each action returns whether the answer was the
+    # expected one
+    def __init__(self, client, rng, accounts):
+        self.client = client
+        self.rng = rng
+        self.accounts = accounts
+        self.logged_in = False
+        self.lot_ids = []
+        self.bookings = []
+
+    def login(self):
+        email = f"user{self.rng.randint(1, self.accounts)}@bench.test"
+        status, _ = self.client.post('/login', data={'email': email, 'password': BENCH_PASSWORD})
+        self.logged_in = status == 302
+        self.lot_ids = []
+        self.bookings = []
+        return self.logged_in
+
+    def dashboard(self):
+        return self.client.get('/user/dashboard')[0] == 200
+
+    def search(self):
+        area = self.rng.choice(AREAS).lower()
+        return self.client.get('/user/search_parking', {'query': area[:self.rng.randint(3, len(area))]})[0] == 200
+
+    def nearest(self):
+        params = {'lat': CENTER[0] + self.rng.uniform(-0.3, 0.3), 'lon': CENTER[1] + self.rng.uniform(-0.3, 0.3)}
+        return self.client.get('/user/nearest_lots', params)[0] == 200
+
+    def summary(self):
+        return self.client.get('/user/user_summary')[0] == 200
+
+    def book(self):
+        if not self.lot_ids:
+            status, body = self.client.get('/api/v1/lots', {'limit': 50})
+            if status != 200:
+                return False
+            self.lot_ids = [lot['id'] for lot in body['lots']]
+            if not self.lot_ids:
+                return True
+        status, body = self.client.post('/api/v1/bookings', json={
+            'lot_id': self.rng.choice(self.lot_ids), 'vehicle_type': self.rng.choice(VEHICLE_TYPES)})
+        if status == 201:
+            self.bookings.append(body['id'])
+            return True
+        if status == 202:
+            # Write-behind: released once the writer has applied it
+            self.bookings.append(body['intent_id'])
+            return True
+        # A sold-out lot is a normal answer; list lots again next time
+        self.lot_ids = []
+        return status == 409
+
+    def release(self):
+        if not self.bookings:
+            return self.book()
+        booking_id = self.bookings.pop(self.rng.randrange(len(self.bookings)))
+        if isinstance(booking_id, str):
+            status, body = self.client.get(f'/api/v1/bookings/intents/{booking_id}')
+            if status != 200:
+                return False
+            if body['status'] == 'queued':
+                self.bookings.append(booking_id)
+                return True
+            if not body['booking']:
+                return body['status'] == 'rejected'
+            booking_id = body['booking']['id']
+        return self.client.post(f'/api/v1/bookings/{booking_id}/release')[0] in (200, 202)
+
+def run_user(user, deadline, samples, errors):
+    actions = list(MIX)
+    weights = [MIX[action] for action in actions]
+    while time.perf_counter() < deadline:
+        # A failed login (e.g. a 503 from the password hasher) is retried
+        # before anything else, so one rejection doesn't fail the whole session
+        action = user.rng.choices(actions, weights)[0] if user.logged_in else 'login'
+        started = time.perf_counter()
+        try:
+            ok = getattr(user, action)()
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        if ok:
+            samples[action].append(elapsed)
+        else:
+            errors[action] += 1
+
+def run_load(make_client, users, duration, accounts, seed):
+    # Every virtual user runs on its own thread with its own session and a
+    # seeded RNG, so the same seed replays the same request mix
+    per_user = [({action: [] for action in MIX}, {action: 0 for action in MIX}) for _ in range(users)]
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=run_user, args=(VirtualUser(make_client(), random.Random(seed + i), accounts),
+                                                       deadline, *per_user[i]))
+               for i in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    results = {}
+    everything = []
+    total_errors = 0
+    for action in MIX:
+        action_samples = [sample for samples, _ in per_user for sample in samples[action]]
+        action_errors = sum(errors[action] for _, errors in per_user)
+        everything.extend(action_samples)
+        total_errors += action_errors
+        results[action] = summarize(action_samples, action_errors)
+        results[action]['ops_per_second'] = len(action_samples) / wall
+    results['all'] = summarize(everything, total_errors)
+    results['all']['ops_per_second'] = len(everything) / wall
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a login/dashboard/book/release traffic mix and report latency.")
+    parser.add_argument('--db', default='benchmarks/bench.db', help="database for the in-process run")
+    parser.add_argument('--url', help="drive a running server instead, e.g. http://127.0.0.1:8000")
+    parser.add_argument('--users', type=int, default=16, help="concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--accounts', type=int, default=1000, help="log in as user1..N@bench.test")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--write-behind', action='store_true',
+                        help="in-process run with queued bookings and the booking writer on a thread")
+    parser.add_argument('--output', help="where to store the JSON results (default benchmarks/results/)")
+    parser.add_argument('--compare', help="earlier results file to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        if args.write_behind:
+            os.environ['BOOKING_WRITE_BEHIND'] = '1'
+            os.environ.setdefault('BOOKING_QUEUE_PATH', args.db + '.queue')
+        app = load_app(args.db)
+        make_client = lambda: TestClient(app)
+        if args.write_behind:
+            from models.booking_writer import run_forever
+            threading.Thread(target=run_forever, daemon=True).start()
+    results = run_load(make_client, args.users, args.duration, args.accounts, args.seed)
+    print_table(results)
+    path = save_results('load', vars(args), results, args.output)
+    print(f"[✓] {results['all']['count']} requests, {results['all']['ops_per_second']:.1f}/s; results stored in {path}")
+    if args.compare:
+        regressions = compare_results(results, args.compare, threshold=args.threshold)
+        if regressions:
+            print(f"[✗] {len(regressions)} action(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
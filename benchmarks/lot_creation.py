@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import compare_results, load_app, print_table, save_results, summarize
+
+# Times creating a lot and adding spots to it at a few sizes. Both generate
+# the numbered spots inside the database in one statement, and the
+# availability triggers fire per spot, so the cost grows with the size; the
+# ops/s column is spots inserted per second.
+SIZES = (100, 10000, 100000)
+
+def run_lot_creation(sizes, runs):
+    from models.parking_model import add_new_parking_lot, add_parking_spots, fetch_lot_availability
+    results = {}
+    problems = []
+    for size in sizes:
+        samples = {'add_new_parking_lot': [], 'add_parking_spots': []}
+        for _ in range(runs):
+            started = time.perf_counter()
+            lot_id = add_new_parking_lot(f"Bench Lot {size}", 20.0, 'Bench Road', '560001', size)
+            samples['add_new_parking_lot'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            add_parking_spots(lot_id, size, 'B')
+            samples['add_parking_spots'].append(time.perf_counter() - started)
+            if fetch_lot_availability(lot_id) != 2 * size:
+                problems.append(f"lot {lot_id} shows {fetch_lot_availability(lot_id)} free spots, not {2 * size}")
+        for name, values in samples.items():
+            result = summarize(values)
+            result['ops_per_second'] = size * len(values) / sum(values)
+            results[f"{name}:{size}"] = result
+    return results, problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time lot creation and adding spots at 100, 10k and 100k spots.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--db', help="database to create the lots in (default a temporary SQLite file)")
+    parser.add_argument('--output', help="where to store the JSON results (default benchmarks/results/)")
+    parser.add_argument('--compare', help="earlier results file to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = load_app(args.db or os.path.join(tmp, 'lots.db'))
+        with app.app_context():
+            results, problems = run_lot_creation(args.sizes, args.runs)
+    print_table(results)
+    path = save_results('lot_creation', vars(args), results, args.output)
+    print(f"[✓] Results stored in {path}")
+
+    if args.compare and compare_results(results, args.compare, threshold=args.threshold):
+        problems.append(f"lot creation regressed by more than {args.threshold:.0%}")
+    for problem in problems:
+        print(f"[✗] {problem}")
+    if problems:
+        sys.exit(1)
@@ -0,0 +1,425 @@
+import argparse
+import inspect
+import itertools
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import compare_results, load_app, print_table, save_results, summarize
+
+# Each benchmark takes the shared fixture and an RNG, does any untimed
+# preparation and returns the call to time
+BENCHMARKS = {}
+
+# Public model functions that are deliberately not timed: schema and
+# connection plumbing, one-off maintenance and calls that grow or destroy data
+NOT_BENCHMARKED = {
+    'connect', 'get_db', 'close_db', 'init_db', 'migrate', 'get_schema_version', 'invalidate_lot_cache',
+    'add_lot_change_listener', 'get_pool_stats', 'get_booking_stats', 'get_cache_stats', 'get_db_pool_stats',
+    'close_backend',
+    # Timed at 100, 10k and 100k spots on a scratch database by benchmarks/lot_creation.py
+    'add_new_parking_lot', 'add_parking_spots',
+    'add_user', 'delete_parking_lot', 'delete_parking_spot',
+    'rebuild_usage_rollups', 'check_in_reservation', 'release_overdue_bookings',
+    'archive_closed_bookings', 'fetch_archivable_months', 'fetch_archive_partitions',
+}
+
+def benchmark(name):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+def load_fixture():
+    from models.parking_model import get_db
+    conn = get_db()
+    fixture = {
+        'lot_ids': [row[0] for row in conn.execute('SELECT id FROM parking_lot')],
+        'user_ids': [row[0] for row in conn.execute('SELECT user_id FROM users')],
+        'pincodes': [row[0] for row in conn.execute('SELECT DISTINCT pincode FROM parking_lot')],
+        'words': sorted({row[0].split()[0] for row in conn.execute('SELECT prime_location_name FROM parking_lot')}),
+        'max_booking_id': conn.execute('SELECT MAX(id) FROM reserve_parking_spot').fetchone()[0] or 1,
+        'max_reservation_id': conn.execute('SELECT MAX(id) FROM advance_reservation').fetchone()[0] or 1,
+        'last_day': conn.execute('SELECT MAX(day) FROM lot_usage_daily').fetchone()[0] or date.today().isoformat(),
+        'booked': [],
+        'reserved': [],
+        'gate_entries': [],
+        'gate_sequence': itertools.count(),
+    }
+    user = conn.execute('SELECT email FROM users ORDER BY user_id LIMIT 1').fetchone()
+    fixture['email'] = user[0] if user else ''
+    if not fixture['lot_ids'] or not fixture['user_ids']:
+        raise SystemExit("The benchmark database is empty; run python -m benchmarks.generate_data first.")
+    return fixture
+
+def _days_back(fixture, days):
+    end = date.fromisoformat(fixture['last_day'])
+    return (end - timedelta(days=days)).isoformat(), end.isoformat()
+
+@benchmark('fetch_all_parking_lots')
+def bench_all_lots(fx, rng):
+    from models.parking_model import fetch_all_parking_lots
+    return fetch_all_parking_lots
+
+@benchmark('fetch_all_parking_lots:cold')
+def bench_all_lots_cold(fx, rng):
+    from models.parking_model import fetch_all_parking_lots, invalidate_lot_cache
+    invalidate_lot_cache()
+    return fetch_all_parking_lots
+
+@benchmark('search_parking_lots:text')
+def bench_search_text(fx, rng):
+    from models.parking_model import invalidate_lot_cache, search_parking_lots
+    invalidate_lot_cache()
+    word = rng.choice(fx['words']).lower()
+    return lambda: search_parking_lots(word[:rng.randint(3, len(word))])
+
+@benchmark('search_parking_lots:pincode')
+def bench_search_pincode(fx, rng):
+    from models.parking_model import invalidate_lot_cache, search_parking_lots
+    invalidate_lot_cache()
+    pincode = rng.choice(fx['pincodes'])
+    return lambda: search_parking_lots(pincode[:rng.randint(3, 6)])
+
+@benchmark('find_nearest_lots')
+def bench_nearest(fx, rng):
+    from models.parking_model import find_nearest_lots
+    latitude, longitude = 12.97 + rng.uniform(-0.3, 0.3), 77.59 + rng.uniform(-0.3, 0.3)
+    return lambda: find_nearest_lots(latitude, longitude, 10)
+
+@benchmark('locate_pincode')
+def bench_locate_pincode(fx, rng):
+    from models.parking_model import locate_pincode
+    pincode = rng.choice(fx['pincodes'])[:5] + str(rng.randint(0, 9))
+    return lambda: locate_pincode(pincode)
+
+@benchmark('fetch_lot_availability')
+def bench_lot_availability(fx, rng):
+    from models.parking_model import fetch_lot_availability, invalidate_lot_cache
+    invalidate_lot_cache()
+    lot_id = rng.choice(fx['lot_ids'])
+    return lambda: fetch_lot_availability(lot_id)
+
+@benchmark('fetch_active_bookings_by_user')
+def bench_active_bookings(fx, rng):
+    from models.parking_model import fetch_active_bookings_by_user
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: fetch_active_bookings_by_user(user_id)
+
+@benchmark('fetch_booking_history_by_user:page')
+def bench_history_page(fx, rng):
+    from models.parking_model import fetch_booking_history_by_user
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: fetch_booking_history_by_user(user_id, None, 21)
+
+@benchmark('fetch_booking_history_by_user:full')
+def bench_history_full(fx, rng):
+    from models.parking_model import fetch_booking_history_by_user
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: fetch_booking_history_by_user(user_id)
+
+@benchmark('iter_bookings:user')
+def bench_iter_bookings(fx, rng):
+    from models.parking_model import iter_bookings
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: sum(1 for _ in iter_bookings(user_id))
+
+@benchmark('fetch_parking_usage_summary')
+def bench_user_summary(fx, rng):
+    from models.parking_model import fetch_parking_usage_summary
+    user_id = rng.choice(fx['user_ids'])
+    start, end = _days_back(fx, 365)
+    return lambda: fetch_parking_usage_summary(user_id, start, end)
+
+@benchmark('fetch_lot_usage_summary')
+def bench_lot_summary(fx, rng):
+    from models.parking_model import fetch_lot_usage_summary
+    start, end = _days_back(fx, 30)
+    return lambda: fetch_lot_usage_summary(start, end)
+
+@benchmark('reprice_bookings')
+def bench_reprice(fx, rng):
+    from models.parking_model import reprice_bookings
+    start, end = _days_back(fx, 30)
+    return lambda: reprice_bookings(start, end)
+
+@benchmark('fetch_usage_timeline')
+def bench_timeline(fx, rng):
+    from models.parking_model import fetch_usage_timeline
+    start, end = _days_back(fx, 365)
+    return lambda: fetch_usage_timeline(start, end)
+
+@benchmark('fetch_occupancy_data')
+def bench_occupancy(fx, rng):
+    from models.parking_model import fetch_occupancy_data
+    return fetch_occupancy_data
+
+@benchmark('fetch_lot_capacity')
+def bench_lot_capacity(fx, rng):
+    from models.parking_model import fetch_lot_capacity
+    return fetch_lot_capacity
+
+@benchmark('iter_booking_intervals:day')
+def bench_booking_intervals(fx, rng):
+    from models.parking_model import iter_booking_intervals
+    end = date.fromisoformat(fx['last_day']) - timedelta(days=rng.randint(0, 30))
+    start = f"{end - timedelta(days=1)} 00:00:00"
+    return lambda: sum(1 for _ in iter_booking_intervals(start, f"{end} 00:00:00"))
+
+@benchmark('fetch_occupied_spots_details')
+def bench_occupied_details(fx, rng):
+    from models.parking_model import fetch_occupied_spots_details
+    return fetch_occupied_spots_details
+
+@benchmark('fetch_available_spots')
+def bench_available_spots(fx, rng):
+    from models.parking_model import fetch_available_spots
+    return fetch_available_spots
+
+@benchmark('fetch_all_users')
+def bench_all_users(fx, rng):
+    from models.parking_model import fetch_all_users
+    return fetch_all_users
+
+@benchmark('fetch_parking_spots_by_lot')
+def bench_spots_by_lot(fx, rng):
+    from models.parking_model import fetch_parking_spots_by_lot
+    lot_id = rng.choice(fx['lot_ids'])
+    return lambda: fetch_parking_spots_by_lot(lot_id)
+
+@benchmark('fetch_parking_spots_page')
+def bench_spots_page(fx, rng):
+    from models.parking_model import fetch_parking_spots_page
+    query = rng.choice(['', '', 'o', rng.choice(fx['words']).lower()])
+    return lambda: fetch_parking_spots_page(query, rng.randint(0, 1000), 50)
+
+@benchmark('reconcile_lot_availability')
+def bench_reconcile(fx, rng):
+    from models.parking_model import reconcile_lot_availability
+    return reconcile_lot_availability
+
+@benchmark('quote_parking_rate')
+def bench_quote(fx, rng):
+    from models.parking_model import quote_parking_rate
+    lot_id = rng.choice(fx['lot_ids'])
+    return lambda: quote_parking_rate(lot_id, rng.choice(('car', 'bike', 'suv', 'ev')))
+
+@benchmark('get_booking_by_id')
+def bench_booking_by_id(fx, rng):
+    from models.parking_model import get_booking_by_id
+    booking_id = rng.randint(1, fx['max_booking_id'])
+    return lambda: get_booking_by_id(booking_id)
+
+@benchmark('get_parking_lot_by_id')
+def bench_lot_by_id(fx, rng):
+    from models.parking_model import get_parking_lot_by_id
+    lot_id = rng.choice(fx['lot_ids'])
+    return lambda: get_parking_lot_by_id(lot_id)
+
+@benchmark('get_user_by_email')
+def bench_user_by_email(fx, rng):
+    from models.parking_model import get_user_by_email
+    return lambda: get_user_by_email(fx['email'])
+
+@benchmark('get_user_by_id')
+def bench_user_by_id(fx, rng):
+    from models.parking_model import get_user_by_id
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: get_user_by_id(user_id)
+
+@benchmark('book_parking_spot')
+def bench_book(fx, rng):
+    from models.parking_model import book_parking_spot
+    lot_id, user_id = rng.choice(fx['lot_ids']), rng.choice(fx['user_ids'])
+    return lambda: fx['booked'].append(book_parking_spot(lot_id, user_id, None, 'car'))
+
+@benchmark('release_parking_spot')
+def bench_release(fx, rng):
+    # Releases the spots taken by the booking benchmark, keeping occupancy steady
+    from models.parking_model import release_parking_spot
+    if not fx['booked']:
+        raise LookupError("no booking left to release")
+    booking_id = fx['booked'].pop()
+    return lambda: release_parking_spot(booking_id)
+
+def _window(rng):
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=rng.randint(2, 24 * 14))
+    return (start.strftime('%Y-%m-%d %H:%M:%S'),
+            (start + timedelta(hours=rng.randint(1, 4))).strftime('%Y-%m-%d %H:%M:%S'))
+
+@benchmark('find_free_spot_for_window')
+def bench_free_spot(fx, rng):
+    from models.parking_model import find_free_spot_for_window
+    lot_id = rng.choice(fx['lot_ids'])
+    start_ts, end_ts = _window(rng)
+    return lambda: find_free_spot_for_window(lot_id, start_ts, end_ts)
+
+@benchmark('reserve_parking_window')
+def bench_reserve(fx, rng):
+    from models.parking_model import reserve_parking_window
+    lot_id, user_id = rng.choice(fx['lot_ids']), rng.choice(fx['user_ids'])
+    start_ts, end_ts = _window(rng)
+    return lambda: fx['reserved'].append(reserve_parking_window(lot_id, user_id, start_ts, end_ts, 'car'))
+
+@benchmark('cancel_reservation')
+def bench_cancel(fx, rng):
+    # Cancels the reservations made by the reservation benchmark
+    from models.parking_model import cancel_reservation
+    if not fx['reserved']:
+        raise LookupError("no reservation left to cancel")
+    reservation_id = fx['reserved'].pop()
+    return lambda: cancel_reservation(reservation_id)
+
+@benchmark('fetch_reservations_by_user')
+def bench_user_reservations(fx, rng):
+    from models.parking_model import fetch_reservations_by_user
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: fetch_reservations_by_user(user_id)
+
+@benchmark('get_reservation_by_id')
+def bench_reservation_by_id(fx, rng):
+    from models.parking_model import get_reservation_by_id
+    reservation_id = rng.randint(1, fx['max_reservation_id'])
+    return lambda: get_reservation_by_id(reservation_id)
+
+@benchmark('fetch_overdue_bookings')
+def bench_overdue(fx, rng):
+    from models.parking_model import fetch_overdue_bookings
+    return lambda: fetch_overdue_bookings(500, 1)
+
+@benchmark('fetch_expiry_status')
+def bench_expiry_status(fx, rng):
+    from models.parking_model import fetch_expiry_status
+    return lambda: fetch_expiry_status(1)
+
+@benchmark('apply_gate_events')
+def bench_gate_events(fx, rng):
+    # Ten entries per batch plus the exits for the previous batch's entries
+    from models.parking_model import apply_gate_events
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    events = [{'event_id': f"exit-{entry_id}", 'type': 'exit', 'entry_event_id': entry_id, 'timestamp': timestamp}
+              for entry_id in fx['gate_entries']]
+    fx['gate_entries'] = []
+    for _ in range(10):
+        entry_id = f"bench-{time.time_ns()}-{next(fx['gate_sequence'])}"
+        fx['gate_entries'].append(entry_id)
+        events.append({'event_id': entry_id, 'type': 'entry', 'timestamp': timestamp,
+                       'lot_id': rng.choice(fx['lot_ids']), 'user_id': rng.choice(fx['user_ids']),
+                       'vehicle_type': 'car'})
+    return lambda: apply_gate_events(events)
+
+@benchmark('fetch_gate_events')
+def bench_gate_event_lookup(fx, rng):
+    from models.parking_model import fetch_gate_events
+    event_ids = fx['gate_entries'] or ['missing']
+    return lambda: fetch_gate_events(event_ids)
+
+@benchmark('fetch_free_spots')
+def bench_free_spots(fx, rng):
+    from models.parking_model import fetch_free_spots
+    lot_id = rng.choice(fx['lot_ids'])
+    return lambda: fetch_free_spots(lot_id)
+
+@benchmark('fetch_free_spots:cold')
+def bench_free_spots_cold(fx, rng):
+    from models.parking_model import fetch_free_spots, invalidate_lot_cache
+    invalidate_lot_cache()
+    lot_id = rng.choice(fx['lot_ids'])
+    return lambda: fetch_free_spots(lot_id)
+
+@benchmark('reconcile_spot_status')
+def bench_reconcile_spots(fx, rng):
+    from models.parking_model import reconcile_spot_status
+    return reconcile_spot_status
+
+@benchmark('queue_booking')
+def bench_queue_booking(fx, rng):
+    # The write-behind counterpart of book_parking_spot: one synced append to
+    # the queue file next to the database, nothing written to the database
+    from models import booking_queue
+    booking_queue.BOOKING_QUEUE_PATH = fx['queue_path']
+    lot_id = rng.choice(fx['lot_ids'])
+    user_id = rng.choice(fx['user_ids'])
+    return lambda: booking_queue.queue_booking(lot_id, user_id, None, 'car')
+
+@benchmark('update_parking_lot')
+def bench_update_lot(fx, rng):
+    from models.parking_model import get_parking_lot_by_id, update_parking_lot
+    lot = get_parking_lot_by_id(rng.choice(fx['lot_ids']))
+    return lambda: update_parking_lot(lot['id'], lot['prime_location_name'], lot['price'], lot['address'],
+                                      lot['pincode'], lot['maximum_number_of_spots'])
+
+@benchmark('update_user_details')
+def bench_update_user(fx, rng):
+    from models.parking_model import get_user_by_id, update_user_details
+    user = get_user_by_id(rng.choice(fx['user_ids']))
+    return lambda: update_user_details(user['user_id'], user['name'], user['address'], user['pincode'])
+
+@benchmark('update_user_password')
+def bench_update_password(fx, rng):
+    from models.parking_model import get_user_by_id, update_user_password
+    user = get_user_by_id(rng.choice(fx['user_ids']))
+    return lambda: update_user_password(user['user_id'], user['password'])
+
+def run_benchmark(factory, fixture, rng, iterations, warmup):
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(warmup + iterations):
+        try:
+            call = factory(fixture, rng)
+            begin = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - begin
+        except Exception:
+            if i >= warmup:
+                errors += 1
+            continue
+        if i >= warmup:
+            samples.append(elapsed)
+    result = summarize(samples, errors)
+    result['ops_per_second'] = len(samples) / sum(samples) if samples else 0.0
+    result['wall_seconds'] = time.perf_counter() - started
+    return result
+
+def unbenchmarked_functions():
+    import models.parking_model as parking_model
+    covered = {name.split(':')[0] for name in BENCHMARKS}
+    return sorted(name for name, value in vars(parking_model).items()
+                  if inspect.isfunction(value) and value.__module__ == parking_model.__name__
+                  and not name.startswith('_') and name not in covered and name not in NOT_BENCHMARKED)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every model function against a generated database.")
+    parser.add_argument('--db', default='benchmarks/bench.db')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="where to store the JSON results (default benchmarks/results/)")
+    parser.add_argument('--compare', help="earlier results file to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    app = load_app(args.db)
+    rng = random.Random(args.seed)
+    results = {}
+    with app.app_context():
+        fixture = load_fixture()
+        fixture['queue_path'] = args.db + '.queue'
+        # The release benchmark drains the bookings made by the booking one
+        for name, factory in BENCHMARKS.items():
+            if args.filter in name:
+                results[name] = run_benchmark(factory, fixture, rng, args.iterations, args.warmup)
+    print_table(results)
+    missing = unbenchmarked_functions()
+    if missing:
+        print(f"[!] No benchmark for: {', '.join(missing)}")
+    path = save_results('micro', vars(args), results, args.output)
+    print(f"[✓] Results stored in {path}")
+    if args.compare:
+        regressions = compare_results(results, args.compare, threshold=args.threshold)
+        if regressions:
+            print(f"[✗] {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
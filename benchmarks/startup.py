@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import compare_results, print_table, save_results, summarize
+
+# Modules that must stay out of the web process's import graph; each one is a
+# lazy import somewhere that a refactor could accidentally make eager
+FORBIDDEN_AT_STARTUP = ('requests', 'benchmarks', 'numpy')
+
+# Imports the app and serves one request in a fresh interpreter, printing
+# the timings as JSON on stdout; -X importtime writes its report to stderr
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/ping')
+served = time.perf_counter()
+import sys
+print(json.dumps({'import': imported - started, 'first_request': served - imported, 'modules': sorted(sys.modules)}))
+'''
+
+def parse_importtime(report):
+    # Lines look like 'import time: self [us] | cumulative | imported package';
+    # everything up to 'site' is interpreter startup, not the app
+    modules = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if name.strip() == 'site':
+            modules = {}
+            continue
+        modules[name.strip()] = {'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000}
+    return modules
+
+def probe(db_path):
+    env = dict(os.environ, DATABASE=db_path)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], env=env,
+                               capture_output=True, text=True, check=True)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(completed.stderr)
+
+def run_startup(runs):
+    # A migrated database is the normal worker start; a missing one also pays
+    # for creating the schema
+    samples = {'import:migrated_db': [], 'import:fresh_db': [], 'first_request': []}
+    modules = {}
+    loaded = []
+    with tempfile.TemporaryDirectory() as tmp:
+        migrated = os.path.join(tmp, 'migrated.db')
+        probe(migrated)
+        for i in range(runs):
+            timings, modules = probe(migrated)
+            samples['import:migrated_db'].append(timings['import'])
+            samples['first_request'].append(timings['first_request'])
+            loaded = timings['modules']
+            fresh, _ = probe(os.path.join(tmp, f'fresh-{i}.db'))
+            samples['import:fresh_db'].append(fresh['import'])
+    results = {name: summarize(values) for name, values in samples.items()}
+    return results, modules, loaded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app (python -X importtime).")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    parser.add_argument('--budget-ms', type=float, help="fail when the median import exceeds this")
+    parser.add_argument('--output', help="where to store the JSON results (default benchmarks/results/)")
+    parser.add_argument('--compare', help="earlier results file to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    # .pyc files exist in deployments, so compile first to measure imports, not parsing
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', 'app.py', 'models', 'controllers'], check=True)
+    results, modules, loaded = run_startup(args.runs)
+    print_table(results)
+    print("  slowest imports (cumulative ms, self ms):")
+    for name, row in sorted(modules.items(), key=lambda item: -item[1]['cumulative_ms'])[:args.top]:
+        print(f"    {row['cumulative_ms']:>8.1f}  {row['self_ms']:>7.1f}  {name}")
+    path = save_results('startup', vars(args), results, args.output)
+    print(f"[✓] Results stored in {path}")
+
+    failures = [f"{name} is imported at startup" for name in FORBIDDEN_AT_STARTUP
+                if any(module == name or module.startswith(name + '.') for module in loaded)]
+    if args.budget_ms and results['import:migrated_db']['p50_ms'] > args.budget_ms:
+        failures.append(f"median import {results['import:migrated_db']['p50_ms']:.1f} ms is over {args.budget_ms} ms")
+    if args.compare and compare_results(results, args.compare, threshold=args.threshold):
+        failures.append(f"startup regressed by more than {args.threshold:.0%}")
+    for failure in failures:
+        print(f"[✗] {failure}")
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.common import compare_results, load_app, print_table, save_results, summarize
+
+# Many processes book and release spots in a few small lots as fast as they
+# can, each with its own connections as gunicorn workers have. Afterwards no
+# spot may hold more than one active booking, and parking_spot.status must
+# agree with the bookings.
+
+def seed(app, lots, spots_per_lot, users):
+    from models.parking_model import add_new_parking_lot, add_user
+    with app.app_context():
+        for i in range(1, lots + 1):
+            add_new_parking_lot(f"Stress Lot {i}", 20.0, f"{i} Stress Road", '560001', spots_per_lot)
+        for i in range(1, users + 1):
+            add_user(f"Stress User {i}", f"stress{i}@bench.test", 'x', 'Stress Road', '560001')
+
+def worker(db_path, lots, users, bookings, hold, seed, start, results):
+    # Books until `bookings` succeeded, releasing its oldest booking once it
+    # holds `hold` of them, so spots keep changing hands
+    app = load_app(db_path)
+    from models.parking_model import book_parking_spot, get_booking_stats, release_parking_spot
+    rng = random.Random(seed)
+    samples = []
+    held = []
+    failures = {}
+
+    def release(booking_id):
+        try:
+            release_parking_spot(booking_id)
+        except Exception as e:
+            failures[f"release: {e}"] = failures.get(f"release: {e}", 0) + 1
+
+    start.wait()
+    with app.app_context():
+        while len(samples) < bookings:
+            started = time.perf_counter()
+            try:
+                held.append(book_parking_spot(rng.randint(1, lots), rng.randint(1, users), None, 'car', 20.0))
+                samples.append(time.perf_counter() - started)
+            except Exception as e:
+                failures[str(e)] = failures.get(str(e), 0) + 1
+                if not held:
+                    time.sleep(0.001)
+            if len(held) >= hold or (held and rng.random() < 0.3):
+                release(held.pop(0))
+        for booking_id in held:
+            release(booking_id)
+    results.put((samples, failures, get_booking_stats()))
+
+def run_stress(db_path, processes, bookings, lots, spots_per_lot, users, hold):
+    app = load_app(db_path)
+    seed(app, lots, spots_per_lot, users)
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(db_path, lots, users, bookings, hold, i, start, results))
+               for i in range(processes)]
+    for process in workers:
+        process.start()
+    # Let every worker import the app before the clock starts
+    time.sleep(2.0)
+    started = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - started
+    for process in workers:
+        process.join()
+    samples = [sample for outcome in outcomes for sample in outcome[0]]
+    failures = {}
+    stats = {}
+    for _, worker_failures, worker_stats in outcomes:
+        for message, count in worker_failures.items():
+            failures[message] = failures.get(message, 0) + count
+        for key in ('booked', 'sold_out', 'retries', 'busy', 'errors'):
+            stats[key] = stats.get(key, 0) + worker_stats[key]
+    result = summarize(samples, sum(failures.values()))
+    result['ops_per_second'] = len(samples) / elapsed
+    return {'book_parking_spot': result}, failures, stats, check_invariants(app)
+
+def check_invariants(app):
+    from models.parking_model import get_db, reconcile_spot_status
+    with app.app_context():
+        conn = get_db()
+        doubled = conn.execute('''
+            SELECT spot_id, COUNT(*) AS active FROM reserve_parking_spot
+            WHERE is_active = 1
+            GROUP BY spot_id
+            HAVING COUNT(*) > 1
+        ''').fetchall()
+        problems = [f"spot {row['spot_id']} has {row['active']} active bookings" for row in doubled]
+        problems += [f"spot {row['spot_id']} is '{row['status']}' with {row['active_bookings']} active bookings"
+                     for row in reconcile_spot_status()]
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book and release spots from many processes at once and check "
+                                                 "that no spot is handed out twice.")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() * 4)
+    parser.add_argument('--bookings', type=int, default=200, help="successful bookings per process")
+    parser.add_argument('--lots', type=int, default=2)
+    parser.add_argument('--spots-per-lot', type=int, default=10)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--hold', type=int, default=3, help="bookings a process holds before releasing one")
+    parser.add_argument('--db', help="database to create the lots in (default a temporary SQLite file; "
+                                     "a postgresql:// URL must point at an empty database)")
+    parser.add_argument('--output', help="where to store the JSON results (default benchmarks/results/)")
+    parser.add_argument('--compare', help="earlier results file to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'stress.db')
+        results, failures, stats, problems = run_stress(db_path, args.processes, args.bookings, args.lots,
+                                                        args.spots_per_lot, args.users, args.hold)
+    print_table(results)
+    print(f"  booked {stats['booked']}, sold out {stats['sold_out']}, retries {stats['retries']}, "
+          f"busy {stats['busy']}, other errors {stats['errors']}")
+    for message, count in sorted(failures.items(), key=lambda item: -item[1]):
+        print(f"    {count:>7}  {message}")
+    path = save_results('stress_booking', vars(args), results, args.output)
+    print(f"[✓] Results stored in {path}")
+
+    if args.compare and compare_results(results, args.compare, threshold=args.threshold):
+        problems.append(f"bookings regressed by more than {args.threshold:.0%}")
+    for problem in problems:
+        print(f"[✗] {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"[✓] {results['book_parking_spot']['count']} bookings at "
+          f"{results['book_parking_spot']['ops_per_second']:.1f}/s, no spot booked twice.")
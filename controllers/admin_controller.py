@@ -1,21 +1,31 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, make_response
+from flask import Blueprint, render_template, session, redirect, url_for, request, make_response, jsonify
 from functools import wraps
+from datetime import date, timedelta
+import json
+from models.booking_export import export_response
+from models.gate_ingest import ingest_gate_events
 from models.parking_model import (
-    get_db,
-    fetch_all_parking_lots,
     add_new_parking_lot,
+    add_parking_spots,
     get_parking_lot_by_id,
     update_parking_lot,
-    delete_parking_lot,
-    fetch_parking_spots_by_lot,
+    fetch_parking_spots_page,
     delete_parking_spot,
     fetch_occupied_spots_details,
     fetch_occupancy_data,
-    fetch_all_users
+    fetch_lot_usage_summary,
+    fetch_usage_timeline,
+    fetch_all_users,
+    iter_bookings
 )
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+SPOTS_PAGE_SIZE = 50
+MAX_SPOTS_PAGE_SIZE = 500
+SUMMARY_DEFAULT_DAYS = 30
+ANALYTICS_DEFAULT_DAYS = 28
+
 def admin_protected(view):
     @wraps(view)
     def wrapped(*args, **kwargs):
@@ -42,7 +52,10 @@ def add_parking():
         address = request.form['address']
         pincode = request.form['pincode']
         maximum_number_of_spots = request.form['maximum_number_of_spots']
-        add_new_parking_lot(prime_location_name, float(price), address, pincode, int(maximum_number_of_spots))
+        latitude = request.form.get('latitude', type=float)
+        longitude = request.form.get('longitude', type=float)
+        add_new_parking_lot(prime_location_name, float(price), address, pincode, int(maximum_number_of_spots),
+                            latitude, longitude)
         return redirect(url_for('admin.admin_dashboard'))
     return render_template('add_parking.html')
 
@@ -56,6 +69,8 @@ def edit_parking():
         address = request.form.get('address')
         pincode = request.form.get('pincode')
         maximum_number_of_spots = request.form.get('maximum_number_of_spots')
+        latitude = request.form.get('latitude', type=float)
+        longitude = request.form.get('longitude', type=float)
         existing_lot = get_parking_lot_by_id(lot_id)
         if existing_lot:
             prime_location_name = prime_location_name or existing_lot['prime_location_name']
@@ -63,39 +78,47 @@ def edit_parking():
             address = address or existing_lot['address']
             pincode = pincode or existing_lot['pincode']
             maximum_number_of_spots = maximum_number_of_spots or existing_lot['maximum_number_of_spots']
-            update_parking_lot(lot_id, prime_location_name, float(price), address, pincode, int(maximum_number_of_spots))
+            update_parking_lot(lot_id, prime_location_name, float(price), address, pincode, int(maximum_number_of_spots),
+                               latitude, longitude)
             return redirect(url_for('admin.admin_dashboard'))
         else:
             return render_template('edit_parking.html', error="Parking Lot ID not found.")
     return render_template('edit_parking.html')
 
+@admin_bp.route('/add_spots', methods=['GET', 'POST'])
+@admin_protected
+def add_spots():
+    if request.method == 'POST':
+        try:
+            lot_id = int(request.form.get('lot_id', ''))
+            count = int(request.form.get('count', ''))
+            start = int(request.form['start']) if request.form.get('start', '').strip() else None
+        except ValueError:
+            return render_template('add_spots.html',
+                                   error="Lot ID, number of spots and first spot number must be whole numbers.")
+        if not get_parking_lot_by_id(lot_id):
+            return render_template('add_spots.html', error="Parking Lot ID not found.")
+        if count < 1:
+            return render_template('add_spots.html', error="Number of spots must be at least 1.")
+        if start is not None and start < 1:
+            return render_template('add_spots.html', error="First spot number must be at least 1.")
+        prefix = request.form.get('prefix', '').strip() or 'A'
+        vehicle_type = request.form.get('vehicle_type', '').strip() or None
+        is_handicap_accessible = bool(request.form.get('is_handicap_accessible'))
+        add_parking_spots(lot_id, count, prefix, start, vehicle_type, is_handicap_accessible)
+        return redirect(url_for('admin.admin_dashboard'))
+    return render_template('add_spots.html')
+
 @admin_bp.route('/view_parking_spots')
 @admin_protected
 def view_parking_spots():
     query = request.args.get('query', '').strip().lower()
-    lots = fetch_all_parking_lots()
-    spots = []
-
-    for lot in lots:
-        lot_spots = fetch_parking_spots_by_lot(lot['id'])
-        for spot in lot_spots:
-            lot_name = lot['prime_location_name']
-            status = spot['status']
-            if query:
-                if query in lot_name.lower() or query in status.lower():
-                    spots.append({
-                        'id': spot['id'],
-                        'lot_name': lot_name,
-                        'status': status,
-                    })
-            else:
-                spots.append({
-                    'id': spot['id'],
-                    'lot_name': lot_name,
-                    'status': status,
-                })
-
-    return render_template('view_parking_spots.html', spots=spots)
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', SPOTS_PAGE_SIZE, type=int), 1), MAX_SPOTS_PAGE_SIZE)
+    spots = fetch_parking_spots_page(query, after, limit + 1)
+    next_after = spots[limit - 1]['id'] if len(spots) > limit else None
+    return render_template('view_parking_spots.html', spots=spots[:limit], query=query,
+                           limit=limit, next_after=next_after)
 
 
 @admin_bp.route('/delete_spot/<int:spot_id>')
@@ -119,7 +142,98 @@ def admin_summary():
     for row in occupancy_data:
         labels.append(row['lot_name'])
         data.append(row['occupied_count'])
-    return render_template('admin_summary.html', labels=labels, data=data)
+
+    end_day = _parse_day(request.args.get('end')) or date.today()
+    start_day = _parse_day(request.args.get('start')) or end_day - timedelta(days=SUMMARY_DEFAULT_DAYS)
+    usage = fetch_lot_usage_summary(start_day.isoformat(), end_day.isoformat())
+    timeline = fetch_usage_timeline(start_day.isoformat(), end_day.isoformat())
+    return render_template('admin_summary.html', labels=labels, data=data,
+                           start=start_day.isoformat(), end=end_day.isoformat(),
+                           usage_labels=[row['lot_name'] for row in usage],
+                           usage_bookings=[row['bookings'] for row in usage],
+                           usage_hours=[row['occupied_hours'] for row in usage],
+                           usage_revenue=[row['revenue'] for row in usage],
+                           timeline_labels=[row['day'] for row in timeline],
+                           timeline_bookings=[row['bookings'] for row in timeline],
+                           timeline_revenue=[row['revenue'] for row in timeline])
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+@admin_bp.route('/gate_events', methods=['POST'])
+@admin_protected
+def gate_events():
+    # Accepts a JSON list of events, {"events": [...]}, or a JSON-lines body
+    payload = request.get_json(silent=True)
+    if payload is None:
+        lines = request.get_data(as_text=True).splitlines()
+        try:
+            payload = [json.loads(line) for line in lines if line.strip()]
+        except ValueError:
+            return jsonify(error="Body must be JSON or JSON lines."), 400
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        return jsonify(error="Expected a list of events."), 400
+    stats = ingest_gate_events(event if isinstance(event, dict) else {} for event in events)
+    return jsonify(stats)
+
+@admin_bp.route('/export_bookings')
+@admin_protected
+def export_bookings():
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    rows = iter_bookings(None, start, end)
+    return export_response(rows, request.args.get('format', 'csv'), 'bookings')
+
+def _analytics_window(default_days):
+    end_day = _parse_day(request.args.get('end')) or date.today()
+    start_day = _parse_day(request.args.get('start')) or end_day - timedelta(days=default_days - 1)
+    return start_day.isoformat(), end_day.isoformat()
+
+def _analytics_response(compute):
+    try:
+        return jsonify(compute())
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+# NumPy is only imported by these chart endpoints, not at worker start
+
+@admin_bp.route('/analytics/occupancy')
+@admin_protected
+def analytics_occupancy():
+    from models.analytics import fetch_occupancy_series
+    start, end = _analytics_window(7)
+    resolution = request.args.get('resolution', 60, type=int)
+    lot_id = request.args.get('lot_id', type=int)
+    return _analytics_response(lambda: fetch_occupancy_series(start, end, resolution, lot_id))
+
+@admin_bp.route('/analytics/heatmap')
+@admin_protected
+def analytics_heatmap():
+    from models.analytics import fetch_peak_heatmap
+    start, end = _analytics_window(ANALYTICS_DEFAULT_DAYS)
+    lot_id = request.args.get('lot_id', type=int)
+    return _analytics_response(lambda: fetch_peak_heatmap(start, end, lot_id))
+
+@admin_bp.route('/analytics/dwell')
+@admin_protected
+def analytics_dwell():
+    from models.analytics import fetch_dwell_distribution
+    start, end = _analytics_window(ANALYTICS_DEFAULT_DAYS)
+    lot_id = request.args.get('lot_id', type=int)
+    return _analytics_response(lambda: fetch_dwell_distribution(start, end, lot_id))
+
+@admin_bp.route('/analytics/forecast')
+@admin_protected
+def analytics_forecast():
+    from models.analytics import FORECAST_WEEKS, fetch_demand_forecast
+    hours = request.args.get('hours', 24, type=int)
+    weeks = request.args.get('weeks', FORECAST_WEEKS, type=int)
+    lot_id = request.args.get('lot_id', type=int)
+    return _analytics_response(lambda: fetch_demand_forecast(hours, weeks, lot_id))
 
 @admin_bp.route('/view_users')
 @admin_protected
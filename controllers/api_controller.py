@@ -0,0 +1,261 @@
+from flask import Blueprint, jsonify, request, session
+from functools import wraps
+from models.parking_model import (
+    book_parking_spot,
+    cancel_reservation,
+    check_in_reservation,
+    fetch_active_bookings_by_user,
+    fetch_all_parking_lots,
+    fetch_reservations_by_user,
+    find_free_spot_for_window,
+    get_booking_by_id,
+    get_reservation_by_id,
+    quote_parking_rate,
+    release_parking_spot,
+    reserve_parking_window,
+    search_parking_lots
+)
+from models import booking_queue
+from controllers.user_controller import parse_window_time
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+LOTS_RESULT_LIMIT = 50
+MAX_BATCH_SIZE = 100
+RESERVATION_STATUSES = {'R': 'reserved', 'C': 'cancelled', 'U': 'checked_in'}
+
+def api_protected(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if session.get('user_id') is None:
+            return jsonify(error="Authentication required."), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+def lot_json(lot):
+    return {
+        'id': lot['id'],
+        'name': lot['prime_location_name'],
+        'address': lot['address'],
+        'pincode': lot['pincode'],
+        'price': lot['price'],
+        'availability': lot['availability'],
+    }
+
+def booking_json(booking):
+    return {
+        'id': booking['id'],
+        'lot_id': booking['lot_id'],
+        'lot_name': booking['lot_name'],
+        'spot_id': booking['spot_id'],
+        'spot_number': booking['spot_number'],
+        'vehicle_type': booking['vehicle_type'],
+        'parking_timestamp': booking['parking_timestamp'],
+        'leaving_timestamp': booking['leaving_timestamp'],
+        'cost_per_unit_time': booking['parking_cost_per_unit_time'],
+        'total_cost': booking['total_cost'],
+        'is_active': bool(booking['is_active']),
+    }
+
+def reservation_json(reservation):
+    return {
+        'id': reservation['id'],
+        'lot_id': reservation['lot_id'],
+        'lot_name': reservation['lot_name'],
+        'spot_id': reservation['spot_id'],
+        'spot_number': reservation['spot_number'],
+        'vehicle_type': reservation['vehicle_type'],
+        'start': reservation['start_ts'],
+        'end': reservation['end_ts'],
+        'cost_per_unit_time': reservation['cost_per_unit_time'],
+        'status': RESERVATION_STATUSES.get(reservation['status'], reservation['status']),
+        'booking_id': reservation['booking_id'],
+    }
+
+def batch_result(status, body):
+    if status >= 400:
+        return {'status': status, 'error': body['error']}
+    return {'status': status, 'booking': body}
+
+def _book(item):
+    # Returns (status code, body) so single and batch requests share one path;
+    # the rate is quoted by the server and locked in with the booking
+    try:
+        lot_id = int(item['lot_id'])
+        vehicle_type = str(item['vehicle_type']).strip()
+    except (KeyError, TypeError, ValueError):
+        return 400, {'error': "lot_id and vehicle_type are required."}
+    # An optional spot the user picked; any free spot if it is taken
+    try:
+        spot_id = int(item['spot_id']) if item.get('spot_id') is not None else None
+    except (TypeError, ValueError):
+        return 400, {'error': "spot_id must be a whole number."}
+    try:
+        if booking_queue.WRITE_BEHIND:
+            # Accepted with a provisional spot; GET /bookings/intents/<id> has the outcome
+            return 202, booking_queue.queue_booking(lot_id, session['user_id'], spot_id, vehicle_type)
+        booking_id = book_parking_spot(lot_id, session['user_id'], spot_id, vehicle_type)
+    except Exception as e:
+        return 409, {'error': str(e)}
+    return 201, booking_json(get_booking_by_id(booking_id))
+
+def _release(booking_id):
+    booking = get_booking_by_id(booking_id)
+    if not booking or booking['user_id'] != session['user_id']:
+        return 404, {'error': "Booking not found."}
+    if booking_queue.WRITE_BEHIND:
+        if not booking['is_active']:
+            return 409, {'error': "Booking already released."}
+        return 202, booking_queue.queue_release(booking_id, session['user_id'])
+    try:
+        release_parking_spot(booking_id)
+    except Exception as e:
+        return 409, {'error': str(e)}
+    return 200, booking_json(get_booking_by_id(booking_id))
+
+def _batch_items(key):
+    items = (request.get_json(silent=True) or {}).get(key)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify(error=f"'{key}' must be a non-empty list."), 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return None, (jsonify(error=f"At most {MAX_BATCH_SIZE} items per batch."), 400)
+    return items, None
+
+@api_bp.route('/lots', methods=['GET'])
+@api_protected
+def lots():
+    query = request.args.get('query', '').strip().lower()
+    limit = min(max(request.args.get('limit', LOTS_RESULT_LIMIT, type=int), 1), LOTS_RESULT_LIMIT)
+    results = search_parking_lots(query, limit) if query else fetch_all_parking_lots()[:limit]
+    return jsonify(lots=[lot_json(lot) for lot in results])
+
+@api_bp.route('/bookings', methods=['GET'])
+@api_protected
+def bookings():
+    active = fetch_active_bookings_by_user(session['user_id'])
+    return jsonify(bookings=[booking_json(booking) for booking in active])
+
+@api_bp.route('/bookings', methods=['POST'])
+@api_protected
+def create_booking():
+    status, body = _book(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+@api_bp.route('/bookings/<int:booking_id>/release', methods=['POST'])
+@api_protected
+def release_booking(booking_id):
+    status, body = _release(booking_id)
+    return jsonify(body), status
+
+@api_bp.route('/bookings/intents/<intent_id>', methods=['GET'])
+@api_protected
+def booking_intent(intent_id):
+    # Outcome of a write-behind booking or release: queued, applied, rejected
+    # (no free spot left, or the booking was already released) or failed
+    intent = booking_queue.get_intent(intent_id)
+    if not intent or intent['user_id'] != session['user_id']:
+        return jsonify(error="Booking intent not found."), 404
+    booking = get_booking_by_id(intent['booking_id']) if intent['booking_id'] else None
+    return jsonify(intent_id=intent['intent_id'], type=intent['event']['type'], status=intent['status'],
+                   error=intent['error'], booking=booking_json(booking) if booking else None)
+
+@api_bp.route('/bookings/batch', methods=['POST'])
+@api_protected
+def create_bookings_batch():
+    items, error = _batch_items('bookings')
+    if error:
+        return error
+    results = []
+    for item in items:
+        status, body = _book(item if isinstance(item, dict) else {})
+        results.append(batch_result(status, body))
+    return jsonify(results=results), 207
+
+@api_bp.route('/bookings/release_batch', methods=['POST'])
+@api_protected
+def release_bookings_batch():
+    items, error = _batch_items('booking_ids')
+    if error:
+        return error
+    results = []
+    for booking_id in items:
+        if not isinstance(booking_id, int):
+            results.append(batch_result(400, {'error': "Booking ids must be integers."}))
+            continue
+        status, body = _release(booking_id)
+        results.append(batch_result(status, body))
+    return jsonify(results=results), 207
+
+@api_bp.route('/lots/<int:lot_id>/free_spot', methods=['GET'])
+@api_protected
+def free_spot(lot_id):
+    try:
+        start_ts = parse_window_time(request.args.get('start', ''))
+        end_ts = parse_window_time(request.args.get('end', ''))
+    except ValueError:
+        return jsonify(error="start and end must be ISO timestamps."), 400
+    spot = find_free_spot_for_window(lot_id, start_ts, end_ts)
+    if spot is None:
+        return jsonify(available=False)
+    return jsonify(available=True, spot_id=spot['id'], spot_number=spot['spot_number'])
+
+@api_bp.route('/lots/<int:lot_id>/quote', methods=['GET'])
+@api_protected
+def quote(lot_id):
+    # The per-hour rate a booking made now (or starting at `start`) would lock in
+    vehicle_type = request.args.get('vehicle_type', '').strip()
+    try:
+        start_ts = parse_window_time(request.args['start']) if request.args.get('start') else None
+    except ValueError:
+        return jsonify(error="start must be an ISO timestamp."), 400
+    rate = quote_parking_rate(lot_id, vehicle_type, start_ts)
+    if rate is None:
+        return jsonify(error="Parking lot not found."), 404
+    return jsonify(lot_id=lot_id, vehicle_type=vehicle_type, start=start_ts, cost_per_unit_time=rate)
+
+@api_bp.route('/reservations', methods=['GET'])
+@api_protected
+def reservations():
+    upcoming = fetch_reservations_by_user(session['user_id'])
+    return jsonify(reservations=[reservation_json(reservation) for reservation in upcoming])
+
+@api_bp.route('/reservations', methods=['POST'])
+@api_protected
+def create_reservation():
+    item = request.get_json(silent=True) or {}
+    try:
+        lot_id = int(item['lot_id'])
+        start_ts = parse_window_time(str(item['start']))
+        end_ts = parse_window_time(str(item['end']))
+        vehicle_type = str(item['vehicle_type']).strip()
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error="lot_id, start, end and vehicle_type are required."), 400
+    try:
+        reservation_id = reserve_parking_window(lot_id, session['user_id'], start_ts, end_ts, vehicle_type)
+    except Exception as e:
+        return jsonify(error=str(e)), 409
+    return jsonify(reservation_json(get_reservation_by_id(reservation_id))), 201
+
+@api_bp.route('/reservations/<int:reservation_id>/cancel', methods=['POST'])
+@api_protected
+def cancel_reservation_api(reservation_id):
+    reservation = get_reservation_by_id(reservation_id)
+    if not reservation or reservation['user_id'] != session['user_id']:
+        return jsonify(error="Reservation not found."), 404
+    try:
+        cancel_reservation(reservation_id)
+    except Exception as e:
+        return jsonify(error=str(e)), 409
+    return jsonify(reservation_json(get_reservation_by_id(reservation_id)))
+
+@api_bp.route('/reservations/<int:reservation_id>/check_in', methods=['POST'])
+@api_protected
+def check_in_reservation_api(reservation_id):
+    reservation = get_reservation_by_id(reservation_id)
+    if not reservation or reservation['user_id'] != session['user_id']:
+        return jsonify(error="Reservation not found."), 404
+    try:
+        booking_id = check_in_reservation(reservation_id)
+    except Exception as e:
+        return jsonify(error=str(e)), 409
+    return jsonify(booking_json(get_booking_by_id(booking_id))), 201
@@ -1,8 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, make_response
-from models.parking_model import get_user_by_email, add_user
+from models.parking_model import get_user_by_email, add_user, update_user_password
+from models.password_hasher import hash_password, check_password, needs_rehash
 from functools import wraps
 from datetime import timedelta
-import bcrypt
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -30,7 +30,7 @@ def signup():
         name = request.form['name']
         email = request.form['email']
         password = request.form['password']
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed_password = hash_password(password)
         address = request.form['address']
         pincode = request.form['pincode']
         add_user(name, email, hashed_password, address, pincode)
@@ -44,14 +44,16 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
-        if email == ADMIN_EMAIL and bcrypt.checkpw(password.encode(), ADMIN_PASSWORD.encode()):
+        if email == ADMIN_EMAIL and check_password(password, ADMIN_PASSWORD):
             session['user_id'] = -1
             session['username'] = ADMIN_EMAIL
             session.permanent = True
             return redirect(url_for('admin.admin_dashboard'))
 
         user = get_user_by_email(email)
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+        if user and check_password(password, user['password']):
+            if needs_rehash(user['password']):
+                update_user_password(user['user_id'], hash_password(password))
             session['user_id'] = user['user_id']
             session['username'] = user['email']
             session.permanent = True
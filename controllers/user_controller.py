@@ -1,22 +1,43 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, flash, make_response
+from flask import Blueprint, render_template, session, redirect, url_for, request, flash, make_response, jsonify, Response
 from functools import wraps
+import json
+import queue
+from datetime import datetime
 from models.parking_model import (
+    cancel_reservation,
+    check_in_reservation,
     fetch_all_parking_lots,
     fetch_booking_history_by_user,
     fetch_parking_usage_summary,
     fetch_active_bookings_by_user,
+    fetch_reservations_by_user,
+    find_nearest_lots,
+    locate_pincode,
     release_parking_spot,
+    reserve_parking_window,
+    search_parking_lots,
     book_parking_spot,
+    get_booking_by_id,
     get_parking_lot_by_id,
+    get_reservation_by_id,
     get_user_by_email,
     get_user_by_id,
+    iter_bookings,
     update_user_details,
     update_user_password
 )
-import bcrypt
+from models import booking_queue
+from models.availability_feed import availability_feed
+from models.password_hasher import hash_password, check_password
+from models.booking_export import export_response
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
+SEARCH_RESULT_LIMIT = 50
+NEAREST_LOTS_LIMIT = 50
+STREAM_KEEPALIVE_SECONDS = 15
+HISTORY_PAGE_SIZE = 20
+
 def user_protected(view):
     @wraps(view)
     def wrapped(*args, **kwargs):
@@ -34,8 +55,28 @@ def user_protected(view):
 def user_dashboard():
     lots = fetch_all_parking_lots()
     user = get_user_by_id(session.get('user_id'))
-    history = fetch_booking_history_by_user(session['user_id'])
-    return render_template('user_dashboard.html', lots=lots, history=history, name=user['name'])
+    history, older = history_page()
+    return render_template('user_dashboard.html', lots=lots, history=history, older=older, name=user['name'])
+
+def history_page():
+    # One keyset page of the user's history plus the cursor for the next one
+    before_ts = request.args.get('before_ts')
+    before_id = request.args.get('before_id', type=int)
+    before = (before_ts, before_id) if before_ts and before_id is not None else None
+    history = fetch_booking_history_by_user(session['user_id'], before, HISTORY_PAGE_SIZE + 1)
+    older = None
+    if len(history) > HISTORY_PAGE_SIZE:
+        last = history[HISTORY_PAGE_SIZE - 1]
+        older = {'before_ts': last['parking_timestamp'], 'before_id': last['id']}
+    return history[:HISTORY_PAGE_SIZE], older
+
+@user_bp.route('/export_history')
+@user_protected
+def export_history():
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    rows = iter_bookings(session['user_id'], start, end)
+    return export_response(rows, request.args.get('format', 'csv'), 'parking_history')
 
 @user_bp.route('/book_parking', methods=['GET', 'POST'])
 @user_protected
@@ -48,8 +89,16 @@ def book_parking():
         lot_id = int(request.form.get('lot_id'))
         spot_id = int(request.form.get('spot_id'))  
         vehicle_type = request.form.get('vehicle_type').strip()
-        cost_per_unit_time = float(request.form.get('cost_per_unit_time'))
-        book_parking_spot(lot_id, session['user_id'], spot_id, vehicle_type, cost_per_unit_time)
+        if booking_queue.WRITE_BEHIND:
+            try:
+                intent = booking_queue.queue_booking(lot_id, session['user_id'], spot_id, vehicle_type)
+            except Exception as e:
+                flash(str(e), 'error')
+                return redirect(url_for('user.book_parking'))
+            flash(f"Booking spot {intent['spot_number']} at ₹{intent['cost_per_unit_time']:.2f}/hour; "
+                  "it shows up under your bookings in a moment.", 'success')
+            return redirect(url_for('user.user_dashboard'))
+        book_parking_spot(lot_id, session['user_id'], spot_id, vehicle_type)
         return redirect(url_for('user.user_dashboard'))
 
     return render_template('book_parking.html', lots=lots, spots=spots)
@@ -62,47 +111,155 @@ def release_parking():
 
     if request.method == 'POST':
         booking_id = int(request.form.get('booking_id'))
-        if booking_id:
+        if booking_id and booking_queue.WRITE_BEHIND:
+            booking = get_booking_by_id(booking_id)
+            if not booking or booking['user_id'] != user_id:
+                flash("Booking not found.", 'error')
+            elif not booking['is_active']:
+                flash("Booking already released.", 'error')
+            else:
+                booking_queue.queue_release(booking_id, user_id)
+                flash("Releasing your spot; the bill shows up in your history in a moment.", 'success')
+        elif booking_id:
             release_parking_spot(booking_id)
         return redirect(url_for('user.user_dashboard'))
 
     active_bookings = fetch_active_bookings_by_user(user_id)
     return render_template('release_parking.html', active_bookings=active_bookings)
 
+def parse_window_time(value):
+    # Accepts ISO input such as the browser's datetime-local '2024-05-01T18:00'
+    return datetime.fromisoformat(value.strip()).strftime('%Y-%m-%d %H:%M:%S')
+
+@user_bp.route('/reserve', methods=['GET', 'POST'])
+@user_protected
+def reserve_parking():
+    if request.method == 'POST':
+        try:
+            lot_id = int(request.form.get('lot_id'))
+            start_ts = parse_window_time(request.form.get('start', ''))
+            end_ts = parse_window_time(request.form.get('end', ''))
+            vehicle_type = request.form.get('vehicle_type', '').strip()
+        except (TypeError, ValueError):
+            flash('Please fill in a lot and a valid window.', 'error')
+            return redirect(url_for('user.reserve_parking'))
+        try:
+            reservation_id = reserve_parking_window(lot_id, session['user_id'], start_ts, end_ts, vehicle_type)
+            reservation = get_reservation_by_id(reservation_id)
+            flash(f"Reservation confirmed at ₹{reservation['cost_per_unit_time']:.2f} per hour!", 'success')
+        except Exception as e:
+            flash(str(e), 'error')
+        return redirect(url_for('user.reserve_parking'))
+
+    lots = fetch_all_parking_lots()
+    reservations = fetch_reservations_by_user(session['user_id'])
+    return render_template('reserve_parking.html', lots=lots, reservations=reservations,
+                           selected_lot=request.args.get('lot_id', type=int))
+
+@user_bp.route('/reservations/<int:reservation_id>/<action>', methods=['POST'])
+@user_protected
+def update_reservation(reservation_id, action):
+    reservation = get_reservation_by_id(reservation_id)
+    if not reservation or reservation['user_id'] != session['user_id'] or action not in ('cancel', 'check_in'):
+        flash('Reservation not found!', 'error')
+        return redirect(url_for('user.reserve_parking'))
+    try:
+        if action == 'cancel':
+            cancel_reservation(reservation_id)
+            flash('Reservation cancelled.', 'success')
+        else:
+            check_in_reservation(reservation_id)
+            flash('Checked in, your spot is booked.', 'success')
+    except Exception as e:
+        flash(str(e), 'error')
+    return redirect(url_for('user.reserve_parking'))
+
 @user_bp.route('/user_summary')
 @user_protected
 def user_summary():
     labels = []
     data = []
-    usage_data = fetch_parking_usage_summary(session['user_id'])
+    start = request.args.get('start', '')
+    end = request.args.get('end', '')
+    usage_data = fetch_parking_usage_summary(session['user_id'], start or '0000-00-00', end or '9999-99-99')
     for row in usage_data:
         labels.append(row['lot_name'])
         data.append(row['booking_count'])
-    return render_template('user_summary.html', labels=labels, data=data)
+    return render_template('user_summary.html', labels=labels, data=data, start=start, end=end)
 
 @user_bp.route('/search_parking', methods=['GET'])
 @user_protected
 def search_parking():
     query = request.args.get('query', '').strip().lower()
 
-    all_lots = fetch_all_parking_lots()
-    
-    filtered_lots = [
-        lot for lot in all_lots
-        if query in lot['address'].lower() or query in lot['pincode']
-    ] if query else all_lots
+    if query:
+        filtered_lots = search_parking_lots(query, SEARCH_RESULT_LIMIT)
+    else:
+        filtered_lots = fetch_all_parking_lots()
 
     user = get_user_by_id(session['user_id'])
-    history = fetch_booking_history_by_user(session['user_id'])
+    history, older = history_page()
 
     return render_template(
         'user_dashboard.html',
         lots=filtered_lots,
         history=history,
+        older=older,
         name=user['name'],
         search_query=query
     )
 
+@user_bp.route('/nearest_lots', methods=['GET'])
+@user_protected
+def nearest_lots():
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    vehicle_type = request.args.get('vehicle_type', '').strip() or None
+    limit = min(max(request.args.get('limit', 5, type=int), 1), NEAREST_LOTS_LIMIT)
+
+    if latitude is None or longitude is None:
+        user = get_user_by_id(session['user_id'])
+        origin = locate_pincode(user['pincode'])
+        if origin is None:
+            return jsonify(error="Location unknown; pass lat and lon."), 400
+        latitude, longitude = origin
+
+    lots = find_nearest_lots(latitude, longitude, limit, vehicle_type)
+    return jsonify(origin={'lat': latitude, 'lon': longitude}, lots=[
+        {
+            'id': lot['id'],
+            'name': lot['prime_location_name'],
+            'address': lot['address'],
+            'pincode': lot['pincode'],
+            'lat': lot['latitude'],
+            'lon': lot['longitude'],
+            'availability': lot['availability'],
+            'distance_km': lot['distance_km'],
+        }
+        for lot in lots
+    ])
+
+@user_bp.route('/availability_stream')
+@user_protected
+def availability_stream():
+    subscriber = availability_feed.subscribe()
+
+    def events():
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            availability_feed.unsubscribe(subscriber)
+
+    return Response(events(), mimetype='text/event-stream', headers={'X-Accel-Buffering': 'no'})
+
 @user_bp.route('/edit_profile', methods=['GET'])
 @user_protected
 def edit_profile():
@@ -126,7 +283,7 @@ def update_profile_details():
         flash('User not found!', 'error')
         return redirect(url_for('auth.login'))
 
-    if bcrypt.checkpw(current_password.encode(), user['password']):
+    if check_password(current_password, user['password']):
         update_user_details(user_id, new_name, new_address, new_pincode)
         flash('Profile updated!', 'success')
     else:
@@ -145,8 +302,8 @@ def change_password():
         flash('User not found!', 'error')
         return redirect(url_for('auth.login'))
 
-    if bcrypt.checkpw(current_password.encode('utf-8'), user['password']):
-        update_user_password(user_id, bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()))
+    if check_password(current_password, user['password']):
+        update_user_password(user_id, hash_password(new_password))
         flash('Password changed successfully!', 'success')
     else:
         flash('Incorrect current password!', 'error')
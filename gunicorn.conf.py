@@ -0,0 +1,12 @@
+# Import the app once in the master and fork workers from it, so route
+# compilation and the schema check are paid once instead of in every worker
+preload_app = True
+worker_class = 'gthread'
+threads = 32
+keepalive = 75
+
+def when_ready(server):
+    # Runs after the preload and before the first fork: workers open their own
+    # PostgreSQL pools, so the connection the schema check used is closed here
+    from models.parking_model import close_backend
+    close_backend()
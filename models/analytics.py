@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from models.parking_model import fetch_lot_capacity, iter_booking_intervals
+
+# Occupancy analytics over booking intervals loaded into NumPy arrays. Every
+# statistic is computed with array operations across all bookings at once;
+# the results are cached as JSON files that all workers and runs share.
+
+ANALYTICS_CACHE_DIR = os.environ.get('ANALYTICS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'parking-analytics'))
+ANALYTICS_CACHE_TTL = float(os.environ.get('ANALYTICS_CACHE_TTL', 900))
+FORECAST_WEEKS = int(os.environ.get('FORECAST_WEEKS', 8))
+# Weight of each week relative to the week after it
+FORECAST_DECAY = float(os.environ.get('FORECAST_DECAY', 0.7))
+MAX_FORECAST_WEEKS = 52
+LOAD_CHUNK_SIZE = 100000
+# Upper edges of the dwell-time bins in minutes; the last bin is open ended
+DWELL_BINS_MINUTES = [30, 60, 120, 240, 480, 720, 1440]
+# Lots x buckets a single occupancy series may return
+MAX_SERIES_POINTS = 500000
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+HOURS_PER_WEEK = 168
+
+class BookingIntervals:
+    # One entry per booking: index into lot_ids, start and end in seconds
+    # since origin, and whether the booking is still active
+    def __init__(self, origin, lot_ids, lot, start, end, active):
+        self.origin = origin
+        self.lot_ids = lot_ids
+        self.lot = lot
+        self.start = start
+        self.end = end
+        self.active = active
+
+    def __len__(self):
+        return len(self.lot)
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def load_intervals(start, end, lots):
+    # Bookings parked at any time in [start, end) at the given lots
+    lot_ids = np.array([lot['lot_id'] for lot in lots], dtype=np.int64)
+    origin = np.datetime64(start, 's')
+    lot_id = lots[0]['lot_id'] if len(lots) == 1 else None
+    rows = iter_booking_intervals(_timestamp(start), _timestamp(end), lot_id)
+    chunks = []
+    while True:
+        chunk = list(itertools.islice(rows, LOAD_CHUNK_SIZE))
+        if not chunk:
+            break
+        lot, parked, left, active = zip(*chunk)
+        chunks.append((np.array(lot, dtype=np.int64),
+                       (np.array(parked, dtype='datetime64[s]') - origin).astype(np.int64),
+                       (np.array(left, dtype='datetime64[s]') - origin).astype(np.int64),
+                       np.array(active, dtype=bool)))
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return BookingIntervals(origin, lot_ids, empty, empty, empty, np.empty(0, dtype=bool))
+    lot, parked, left, active = (np.concatenate(column) for column in zip(*chunks))
+    # Bookings of lots outside the selection are dropped
+    index = np.searchsorted(lot_ids, lot)
+    known = index < len(lot_ids)
+    known[known] = lot_ids[index[known]] == lot[known]
+    return BookingIntervals(origin, lot_ids, index[known], parked[known], left[known], active[known])
+
+def _elapsed_before(lot, times, n_lots, step, buckets):
+    # For every lot and boundary T = k * step (k = 0..buckets), the sum of
+    # T - t over that lot's times t < T. Times are counted and summed per
+    # (lot, bucket) in one pass, so T * count - sum comes from running totals
+    # along the buckets; slot 0 holds everything before the first boundary
+    slots = np.clip(times // step + 1, 0, buckets + 1)
+    index = lot * (buckets + 2) + slots
+    size = n_lots * (buckets + 2)
+    counts = np.bincount(index, minlength=size).reshape(n_lots, buckets + 2)[:, :-1].cumsum(axis=1)
+    sums = np.bincount(index, weights=times, minlength=size).reshape(n_lots, buckets + 2)[:, :-1].cumsum(axis=1)
+    return np.arange(buckets + 1) * step * counts - sums
+
+def occupied_seconds(intervals, step, buckets):
+    # Spot-seconds in use per lot in each step-second bucket after the origin:
+    # time parked since the bookings started minus time since they ended,
+    # differenced between boundaries
+    n_lots = len(intervals.lot_ids)
+    parked = (_elapsed_before(intervals.lot, intervals.start, n_lots, step, buckets)
+              - _elapsed_before(intervals.lot, intervals.end, n_lots, step, buckets))
+    return np.diff(parked, axis=1)
+
+def occupancy_matrix(intervals, step_seconds, buckets):
+    # Average occupied spots per lot in each step_seconds bucket
+    return occupied_seconds(intervals, step_seconds, buckets) / step_seconds
+
+def hourly_heatmap(intervals, spots, first_weekday, hours):
+    # Mean occupied share of the spots by weekday and hour over the hours
+    # after the origin, which is midnight on first_weekday (0 = Monday)
+    occupied = occupancy_matrix(intervals, 3600, hours).sum(axis=0)
+    share = occupied / max(int(np.sum(spots)), 1)
+    slots = (first_weekday * 24 + np.arange(hours)) % HOURS_PER_WEEK
+    totals = np.bincount(slots, weights=share, minlength=HOURS_PER_WEEK)
+    return (totals / np.maximum(np.bincount(slots, minlength=HOURS_PER_WEEK), 1)).reshape(7, 24)
+
+def dwell_histogram(intervals):
+    # Closed bookings that started after the origin: counts per dwell bin,
+    # percentiles and the mean stay per lot, in minutes
+    closed = ~intervals.active & (intervals.start >= 0)
+    minutes = (intervals.end[closed] - intervals.start[closed]) / 60
+    counts, _ = np.histogram(minutes, [0] + DWELL_BINS_MINUTES + [np.inf])
+    percentiles = np.percentile(minutes, [50, 90, 99]) if minutes.size else np.zeros(3)
+    n_lots = len(intervals.lot_ids)
+    lot = intervals.lot[closed]
+    per_lot = np.bincount(lot, weights=minutes, minlength=n_lots) / np.maximum(np.bincount(lot, minlength=n_lots), 1)
+    return counts, percentiles, minutes.mean() if minutes.size else 0.0, per_lot
+
+def seasonal_forecast(intervals, weeks, horizon_hours, decay=FORECAST_DECAY):
+    # Arrivals and average occupied spots per lot for the horizon_hours after
+    # the intervals' last week: each hour is the mean of the same hour of the
+    # week over the past weeks, newer weeks weighted more
+    n_lots = len(intervals.lot_ids)
+    hours = weeks * HOURS_PER_WEEK
+    started = (intervals.start >= 0) & (intervals.start < hours * 3600)
+    arrivals = np.bincount(intervals.lot[started] * hours + intervals.start[started] // 3600,
+                           minlength=n_lots * hours).reshape(n_lots, weeks, HOURS_PER_WEEK)
+    occupied = occupancy_matrix(intervals, 3600, hours).reshape(n_lots, weeks, HOURS_PER_WEEK)
+    weights = decay ** np.arange(weeks - 1, -1, -1)
+    weights /= weights.sum()
+    slots = np.arange(horizon_hours) % HOURS_PER_WEEK
+    return (np.tensordot(arrivals, weights, axes=([1], [0]))[:, slots],
+            np.tensordot(occupied, weights, axes=([1], [0]))[:, slots])
+
+def _cached(kind, params, compute):
+    # Results are keyed by their parameters and reused until they are
+    # ANALYTICS_CACHE_TTL seconds old, by any worker or later run
+    key = hashlib.sha1(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()[:20]
+    path = os.path.join(ANALYTICS_CACHE_DIR, f'{kind}-{key}.json')
+    try:
+        if time.time() - os.path.getmtime(path) < ANALYTICS_CACHE_TTL:
+            with open(path) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    result = compute()
+    os.makedirs(ANALYTICS_CACHE_DIR, exist_ok=True)
+    partial = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'w') as f:
+        json.dump(result, f)
+    os.replace(partial, path)
+    return result
+
+def _lots(lot_id):
+    lots = [lot for lot in fetch_lot_capacity() if lot_id is None or lot['lot_id'] == lot_id]
+    if not lots:
+        raise ValueError("Parking lot not found.")
+    return lots
+
+def _window(start_day, end_day):
+    # Whole days, end_day included
+    start = datetime.combine(date.fromisoformat(start_day), datetime.min.time())
+    end = datetime.combine(date.fromisoformat(end_day), datetime.min.time()) + timedelta(days=1)
+    if end <= start:
+        raise ValueError("The end day must not be before the start day.")
+    return start, end
+
+def fetch_occupancy_series(start_day, end_day, resolution_minutes=60, lot_id=None):
+    def compute():
+        start, end = _window(start_day, end_day)
+        lots = _lots(lot_id)
+        step = resolution_minutes * 60
+        buckets = -(-int((end - start).total_seconds()) // step)
+        if buckets * len(lots) > MAX_SERIES_POINTS:
+            raise ValueError("Too many points; choose a coarser resolution, a shorter window or one lot.")
+        occupied = occupancy_matrix(load_intervals(start, end, lots), step, buckets)
+        return {
+            'start': _timestamp(start),
+            'resolution_minutes': resolution_minutes,
+            'labels': [_timestamp(start + timedelta(seconds=step * i)) for i in range(buckets)],
+            'lots': [{'lot_id': lot['lot_id'], 'lot_name': lot['lot_name'], 'spots': lot['spots'],
+                      'occupied': np.round(row, 2).tolist()} for lot, row in zip(lots, occupied)],
+        }
+    if resolution_minutes < 1:
+        raise ValueError("The resolution must be at least one minute.")
+    return _cached('occupancy', [start_day, end_day, resolution_minutes, lot_id], compute)
+
+def fetch_peak_heatmap(start_day, end_day, lot_id=None):
+    def compute():
+        start, end = _window(start_day, end_day)
+        lots = _lots(lot_id)
+        hours = int((end - start).total_seconds()) // 3600
+        share = hourly_heatmap(load_intervals(start, end, lots), [lot['spots'] for lot in lots], start.weekday(), hours)
+        weekday, hour = np.unravel_index(np.argmax(share), share.shape)
+        return {
+            'weekdays': WEEKDAYS,
+            'hours': list(range(24)),
+            'share': np.round(share, 3).tolist(),
+            'peak': {'weekday': WEEKDAYS[weekday], 'hour': int(hour), 'share': round(float(share[weekday, hour]), 3)},
+        }
+    return _cached('heatmap', [start_day, end_day, lot_id], compute)
+
+def fetch_dwell_distribution(start_day, end_day, lot_id=None):
+    def compute():
+        start, end = _window(start_day, end_day)
+        lots = _lots(lot_id)
+        counts, percentiles, mean, per_lot = dwell_histogram(load_intervals(start, end, lots))
+        edges = [0] + DWELL_BINS_MINUTES
+        return {
+            'bins': [f'{low}-{high} min' for low, high in zip(edges, DWELL_BINS_MINUTES)] + [f'{edges[-1]}+ min'],
+            'counts': counts.tolist(),
+            'mean_minutes': round(float(mean), 1),
+            'percentiles_minutes': {'p50': round(float(percentiles[0]), 1), 'p90': round(float(percentiles[1]), 1),
+                                    'p99': round(float(percentiles[2]), 1)},
+            'lots': [{'lot_id': lot['lot_id'], 'lot_name': lot['lot_name'], 'mean_minutes': round(float(value), 1)}
+                     for lot, value in zip(lots, per_lot)],
+        }
+    return _cached('dwell', [start_day, end_day, lot_id], compute)
+
+def fetch_demand_forecast(horizon_hours=24, weeks=FORECAST_WEEKS, lot_id=None):
+    # Forecasts from the start of the current hour; cached per hour
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def compute():
+        lots = _lots(lot_id)
+        start = now - timedelta(weeks=weeks)
+        arrivals, occupied = seasonal_forecast(load_intervals(start, now, lots), weeks, horizon_hours)
+        return {
+            'start': _timestamp(now),
+            'weeks': weeks,
+            'labels': [_timestamp(now + timedelta(hours=i)) for i in range(horizon_hours)],
+            'lots': [{'lot_id': lot['lot_id'], 'lot_name': lot['lot_name'], 'spots': lot['spots'],
+                      'arrivals': np.round(lot_arrivals, 2).tolist(), 'occupied': np.round(lot_occupied, 2).tolist()}
+                     for lot, lot_arrivals, lot_occupied in zip(lots, arrivals, occupied)],
+        }
+    if not 1 <= horizon_hours <= HOURS_PER_WEEK or not 1 <= weeks <= MAX_FORECAST_WEEKS:
+        raise ValueError(f"The horizon must be 1 to {HOURS_PER_WEEK} hours and the history 1 to "
+                         f"{MAX_FORECAST_WEEKS} weeks.")
+    return _cached('forecast', [_timestamp(now), horizon_hours, weeks, lot_id], compute)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute (and cache) the admin occupancy analytics.")
+    parser.add_argument('--start', default=(date.today() - timedelta(days=28)).isoformat(), help="first day, YYYY-MM-DD")
+    parser.add_argument('--end', default=date.today().isoformat(), help="last day, YYYY-MM-DD")
+    parser.add_argument('--lot-id', type=int)
+    args = parser.parse_args()
+    for name, compute in (
+            ('occupancy', lambda: fetch_occupancy_series(args.start, args.end, 60, args.lot_id)),
+            ('heatmap', lambda: fetch_peak_heatmap(args.start, args.end, args.lot_id)),
+            ('dwell', lambda: fetch_dwell_distribution(args.start, args.end, args.lot_id)),
+            ('forecast', lambda: fetch_demand_forecast(lot_id=args.lot_id))):
+        started = time.perf_counter()
+        compute()
+        print(f"[✓] {name} in {time.perf_counter() - started:.2f}s")
+    heatmap = fetch_peak_heatmap(args.start, args.end, args.lot_id)
+    print(f"    peak: {heatmap['peak']['weekday']} {heatmap['peak']['hour']:02d}:00 "
+          f"at {heatmap['peak']['share']:.0%} of spots")
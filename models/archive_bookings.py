@@ -0,0 +1,49 @@
+import argparse
+
+from models.parking_model import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    archive_closed_bookings,
+    fetch_archivable_months,
+    fetch_archive_partitions,
+    get_db,
+    init_db,
+)
+
+# Moves closed bookings past the horizon out of reserve_parking_spot into
+# booking_archive_YYYY_MM partitions in the same file, so a move commits
+# atomically. Freed pages are reused by new bookings; --vacuum also returns
+# them to the filesystem but locks the database while it runs.
+
+def archive_all(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    total = 0
+    while True:
+        moved = archive_closed_bookings(older_than_days, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move closed bookings into monthly archive partitions.")
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="count the bookings per month that would move")
+    parser.add_argument('--list', action='store_true', help="list the archive partitions")
+    parser.add_argument('--vacuum', action='store_true', help="shrink the database file after archiving")
+    args = parser.parse_args()
+    init_db()
+    if args.list:
+        for partition in fetch_archive_partitions():
+            print(f"{partition['name']}: {partition['row_count']} bookings, ids {partition['min_id']}-"
+                  f"{partition['max_id']}, archived {partition['archived_at']}")
+    elif args.dry_run:
+        for month in fetch_archivable_months(args.older_than_days):
+            print(f"{month['month']}: {month['bookings']} bookings")
+    else:
+        print("[*] Archiving closed bookings...")
+        print(f"[✓] Archived {archive_all(args.older_than_days, args.batch_size)} bookings.")
+        if args.vacuum:
+            conn = get_db()
+            conn.execute('VACUUM')
+            conn.close()
+            print("[✓] Database vacuumed.")
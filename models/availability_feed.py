@@ -0,0 +1,140 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from models.parking_model import add_lot_change_listener, close_db, connect
+
+FEED_POLL_INTERVAL = float(os.environ.get('FEED_POLL_INTERVAL', 1.0))
+FEED_QUEUE_SIZE = int(os.environ.get('FEED_QUEUE_SIZE', 100))
+# Each open stream holds a request thread for as long as the client stays, so
+# a worker serves at most this many, well below gunicorn's 32 threads
+FEED_MAX_SUBSCRIBERS = int(os.environ.get('FEED_MAX_SUBSCRIBERS', 8))
+FEED_MAX_BACKOFF = 30.0
+
+log = logging.getLogger('parking.availability_feed')
+
+class AvailabilityFeedFull(Exception):
+    pass
+
+class AvailabilityFeed:
+    # One watcher thread per worker polls the lot_data_version row, diffs
+    # per-lot availability when it moves and fans the changes out to every
+    # subscriber queue, so idle clients cost no database work of their own.
+    # Local bookings and releases wake the watcher immediately.
+    def __init__(self, poll_interval=FEED_POLL_INTERVAL, queue_size=FEED_QUEUE_SIZE,
+                 max_subscribers=FEED_MAX_SUBSCRIBERS):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._version = None
+        self._snapshot = {}
+
+    def subscribe(self):
+        # The first message on the queue is always a full snapshot
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._subscribers) + len(self._pending) >= self.max_subscribers:
+                raise AvailabilityFeedFull("Too many availability streams open.")
+            self._pending.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='availability-feed', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._pending.discard(subscriber)
+            self._subscribers.discard(subscriber)
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        conn = None
+        backoff = self.poll_interval
+        try:
+            while True:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                with self._lock:
+                    if not self._subscribers and not self._pending:
+                        self._thread = None
+                        self._version = None
+                        return
+                try:
+                    conn = conn or connect()
+                    self._refresh(conn)
+                    backoff = self.poll_interval
+                except Exception:
+                    # A lost connection or locked database must not end the
+                    # feed: reconnect after a growing pause
+                    log.exception("availability feed refresh failed; retrying in %.1fs", backoff)
+                    conn = self._discard(conn)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, FEED_MAX_BACKOFF)
+        finally:
+            # Whatever ended the loop, the next subscriber starts a new watcher
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                    self._version = None
+            self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            close_db(conn)
+        except Exception:
+            log.exception("closing the availability feed connection failed")
+        return None
+
+    def _refresh(self, conn):
+        version = conn.execute('SELECT version FROM lot_data_version WHERE id = 1').fetchone()[0]
+        changes = []
+        if version != self._version:
+            # Spots outlive a deleted lot, and so do their counters; the join
+            # leaves those lots out
+            rows = conn.execute('''
+                SELECT a.lot_id, SUM(a.available) AS availability
+                FROM lot_availability a
+                JOIN parking_lot p ON p.id = a.lot_id
+                GROUP BY a.lot_id
+            ''').fetchall()
+            snapshot = {row['lot_id']: row['availability'] for row in rows}
+            for lot_id in snapshot.keys() | self._snapshot.keys():
+                if snapshot.get(lot_id, 0) != self._snapshot.get(lot_id, 0):
+                    changes.append({'lot_id': lot_id, 'availability': snapshot.get(lot_id, 0)})
+            self._snapshot = snapshot
+            self._version = version
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._subscribers |= pending
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber in pending:
+                self._send(subscriber, 'snapshot', self._snapshot)
+            elif changes:
+                self._send(subscriber, 'delta', changes)
+
+    def _send(self, subscriber, event, data):
+        try:
+            subscriber.put_nowait((event, data))
+        except queue.Full:
+            # A client this far behind is dropped; EventSource reconnects
+            # and starts again from a fresh snapshot
+            self.unsubscribe(subscriber)
+            try:
+                subscriber.get_nowait()
+                subscriber.put_nowait((None, None))
+            except (queue.Empty, queue.Full):
+                pass
+
+availability_feed = AvailabilityFeed()
+add_lot_change_listener(availability_feed.notify)
@@ -0,0 +1,6 @@
+from models.parking_model import rebuild_usage_rollups
+
+if __name__ == "__main__":
+    print("[*] Rebuilding usage rollups from reserve_parking_spot...")
+    rebuild_usage_rollups()
+    print("[✓] Rollups rebuilt.")
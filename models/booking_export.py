@@ -0,0 +1,37 @@
+import csv
+import io
+import json
+
+from flask import Response
+
+EXPORT_COLUMNS = [
+    'id', 'user_id', 'email', 'lot_id', 'lot_name', 'spot_number', 'vehicle_type', 'parking_timestamp',
+    'leaving_timestamp', 'parking_cost_per_unit_time', 'total_cost', 'is_active',
+]
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    # The header goes out first, so an empty range still exports it
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def _json_lines(rows):
+    for row in rows:
+        yield json.dumps({column: row[column] for column in EXPORT_COLUMNS}) + '\n'
+
+def export_response(rows, fmt, filename):
+    # `rows` is consumed lazily while the response is sent
+    if fmt == 'jsonl':
+        body, mimetype, extension = _json_lines(rows), 'application/x-ndjson', 'jsonl'
+    else:
+        body, mimetype, extension = _csv_lines(rows), 'text/csv', 'csv'
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{extension}'})
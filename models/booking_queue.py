@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from models.parking_model import fetch_free_spots, quote_parking_rate
+from models.storage import BUSY_TIMEOUT, SYNCHRONOUS
+
+# Write-behind bookings (BOOKING_WRITE_BEHIND=1): web workers don't take the
+# database write lock for bookings and releases. They append the intent to a
+# local SQLite queue file, separate from the database, and answer with a
+# provisional spot; the booking writer (models/booking_writer.py, its own
+# process) group-commits queued intents through apply_gate_events, whose
+# event log turns a replay after a crash into a no-op.
+WRITE_BEHIND = os.environ.get('BOOKING_WRITE_BEHIND', '0') == '1'
+BOOKING_QUEUE_PATH = os.environ.get('BOOKING_QUEUE_PATH', 'models/booking_queue.db')
+# How long a worker keeps a provisional spot out of its pool while the writer
+# catches up
+SPOT_HOLD_SECONDS = float(os.environ.get('SPOT_HOLD_SECONDS', 30))
+# Applied, rejected and failed intents stay this long for status lookups
+INTENT_RETENTION_SECONDS = float(os.environ.get('INTENT_RETENTION_SECONDS', 86400))
+
+QUEUE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS booking_intent (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        intent_id TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL,
+        event TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        booking_id INTEGER,
+        error TEXT,
+        queued_at REAL NOT NULL,
+        finished_at REAL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_booking_intent_status ON booking_intent (status, id)',
+    "CREATE INDEX IF NOT EXISTS idx_booking_intent_finished ON booking_intent (finished_at) WHERE status != 'queued'",
+]
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+def _queue_conn():
+    # One connection per thread; a connection inherited across fork is not reused
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(BOOKING_QUEUE_PATH, timeout=BUSY_TIMEOUT / 1000, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT}')
+    conn.execute('PRAGMA journal_mode = WAL')
+    # Synced like the database, so an acknowledged intent is as durable as a
+    # booking committed there directly (SQLITE_SYNCHRONOUS=FULL for power cuts)
+    if SYNCHRONOUS:
+        conn.execute(f'PRAGMA synchronous = {SYNCHRONOUS}')
+    with _schema_lock:
+        if BOOKING_QUEUE_PATH not in _schema_ready:
+            for statement in QUEUE_SCHEMA:
+                conn.execute(statement)
+            _schema_ready.add(BOOKING_QUEUE_PATH)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+class SpotAllocator:
+    # Hands out provisional spots from the lot's cached free list, skipping
+    # those this process promised within the hold. Each worker process has its
+    # own pool, so two may promise the same spot: the writer then books
+    # another free one, or rejects the intent if the lot filled up meanwhile.
+    def __init__(self, hold_seconds=SPOT_HOLD_SECONDS):
+        self.hold_seconds = hold_seconds
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def claim(self, lot_id, preferred=None):
+        free = fetch_free_spots(lot_id)
+        if not free:
+            return None
+        now = time.monotonic()
+        # Workers scan from different offsets so they rarely promise the same spot
+        start = os.getpid() % len(free)
+        with self._lock:
+            held = self._held.setdefault(lot_id, {})
+            if len(held) > len(free):
+                for spot_id in [spot_id for spot_id, until in held.items() if until <= now]:
+                    del held[spot_id]
+            spots = [free[(start + index) % len(free)] for index in range(len(free))]
+            # The spot the user picked comes first while it is free
+            spots = [spot for spot in spots if spot[0] == preferred] + spots
+            for spot_id, spot_number in spots:
+                if held.get(spot_id, 0) <= now:
+                    held[spot_id] = now + self.hold_seconds
+                    return spot_id, spot_number
+        return None
+
+    def release(self, lot_id, spot_id):
+        with self._lock:
+            self._held.get(lot_id, {}).pop(spot_id, None)
+
+allocator = SpotAllocator()
+
+def _append(event, user_id):
+    conn = _queue_conn()
+    conn.execute('INSERT INTO booking_intent (intent_id, user_id, event, queued_at) VALUES (?, ?, ?, ?)',
+                 (event['event_id'], user_id, json.dumps(event), time.time()))
+
+def _new_event(event_type):
+    return {'event_id': f'intent-{uuid.uuid4().hex}', 'type': event_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+def queue_booking(lot_id, user_id, spot_id, vehicle_type):
+    # Write-behind book_parking_spot: the rate is locked in and the booking
+    # starts now, whenever the writer applies it. Raises like book_parking_spot
+    # for unknown or full lots
+    cost_per_unit_time = quote_parking_rate(lot_id, vehicle_type)
+    if cost_per_unit_time is None:
+        raise Exception("Parking lot not found.")
+    spot = allocator.claim(lot_id, spot_id)
+    if spot is None:
+        raise Exception("No available parking spots in the selected lot.")
+    event = _new_event('entry')
+    event.update(lot_id=lot_id, user_id=user_id, vehicle_type=vehicle_type, cost_per_unit_time=cost_per_unit_time,
+                 spot_id=spot[0])
+    try:
+        _append(event, user_id)
+    except Exception:
+        allocator.release(lot_id, spot[0])
+        raise
+    return {
+        'intent_id': event['event_id'],
+        'status': 'queued',
+        'lot_id': lot_id,
+        'spot_id': spot[0],
+        'spot_number': spot[1],
+        'vehicle_type': vehicle_type,
+        'parking_timestamp': event['timestamp'],
+        'cost_per_unit_time': cost_per_unit_time,
+    }
+
+def queue_release(booking_id, user_id):
+    # Write-behind release_parking_spot, billed up to now; the caller checks
+    # that the booking exists and belongs to the user
+    event = _new_event('exit')
+    event['booking_id'] = booking_id
+    _append(event, user_id)
+    return {'intent_id': event['event_id'], 'status': 'queued', 'booking_id': booking_id,
+            'leaving_timestamp': event['timestamp']}
+
+def get_intent(intent_id):
+    row = _queue_conn().execute('''
+        SELECT intent_id, user_id, event, status, booking_id, error, queued_at, finished_at
+        FROM booking_intent
+        WHERE intent_id = ?
+    ''', (intent_id,)).fetchone()
+    if row is None:
+        return None
+    intent = dict(row)
+    intent['event'] = json.loads(intent['event'])
+    return intent
+
+def fetch_queued_intents(limit):
+    # Gate events of the oldest queued intents, in queue order
+    rows = _queue_conn().execute('''
+        SELECT event FROM booking_intent WHERE status = 'queued' ORDER BY id LIMIT ?
+    ''', (limit,)).fetchall()
+    return [json.loads(row['event']) for row in rows]
+
+def finish_intents(outcomes):
+    # outcomes is [(intent id, status, booking id, error)]
+    conn = _queue_conn()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('''
+            UPDATE booking_intent SET status = ?, booking_id = ?, error = ?, finished_at = ?
+            WHERE intent_id = ? AND status = 'queued'
+        ''', [(status, booking_id, error, time.time(), intent_id) for intent_id, status, booking_id, error in outcomes])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+def purge_intents(retention_seconds=INTENT_RETENTION_SECONDS):
+    cursor = _queue_conn().execute('''
+        DELETE FROM booking_intent WHERE status != 'queued' AND finished_at < ?
+    ''', (time.time() - retention_seconds,))
+    return cursor.rowcount
+
+def fetch_queue_status():
+    # Backlog of the booking writer: queued intents, the age of the oldest and
+    # intents the writer could not apply
+    conn = _queue_conn()
+    queued, oldest = conn.execute('''
+        SELECT COUNT(*), MIN(queued_at) FROM booking_intent WHERE status = 'queued'
+    ''').fetchone()
+    failed = conn.execute("SELECT COUNT(*) FROM booking_intent WHERE status = 'failed'").fetchone()[0]
+    return {
+        'queued': queued,
+        'lag_seconds': time.time() - oldest if oldest is not None else 0.0,
+        'failed': failed,
+    }
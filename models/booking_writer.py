@@ -0,0 +1,137 @@
+import argparse
+import logging
+import os
+import time
+
+from models.booking_queue import (BOOKING_QUEUE_PATH, WRITE_BEHIND, fetch_queue_status, fetch_queued_intents,
+                                  finish_intents, purge_intents)
+from models.instrumentation import is_busy_error
+from models.parking_model import apply_gate_events, fetch_gate_events, init_db, reconcile_spot_status
+
+# Runs as its own process next to the web workers (see Procfile.yaml) when
+# BOOKING_WRITE_BEHIND is on. Queued intents are applied a batch per write
+# transaction, so a burst at shift change costs one lock and one commit per
+# batch instead of one per booking. Intents are marked done only after their
+# transaction has committed; after a crash the unmarked ones are replayed and
+# the gate event log tells which of them were already applied.
+WRITER_INTERVAL = float(os.environ.get('BOOKING_WRITER_INTERVAL', 0.05))
+WRITER_BATCH_SIZE = int(os.environ.get('BOOKING_WRITER_BATCH_SIZE', 500))
+PURGE_INTERVAL = 600
+
+log = logging.getLogger('parking.booking_writer')
+
+def _outcomes(results):
+    # (intent id, status, booking id, error) from apply_gate_events results;
+    # replayed intents take the outcome recorded the first time
+    replayed = fetch_gate_events([event_id for event_id, status, _ in results if status == 'duplicate'])
+    outcomes = []
+    for event_id, status, booking_id in results:
+        if status == 'duplicate':
+            status, booking_id = replayed.get(event_id, ('rejected', None))
+        outcomes.append((event_id, status, booking_id, None))
+    return outcomes
+
+def _apply_singly(events):
+    # The batch failed for another reason than a busy database: applying its
+    # intents one at a time sets aside only those that keep failing
+    outcomes = []
+    for event in events:
+        try:
+            outcomes.extend(_outcomes(apply_gate_events([event])))
+        except Exception as e:
+            if is_busy_error(e):
+                break
+            log.exception("booking intent %s failed", event['event_id'])
+            outcomes.append((event['event_id'], 'failed', None, str(e)))
+    return outcomes
+
+def apply_batch(batch_size=WRITER_BATCH_SIZE):
+    # Applies the oldest queued intents in one write transaction; returns how
+    # many were settled. A busy database leaves them queued for the next run
+    events = fetch_queued_intents(batch_size)
+    if not events:
+        return 0
+    try:
+        outcomes = _outcomes(apply_gate_events(events))
+    except Exception as e:
+        if is_busy_error(e):
+            raise
+        outcomes = _apply_singly(events)
+    finish_intents(outcomes)
+    return len(outcomes)
+
+def run_once(batch_size=WRITER_BATCH_SIZE):
+    total = 0
+    while True:
+        applied = apply_batch(batch_size)
+        total += applied
+        if applied < batch_size:
+            return total
+
+def recover(batch_size=WRITER_BATCH_SIZE):
+    # Before taking new work: bring parking_spot.status back in line with the
+    # active bookings, then replay whatever the last run left queued
+    drift = reconcile_spot_status(repair=True)
+    for row in drift:
+        log.warning("spot %d in lot %d was '%s' with %d active bookings; repaired",
+                    row['spot_id'], row['lot_id'], row['status'], row['active_bookings'])
+    replayed = run_once(batch_size)
+    if replayed:
+        log.info("replayed %d queued booking intents", replayed)
+    return len(drift), replayed
+
+def run_forever(interval=WRITER_INTERVAL, batch_size=WRITER_BATCH_SIZE):
+    while True:
+        try:
+            recover(batch_size)
+            break
+        except Exception:
+            log.exception("booking writer recovery failed")
+            time.sleep(max(interval, 1.0))
+    purged_at = 0.0
+    while True:
+        started = time.perf_counter()
+        try:
+            applied = run_once(batch_size)
+            if applied:
+                log.debug("applied %d booking intents in %.3fs", applied, time.perf_counter() - started)
+            if started - purged_at > PURGE_INTERVAL:
+                purge_intents()
+                purged_at = started
+        except Exception:
+            log.exception("booking writer run failed")
+        # Intents arriving meanwhile are committed together in the next run
+        time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+def idle(batch_size=WRITER_BATCH_SIZE):
+    # BOOKING_WRITE_BEHIND is off, so the web workers write bookings
+    # themselves. Intents queued before it was switched off are still applied;
+    # then the process sleeps instead of exiting, which would make the process
+    # manager restart it or stop the web workers with it
+    if os.path.exists(BOOKING_QUEUE_PATH):
+        applied = run_once(batch_size)
+        if applied:
+            log.info("applied %d booking intents left in the queue", applied)
+    log.info("BOOKING_WRITE_BEHIND is off; nothing to write")
+    while True:
+        time.sleep(3600)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply queued write-behind bookings and releases to the database.")
+    parser.add_argument('--once', action='store_true', help="recover, drain the queue once and exit")
+    parser.add_argument('--status', action='store_true', help="show the queue backlog and exit")
+    parser.add_argument('--interval', type=float, default=WRITER_INTERVAL)
+    parser.add_argument('--batch-size', type=int, default=WRITER_BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    init_db()
+    if args.status:
+        status = fetch_queue_status()
+        print(f"{status['queued']} queued (oldest {status['lag_seconds']:.1f}s), {status['failed']} failed")
+    elif args.once:
+        repaired, applied = recover(args.batch_size)
+        print(f"[✓] Repaired {repaired} spots, applied {applied} booking intents.")
+    elif not WRITE_BEHIND:
+        idle(args.batch_size)
+    else:
+        run_forever(args.interval, args.batch_size)
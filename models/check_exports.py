@@ -0,0 +1,51 @@
+import csv
+import io
+import os
+import sys
+import tempfile
+
+from flask import Flask
+
+import models.parking_model as model
+from models.booking_export import EXPORT_COLUMNS, export_response
+
+HEADER = ','.join(EXPORT_COLUMNS) + '\r\n'
+
+def seed():
+    model.add_new_parking_lot('Check Lot', 10.0, 'Check Street', '123456', 2)
+    model.add_user('Check User', 'check@example.com', 'x', 'Check Street', '123456')
+    model.book_parking_spot(1, 1, None, 'car', 10.0)
+
+def export(fmt, user_id=None, start_day=None, end_day=None):
+    # The whole streamed body, read on the dedicated export connection
+    response = export_response(model.iter_bookings(user_id, start_day, end_day), fmt, 'check')
+    return response.get_data(as_text=True)
+
+def check_exports():
+    failures = []
+    with Flask(__name__).app_context():
+        model.init_db()
+        seed()
+        empty = export('csv', None, '2000-01-01', '2000-01-02')
+        if empty != HEADER:
+            failures.append(f"an empty range exports {empty!r}, not just the header line")
+        if export('jsonl', None, '2000-01-01', '2000-01-02'):
+            failures.append("an empty range exports JSON lines")
+        for user_id in (None, 1):
+            rows = list(csv.reader(io.StringIO(export('csv', user_id))))
+            if rows[:1] != [EXPORT_COLUMNS] or len(rows) != 2:
+                failures.append(f"the export for user {user_id} has {len(rows)} lines, not a header and 1 booking")
+        lines = export('jsonl').splitlines()
+        if len(lines) != 1:
+            failures.append(f"the JSON lines export has {len(lines)} lines, not 1 booking")
+    return failures
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        model.DATABASE = os.path.join(tmp, 'exports.db')
+        failures = check_exports()
+    for failure in failures:
+        print(f"[x] {failure}")
+    if failures:
+        sys.exit(1)
+    print("[✓] Exports start with the header, also for an empty range.")
@@ -0,0 +1,99 @@
+import os
+import re
+import sys
+import tempfile
+
+from flask import Flask, g
+
+import models.parking_model as model
+
+# Tables that grow without bound and must always be reached through an index
+INDEXED_TABLES = ('parking_spot', 'reserve_parking_spot', 'advance_reservation')
+ARCHIVE_PARTITION = re.compile(r'booking_archive_\d{4}_\d{2}$')
+
+# Read paths of the model layer, called with arguments valid for the seed data
+HOT_QUERIES = [
+    ('fetch_parking_spots_by_lot', (1,)),
+    ('fetch_parking_spots_page', ('lot', 0, 50)),
+    ('fetch_active_bookings_by_user', (1,)),
+    ('fetch_booking_history_by_user', (1,)),
+    ('get_booking_by_id', (2,)),
+    ('fetch_available_spots', ()),
+    ('fetch_all_parking_lots', ()),
+    ('fetch_occupancy_data', ()),
+    ('fetch_occupied_spots_details', ()),
+    ('fetch_parking_usage_summary', (1,)),
+    ('find_free_spot_for_window', (1, '2030-01-01 18:00:00', '2030-01-01 21:00:00')),
+    ('fetch_reservations_by_user', (1,)),
+    ('fetch_overdue_bookings', (500,)),
+    ('fetch_expiry_status', ()),
+    ('fetch_free_spots', (1,)),
+    ('fetch_gate_events', (['entry-1'],)),
+]
+
+def seed():
+    model.add_new_parking_lot('Check Lot', 10.0, 'Check Street', '123456', 3)
+    model.add_user('Check User', 'check@example.com', 'x', 'Check Street', '123456')
+    model.book_parking_spot(1, 1, None, 'car', 10.0)
+    model.reserve_parking_window(1, 1, '2030-01-01 18:00:00', '2030-01-01 21:00:00', 'car', 10.0)
+    # An old closed booking, archived so history and lookups go through a partition
+    conn = model.get_db()
+    conn.execute('''
+        INSERT INTO reserve_parking_spot (spot_id, user_id, parking_timestamp, leaving_timestamp,
+                                          parking_cost_per_unit_time, total_cost, is_active)
+        VALUES (2, 1, '2020-01-01 09:00:00', '2020-01-01 11:00:00', 10.0, 20.0, 0)
+    ''')
+    conn.commit()
+    model.archive_closed_bookings()
+
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+KEYWORDS = {'where', 'join', 'left', 'inner', 'on', 'group', 'order', 'limit'}
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def table_scans(conn, sql):
+    aliases = table_aliases(sql)
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    scans = []
+    for row in plan:
+        detail = row['detail']
+        if not detail.startswith('SCAN ') or 'INDEX' in detail:
+            continue
+        table = aliases.get(detail.split()[1], '')
+        if table in INDEXED_TABLES or ARCHIVE_PARTITION.match(table):
+            scans.append(detail)
+    return scans
+
+def check_query_plans():
+    failures = []
+    with Flask(__name__).app_context():
+        model.init_db()
+        seed()
+        conn = model.get_db()
+        for name, args in HOT_QUERIES:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            getattr(model, name)(*args)
+            conn.set_trace_callback(None)
+            for sql in statements:
+                if sql.lstrip().upper().startswith('SELECT'):
+                    for scan in table_scans(conn, sql):
+                        failures.append(f"{name}: {scan}")
+        g.pop('db').close()
+    return failures
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        model.DATABASE = os.path.join(tmp, 'plans.db')
+        failures = check_query_plans()
+    for failure in failures:
+        print(f"[x] {failure}")
+    if failures:
+        sys.exit(1)
+    print("[✓] No table scans on hot query paths.")
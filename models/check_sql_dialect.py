@@ -0,0 +1,176 @@
+import ast
+import importlib
+import inspect
+import re
+import sys
+
+from flask import Flask
+
+from models import parking_model as model
+from models.postgres_schema import SCHEMA_VERSION
+from models.storage import PostgresBackend, translate
+
+# Modules whose SQL runs against the main database on either backend
+MODULES = ('models.parking_model', 'models.availability_feed')
+# SQLite-only SQL: the base tables and migrations (PostgreSQL gets
+# models/postgres_schema.py instead) and queries keyed by backend name
+SQLITE_ONLY = {'init_db', 'MIGRATIONS', '_add_archive_vehicle_type'}
+SQL_START = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH|CREATE|DROP|ALTER|BEGIN)\b', re.IGNORECASE)
+DDL = re.compile(r'\s*(CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+# What each interpolated f-string expression stands for; a new expression
+# must be added here, so no statement goes unchecked
+ARCHIVE_TABLE = 'booking_archive_2000_01'
+SAMPLE_VALUES = {
+    'bookings': 'reserve_parking_spot',
+    '_all_bookings(tables)': 'reserve_parking_spot',
+    'name': ARCHIVE_TABLE,
+    "row['name']": ARCHIVE_TABLE,
+    'table': ARCHIVE_TABLE,
+    'where': 'r.id = ?',
+    'placeholders': '?, ?',
+    'lot_filter': 'AND s.lot_id = ?',
+    'user_filter': 'AND r.user_id = ?',
+    "'AND s.id = ?' if preferred is not None else ''": 'AND s.id = ?',
+    '_backend().skip_locked': PostgresBackend.skip_locked,
+    "_backend().skip_locked if lock else ''": PostgresBackend.skip_locked,
+}
+
+# SQLite dialect the translator leaves alone, matched outside string literals
+SQLITE_ISMS = [
+    (re.compile(r'\b(?:datetime|date|julianday|strftime)\s*\(', re.IGNORECASE), 'SQLite date function'),
+    (re.compile(r'\bINSERT\s+OR\s+\w+', re.IGNORECASE), 'INSERT OR ...'),
+    (re.compile(r'\bREPLACE\s+INTO\b', re.IGNORECASE), 'REPLACE INTO'),
+    (re.compile(r'\bGLOB\b', re.IGNORECASE), 'GLOB without a literal pattern'),
+    (re.compile(r'\b(?:IFNULL|group_concat|instr|printf|typeof|total|last_insert_rowid|changes)\s*\(',
+                re.IGNORECASE), 'SQLite-only function'),
+    (re.compile(r'\browid\b|\bsqlite_\w+\b(?!\s*\()', re.IGNORECASE), 'SQLite internals'),
+    (re.compile(r'\b(?:PRAGMA|AUTOINCREMENT|WITHOUT\s+ROWID|MATCH)\b', re.IGNORECASE), 'SQLite-only syntax'),
+    (re.compile(r'\bLIMIT\s+-', re.IGNORECASE), 'negative LIMIT'),
+    (re.compile(r'\?'), 'unbound ? placeholder'),
+]
+
+def _render(node, module):
+    # The SQL text of a string constant or f-string with sample values, and
+    # the interpolated expressions without one
+    if isinstance(node, ast.Constant):
+        return node.value.replace('{bookings}', SAMPLE_VALUES['bookings']), []
+    parts, unknown = [], []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append(value.value.replace('{bookings}', SAMPLE_VALUES['bookings']))
+            continue
+        expression = ast.unparse(value.value)
+        if isinstance(getattr(module, expression, None), (str, int, float)):
+            parts.append(str(getattr(module, expression)))
+        elif expression in SAMPLE_VALUES:
+            parts.append(SAMPLE_VALUES[expression])
+        else:
+            parts.append('')
+            unknown.append(expression)
+    return ''.join(parts), unknown
+
+def collect_statements(module_name):
+    # (location, SQL) for every SQL string literal in the module, in source order
+    module = importlib.import_module(module_name)
+    tree = ast.parse(inspect.getsource(module))
+    skipped = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.Assign)):
+            names = [node.name] if isinstance(node, ast.FunctionDef) else [
+                target.id for target in node.targets if isinstance(target, ast.Name)]
+            if SQLITE_ONLY.intersection(names):
+                skipped.update(id(child) for child in ast.walk(node))
+        if isinstance(node, ast.JoinedStr):
+            # The literal parts of an f-string are nodes of their own
+            skipped.update(id(value) for value in node.values)
+        if isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                if isinstance(key, ast.Constant) and key.value == 'sqlite':
+                    skipped.update(id(child) for child in ast.walk(value))
+    statements = []
+    for node in ast.walk(tree):
+        if id(node) in skipped or not isinstance(node, (ast.Constant, ast.JoinedStr)):
+            continue
+        if isinstance(node, ast.Constant) and not isinstance(node.value, str):
+            continue
+        location = f"{module_name}:{node.lineno}"
+        sql, unknown = _render(node, module)
+        if not SQL_START.match(sql):
+            continue
+        if unknown:
+            statements.append((location, None, f"no sample value for {{{unknown[0]}}} in SAMPLE_VALUES"))
+        else:
+            statements.append((location, sql, None))
+    # ast.walk goes breadth first; report in source order
+    return sorted(statements, key=lambda item: int(item[0].rsplit(':', 1)[1]))
+
+def dialect_problems(sql):
+    statement, _ = translate(sql)
+    code = ' '.join(re.split(r"'(?:[^']|'')*'", statement))
+    return [label for pattern, label in SQLITE_ISMS if pattern.search(code)]
+
+def _literal_parameters(statement):
+    # psycopg binds parameters client-side as literals; NULL stands in for
+    # them so the statement can be prepared without values
+    return re.sub(r'%(%|s)', lambda m: '%' if m.group(1) == '%' else 'NULL', statement)
+
+def prepare_on_postgres(statements):
+    # Parses and plans each translated statement on PostgreSQL without running
+    # it: DDL (temp tables, an archive partition) first so the statements
+    # reading those tables resolve, all inside one transaction rolled back
+    with Flask(__name__).app_context():
+        model.init_db()
+    conn = model.connect()
+    raw = conn.raw
+    failures = []
+    raw.execute('BEGIN')
+    try:
+        ddl = [item for item in statements if DDL.match(item[1])]
+        other = [item for item in statements if not DDL.match(item[1])]
+        for location, sql in ddl + other:
+            statement = translate(sql)[0]
+            if re.match(r'\s*BEGIN\b', statement, re.IGNORECASE):
+                continue
+            raw.execute('SAVEPOINT dialect_check')
+            try:
+                if DDL.match(statement):
+                    raw.execute(_literal_parameters(statement))
+                else:
+                    raw.execute(f'PREPARE dialect_check AS {_literal_parameters(statement)}')
+                    raw.execute('DEALLOCATE dialect_check')
+                raw.execute('RELEASE SAVEPOINT dialect_check')
+            except Exception as e:
+                raw.execute('ROLLBACK TO SAVEPOINT dialect_check')
+                failures.append(f"{location}: PostgreSQL rejects it: {str(e).splitlines()[0]}")
+    finally:
+        raw.execute('ROLLBACK')
+        conn.close()
+    return failures
+
+def check_sql_dialect():
+    failures = []
+    if SCHEMA_VERSION != len(model.MIGRATIONS):
+        failures.append(f"models/postgres_schema.py is at version {SCHEMA_VERSION} "
+                        f"but there are {len(model.MIGRATIONS)} migrations")
+    statements = []
+    for module_name in MODULES:
+        for location, sql, error in collect_statements(module_name):
+            if error:
+                failures.append(f"{location}: {error}")
+                continue
+            statements.append((location, sql))
+            failures.extend(f"{location}: {problem}" for problem in dialect_problems(sql))
+    if model.DATABASE.startswith(('postgresql://', 'postgres://')):
+        failures.extend(prepare_on_postgres(statements))
+    return statements, failures
+
+if __name__ == "__main__":
+    statements, failures = check_sql_dialect()
+    for failure in failures:
+        print(f"[x] {failure}")
+    if failures:
+        sys.exit(1)
+    checked = ('translated and prepared on PostgreSQL' if model.DATABASE.startswith(('postgresql://', 'postgres://'))
+               else 'translated for PostgreSQL')
+    print(f"[✓] {len(statements)} statements {checked}; schema versions match.")
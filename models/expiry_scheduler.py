@@ -0,0 +1,51 @@
+import argparse
+import logging
+import os
+import time
+
+from models.parking_model import fetch_overdue_bookings, init_db, release_overdue_bookings
+
+# Runs as its own process (see Procfile.yaml) rather than inside the web
+# workers; releases only touch bookings that are still active inside a write
+# transaction, so an accidental second scheduler can't double-release
+EXPIRY_INTERVAL = float(os.environ.get('EXPIRY_INTERVAL', 60))
+EXPIRY_BATCH_SIZE = int(os.environ.get('EXPIRY_BATCH_SIZE', 500))
+
+log = logging.getLogger('parking.expiry')
+
+def run_once(batch_size=EXPIRY_BATCH_SIZE):
+    # Drains the backlog in batches so each write transaction stays short
+    total = 0
+    while True:
+        released = release_overdue_bookings(batch_size)
+        total += released
+        if released < batch_size:
+            return total
+
+def run_forever(interval=EXPIRY_INTERVAL, batch_size=EXPIRY_BATCH_SIZE):
+    while True:
+        started = time.perf_counter()
+        try:
+            released = run_once(batch_size)
+            if released:
+                log.info("released %d overdue bookings in %.2fs", released, time.perf_counter() - started)
+        except Exception:
+            log.exception("expiry run failed")
+        time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Release bookings that stayed active past BOOKING_MAX_HOURS.")
+    parser.add_argument('--once', action='store_true', help="drain the backlog once and exit")
+    parser.add_argument('--dry-run', action='store_true', help="list the next overdue bookings without releasing")
+    parser.add_argument('--interval', type=float, default=EXPIRY_INTERVAL)
+    parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    init_db()
+    if args.dry_run:
+        for booking in fetch_overdue_bookings(args.batch_size):
+            print(f"booking {booking['id']}: parked {booking['parking_timestamp']}, due {booking['due_timestamp']}")
+    elif args.once:
+        print(f"[✓] Released {run_once(args.batch_size)} overdue bookings.")
+    else:
+        run_forever(args.interval, args.batch_size)
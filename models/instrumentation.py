@@ -0,0 +1,173 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import sqlite3
+import time
+
+from flask import g, request
+
+from models.metrics import (
+    Gauge,
+    http_request_seconds,
+    model_call_seconds,
+    register,
+    sql_busy_errors,
+    sql_lock_wait_seconds,
+    sql_rows_returned,
+    sql_statement_seconds,
+)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+slow_query_log = logging.getLogger('parking.slow_query')
+
+_current_function = contextvars.ContextVar('current_model_function', default='-')
+
+# SQLITE_BUSY/locked, and PostgreSQL serialization failures, deadlocks and lock timeouts
+BUSY_MESSAGES = ('locked', 'busy', 'could not serialize', 'deadlock detected', 'could not obtain lock')
+
+def is_busy_error(error):
+    message = str(error).lower()
+    return any(text in message for text in BUSY_MESSAGES)
+
+def _statement_kind(sql):
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ''
+
+@contextlib.contextmanager
+def statement_timer(sql):
+    # Times one statement against the model function that issued it; yields
+    # that function's name
+    function = _current_function.get()
+    started = time.perf_counter()
+    try:
+        yield function
+    except Exception as e:
+        if is_busy_error(e):
+            sql_busy_errors.inc(function)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        kind = _statement_kind(sql)
+        sql_statement_seconds.observe(elapsed, function, kind)
+        if kind == 'BEGIN' and 'IMMEDIATE' in sql.upper():
+            sql_lock_wait_seconds.observe(elapsed, function)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_query_log.warning("slow query in %s: %.1f ms: %s", function, elapsed * 1000, ' '.join(sql.split()))
+
+def count_rows(function, amount):
+    sql_rows_returned.inc(function, amount=amount)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times every statement against the model function that issued it and
+    # counts the rows read back through this cursor
+    function = '-'
+
+    def _run(self, method, sql, parameters):
+        with statement_timer(sql) as function:
+            self.function = function
+            return method(sql, parameters)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            sql_rows_returned.inc(self.function)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        sql_rows_returned.inc(self.function, amount=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        sql_rows_returned.inc(self.function, amount=len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        sql_rows_returned.inc(self.function)
+        return row
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def instrument_function(func):
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        token = _current_function.set(func.__name__)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            model_call_seconds.observe(time.perf_counter() - started, func.__name__)
+            _current_function.reset(token)
+    return wrapped
+
+def instrument_functions(namespace, module_name, exclude=()):
+    # Wraps the public functions defined in a module; generators are left
+    # alone since their work happens after the call returns
+    for name, value in list(namespace.items()):
+        if (inspect.isfunction(value) and value.__module__ == module_name and name not in exclude
+                and not name.startswith('_') and not inspect.isgeneratorfunction(value)):
+            namespace[name] = instrument_function(value)
+
+def instrument_app(app):
+    from models.parking_model import (
+        fetch_expiry_status,
+        get_booking_stats,
+        get_cache_stats,
+        get_db_pool_stats,
+        get_pool_stats,
+    )
+    from models import booking_queue
+    from models.password_hasher import get_hash_stats
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            http_request_seconds.observe(time.perf_counter() - started, request.endpoint or 'unmatched',
+                                         request.method, response.status_code)
+        return response
+
+    register(Gauge('parking_db_connections_total', 'Per-request connection reuse (hits) and opens (misses).',
+                   ('result',), lambda: {(key,): value for key, value in get_pool_stats().items()}))
+    # Empty on SQLite, which opens connections directly
+    register(Gauge('parking_db_pool', 'PostgreSQL connection pool counters of this worker.',
+                   ('stat',), lambda: {(key,): value for key, value in get_db_pool_stats().items()}))
+    register(Gauge('parking_bookings', 'Booking engine counters since start.',
+                   ('stat',), lambda: {(key,): value for key, value in get_booking_stats().items()}))
+    register(Gauge('parking_lot_cache', 'Lot read cache counters since start.',
+                   ('stat',), lambda: {(key,): value for key, value in get_cache_stats().items()}))
+    register(Gauge('parking_password_hash_operations', 'Password hash operations since start.',
+                   ('operation',), lambda: {(key,): value if key == 'rejected' else value['count']
+                                            for key, value in get_hash_stats().items()}))
+    # Read from the database: the expiry scheduler runs in its own process
+    register(Gauge('parking_expiry', 'Expiry scheduler backlog (overdue, lag_seconds) and heartbeat.',
+                   ('stat',), lambda: {(key,): value for key, value in fetch_expiry_status().items()
+                                       if value is not None}))
+    if booking_queue.WRITE_BEHIND:
+        # Queued write-behind intents (queued, lag_seconds) and those set aside as failed
+        register(Gauge('parking_booking_queue', 'Write-behind booking queue backlog.',
+                       ('stat',), lambda: {(key,): value for key, value in booking_queue.fetch_queue_status().items()}))
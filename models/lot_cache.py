@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+class VersionedTTLCache:
+    # Bounded LRU cache whose entries expire after `ttl` seconds and are all
+    # dropped as soon as the caller reports a newer data version
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get_or_load(self, key, version, loader):
+        now = time.monotonic()
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self._stats['invalidations'] += 1
+                self._entries.clear()
+                self.version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+        value = loader()
+        with self._lock:
+            if version == self.version and self.max_size > 0:
+                self._entries[key] = (value, now + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
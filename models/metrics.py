@@ -0,0 +1,102 @@
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(self.labels, label_values)} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_label_text(names, label_values + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_bucket{_label_text(names, label_values + ("+Inf",))} {series["count"]}')
+                lines.append(f'{self.name}_sum{_label_text(self.labels, label_values)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_label_text(self.labels, label_values)} {series["count"]}')
+        return lines
+
+class Gauge:
+    # Reads its values from a callback returning {label_values: value} at render time
+    def __init__(self, name, help_text, labels, read):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.read = read
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        for label_values, value in sorted(self.read().items()):
+            lines.append(f'{self.name}{_label_text(self.labels, label_values)} {value}')
+        return lines
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+model_call_seconds = register(Histogram(
+    'parking_model_call_seconds', 'Duration of model function calls.', ('function',)))
+sql_statement_seconds = register(Histogram(
+    'parking_sql_statement_seconds', 'Duration of SQL statements by calling model function.', ('function', 'kind')))
+sql_rows_returned = register(Counter(
+    'parking_sql_rows_returned_total', 'Rows fetched from SQL statements.', ('function',)))
+sql_lock_wait_seconds = register(Histogram(
+    'parking_sql_lock_wait_seconds', 'Time spent acquiring the write lock (BEGIN IMMEDIATE).', ('function',)))
+sql_busy_errors = register(Counter(
+    'parking_sql_busy_errors_total', 'Statements that failed on a busy or locked database.', ('function',)))
+http_request_seconds = register(Histogram(
+    'parking_http_request_seconds', 'HTTP request latency by endpoint and status.', ('endpoint', 'method', 'status')))
@@ -0,0 +1,9 @@
+from models.parking_model import MIGRATIONS, close_db, get_db, get_schema_version, init_db
+
+if __name__ == "__main__":
+    # Run once per deploy so web workers start against an up-to-date schema
+    print("[*] Applying schema migrations...")
+    init_db()
+    conn = get_db()
+    print(f"[✓] Schema at version {get_schema_version(conn)} of {len(MIGRATIONS)}.")
+    close_db(conn)
@@ -1,18 +1,115 @@
-import sqlite3
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import g, has_app_context
 
-DATABASE = 'models/database.db'
+from models.instrumentation import instrument_functions, is_busy_error
+from models.lot_cache import VersionedTTLCache
+from models.pricing import policy as pricing_policy
+from models.storage import get_backend
+
+# A SQLite file path or a postgresql:// URL (see models/storage.py)
+DATABASE = os.environ.get('DATABASE', 'models/database.db')
+
+_stats_lock = threading.Lock()
+_pool_stats = {'hits': 0, 'misses': 0}
+
+def _count(key):
+    with _stats_lock:
+        _pool_stats[key] += 1
+
+def get_pool_stats():
+    with _stats_lock:
+        return dict(_pool_stats)
+
+# Booking retries when another writer holds the database lock
+BOOKING_RETRIES = int(os.environ.get('BOOKING_RETRIES', 5))
+BOOKING_BACKOFF = float(os.environ.get('BOOKING_BACKOFF', 0.02))
+# Walk-in bookings keep clear of spots reserved to start within this many
+# minutes, and reservations may be checked in this early
+RESERVATION_MARGIN_MINUTES = int(os.environ.get('RESERVATION_MARGIN_MINUTES', 60))
+# Bookings still active after this many hours are released by the expiry
+# scheduler, billed up to the limit
+BOOKING_MAX_HOURS = float(os.environ.get('BOOKING_MAX_HOURS', 24))
+# Closed bookings that started more than this many days ago are moved into
+# monthly archive partitions, a batch per write transaction
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 5000))
+
+_booking_stats = {'booked': 0, 'sold_out': 0, 'retries': 0, 'busy': 0, 'errors': 0, 'seconds': 0.0}
+
+def _count_booking(key, amount=1):
+    with _stats_lock:
+        _booking_stats[key] += amount
+
+def get_booking_stats():
+    with _stats_lock:
+        stats = dict(_booking_stats)
+    attempts = stats['booked'] + stats['sold_out'] + stats['busy'] + stats['errors']
+    stats['bookings_per_second'] = stats['booked'] / stats['seconds'] if stats['seconds'] else 0.0
+    stats['contention_rate'] = stats['retries'] / attempts if attempts else 0.0
+    return stats
+
+# Lot catalogue/availability read cache, shared by the threads of one worker.
+# Writes bump the lot_data_version row so other workers drop stale entries.
+LOT_CACHE_SIZE = int(os.environ.get('LOT_CACHE_SIZE', 256))
+LOT_CACHE_TTL = float(os.environ.get('LOT_CACHE_TTL', 5))
+
+lot_cache = VersionedTTLCache(LOT_CACHE_SIZE, LOT_CACHE_TTL)
+
+def get_cache_stats():
+    return lot_cache.stats()
+
+def _backend():
+    return get_backend(DATABASE)
+
+def connect():
+    return _backend().connect()
+
+def get_db_pool_stats():
+    return _backend().pool_stats()
+
+def close_backend():
+    # Closes pooled server connections, e.g. in a preloading master before it forks
+    _backend().close()
 
 def close_db(conn):
-    if conn:
-        conn.close()
+    # The per-request connection is closed by the app teardown, not by callers
+    if not conn:
+        return
+    if has_app_context() and g.get('db') is conn:
+        return
+    conn.close()
 
 def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # One shared connection per app context; scripts outside Flask get their own
+    if not has_app_context():
+        _count('misses')
+        return connect()
+    if 'db' in g:
+        _count('hits')
+        return g.db
+    _count('misses')
+    g.db = connect()
+    return g.db
 
 def init_db():
     conn = get_db()
+    # A database already at the latest version has every table; skip the DDL
+    # so cold workers only pay for one PRAGMA read
+    if get_schema_version(conn) >= len(MIGRATIONS):
+        close_db(conn)
+        return
+    if _backend().name == 'postgresql':
+        # PostgreSQL gets the whole schema at the latest version in one go
+        from models.postgres_schema import create_schema
+        create_schema(conn, len(MIGRATIONS))
+        close_db(conn)
+        return
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -66,24 +163,377 @@ def init_db():
     ''')
 
     conn.commit()
+    migrate(conn)
     close_db(conn)
 
-def add_new_parking_lot(prime_location_name, price, address, pincode, maximum_number_of_spots):
+# Schema changes applied after the base tables, one list of statements (SQL
+# strings or callables taking the connection) per version. The applied
+# version is tracked in PRAGMA user_version, so only append new entries here;
+# never edit ones that have shipped. PostgreSQL has its own schema in
+# models/postgres_schema.py, which must match each entry.
+MIGRATIONS = [
+    [
+        'CREATE INDEX IF NOT EXISTS idx_parking_spot_lot_status ON parking_spot (lot_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_parking_spot_status ON parking_spot (status, lot_id)',
+        'CREATE INDEX IF NOT EXISTS idx_reserve_user_active ON reserve_parking_spot (user_id, is_active)',
+        'CREATE INDEX IF NOT EXISTS idx_reserve_user_time ON reserve_parking_spot (user_id, parking_timestamp DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_reserve_spot_active ON reserve_parking_spot (spot_id, is_active)',
+        'CREATE INDEX IF NOT EXISTS idx_reserve_active_time ON reserve_parking_spot (is_active, parking_timestamp)',
+    ],
+    [
+        # Free/total spot counters per lot and vehicle type, kept exact by
+        # triggers on parking_spot; deleted spots ('X') count towards neither
+        '''
+        CREATE TABLE IF NOT EXISTS lot_availability (
+            lot_id INTEGER NOT NULL,
+            vehicle_type TEXT NOT NULL DEFAULT '',
+            available INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lot_id, vehicle_type)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_spot_availability_insert AFTER INSERT ON parking_spot
+        BEGIN
+            INSERT INTO lot_availability (lot_id, vehicle_type, available, total)
+            VALUES (NEW.lot_id, COALESCE(NEW.vehicle_type, ''), NEW.status = 'A', NEW.status != 'X')
+            ON CONFLICT (lot_id, vehicle_type) DO UPDATE
+            SET available = available + excluded.available, total = total + excluded.total;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_spot_availability_update
+        AFTER UPDATE OF lot_id, status, vehicle_type ON parking_spot
+        BEGIN
+            UPDATE lot_availability
+            SET available = available - (OLD.status = 'A'), total = total - (OLD.status != 'X')
+            WHERE lot_id = OLD.lot_id AND vehicle_type = COALESCE(OLD.vehicle_type, '');
+            INSERT INTO lot_availability (lot_id, vehicle_type, available, total)
+            VALUES (NEW.lot_id, COALESCE(NEW.vehicle_type, ''), NEW.status = 'A', NEW.status != 'X')
+            ON CONFLICT (lot_id, vehicle_type) DO UPDATE
+            SET available = available + excluded.available, total = total + excluded.total;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_spot_availability_delete AFTER DELETE ON parking_spot
+        BEGIN
+            UPDATE lot_availability
+            SET available = available - (OLD.status = 'A'), total = total - (OLD.status != 'X')
+            WHERE lot_id = OLD.lot_id AND vehicle_type = COALESCE(OLD.vehicle_type, '');
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO lot_availability (lot_id, vehicle_type, available, total)
+        SELECT lot_id, COALESCE(vehicle_type, ''), SUM(status = 'A'), SUM(status != 'X')
+        FROM parking_spot
+        GROUP BY lot_id, COALESCE(vehicle_type, '')
+        ''',
+        # maximum_number_of_spots used to double as a free-spot counter; make it the capacity again
+        '''
+        UPDATE parking_lot
+        SET maximum_number_of_spots = (
+            SELECT COUNT(*) FROM parking_spot s WHERE s.lot_id = parking_lot.id AND s.status != 'X'
+        )
+        ''',
+    ],
+    [
+        # Full-text index over lot name and address, synced from parking_lot by triggers
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_fts USING fts5(
+            prime_location_name, address, content='parking_lot', content_rowid='id'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_parking_lot_fts_insert AFTER INSERT ON parking_lot
+        BEGIN
+            INSERT INTO parking_lot_fts (rowid, prime_location_name, address)
+            VALUES (NEW.id, NEW.prime_location_name, NEW.address);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_parking_lot_fts_delete AFTER DELETE ON parking_lot
+        BEGIN
+            INSERT INTO parking_lot_fts (parking_lot_fts, rowid, prime_location_name, address)
+            VALUES ('delete', OLD.id, OLD.prime_location_name, OLD.address);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_parking_lot_fts_update
+        AFTER UPDATE OF prime_location_name, address ON parking_lot
+        BEGIN
+            INSERT INTO parking_lot_fts (parking_lot_fts, rowid, prime_location_name, address)
+            VALUES ('delete', OLD.id, OLD.prime_location_name, OLD.address);
+            INSERT INTO parking_lot_fts (rowid, prime_location_name, address)
+            VALUES (NEW.id, NEW.prime_location_name, NEW.address);
+        END
+        ''',
+        "INSERT INTO parking_lot_fts (parking_lot_fts) VALUES ('rebuild')",
+        'CREATE INDEX IF NOT EXISTS idx_parking_lot_pincode ON parking_lot (pincode)',
+    ],
+    [
+        # Lot coordinates with an R*Tree over them for nearest-lot lookups
+        'ALTER TABLE parking_lot ADD COLUMN latitude REAL',
+        'ALTER TABLE parking_lot ADD COLUMN longitude REAL',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_rtree USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_parking_lot_rtree_insert AFTER INSERT ON parking_lot
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO parking_lot_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_parking_lot_rtree_update AFTER UPDATE OF latitude, longitude ON parking_lot
+        BEGIN
+            DELETE FROM parking_lot_rtree WHERE id = OLD.id;
+            INSERT INTO parking_lot_rtree
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_parking_lot_rtree_delete AFTER DELETE ON parking_lot
+        BEGIN
+            DELETE FROM parking_lot_rtree WHERE id = OLD.id;
+        END
+        ''',
+    ],
+    [
+        # Single-row counter bumped by every write that changes lots or availability
+        'CREATE TABLE IF NOT EXISTS lot_data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO lot_data_version (id, version) VALUES (1, 0)',
+    ],
+    [
+        # Usage rollups for the summary charts: lots per hour and per day from
+        # released bookings, users per lot per day from bookings
+        '''
+        CREATE TABLE IF NOT EXISTS lot_usage_hourly (
+            lot_id INTEGER NOT NULL,
+            hour TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            occupied_minutes REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (lot_id, hour)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS lot_usage_daily (
+            lot_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            occupied_minutes REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (lot_id, day)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_lot_usage_daily_day ON lot_usage_daily (day, lot_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS user_lot_usage_daily (
+            user_id INTEGER NOT NULL,
+            lot_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, lot_id)
+        ) WITHOUT ROWID
+        ''',
+        lambda conn: _rebuild_usage_rollups(conn),
+    ],
+    [
+        # Processed gate events, so replaying an ingestion file is a no-op
+        '''
+        CREATE TABLE IF NOT EXISTS gate_event_log (
+            event_id TEXT PRIMARY KEY,
+            event_type TEXT NOT NULL,
+            booking_id INTEGER,
+            status TEXT NOT NULL,
+            processed_at DATETIME NOT NULL DEFAULT (datetime('now','localtime'))
+        )
+        ''',
+    ],
+    [
+        # Keyset paging of history needs the id tiebreaker in the index; exports
+        # scan by time across all users
+        'CREATE INDEX IF NOT EXISTS idx_reserve_user_time_id ON reserve_parking_spot (user_id, parking_timestamp, id)',
+        'DROP INDEX IF EXISTS idx_reserve_user_time',
+        'CREATE INDEX IF NOT EXISTS idx_reserve_time ON reserve_parking_spot (parking_timestamp)',
+    ],
+    [
+        # Advance reservations for a time window. Windows on one spot never
+        # overlap, so per spot they are sorted by end as well as start, and the
+        # partial index finds the first live one ending after any instant
+        '''
+        CREATE TABLE IF NOT EXISTS advance_reservation (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot_id INTEGER NOT NULL,
+            spot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            start_ts DATETIME NOT NULL,
+            end_ts DATETIME NOT NULL,
+            vehicle_type TEXT,
+            cost_per_unit_time REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'R',
+            booking_id INTEGER,
+            created_at DATETIME NOT NULL DEFAULT (datetime('now','localtime')),
+            CHECK (start_ts < end_ts),
+            FOREIGN KEY (lot_id) REFERENCES parking_lot(id),
+            FOREIGN KEY (spot_id) REFERENCES parking_spot(id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_advance_spot_end ON advance_reservation (spot_id, end_ts) WHERE status = 'R'",
+        'CREATE INDEX IF NOT EXISTS idx_advance_user_start ON advance_reservation (user_id, start_ts)',
+    ],
+    [
+        # Heartbeat of the expiry scheduler, read by /metrics in the web workers
+        '''
+        CREATE TABLE IF NOT EXISTS expiry_scheduler_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_run_at DATETIME,
+            released_total INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        'INSERT OR IGNORE INTO expiry_scheduler_state (id, released_total) VALUES (1, 0)',
+    ],
+    [
+        # Catalog of the monthly archive partitions (booking_archive_YYYY_MM)
+        # that closed bookings are moved into; start_ts/end_ts bound the
+        # parking_timestamp of their rows, so reads union only those they need
+        '''
+        CREATE TABLE IF NOT EXISTS booking_archive_partition (
+            name TEXT PRIMARY KEY,
+            start_ts DATETIME NOT NULL,
+            end_ts DATETIME NOT NULL,
+            min_id INTEGER,
+            max_id INTEGER,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            archived_at DATETIME
+        )
+        ''',
+    ],
+    [
+        # The occupant's vehicle is recorded on the booking; parking_spot keeps
+        # the type the spot was set up for. Existing bookings, archived ones
+        # included, take their spot's current type, which was the last
+        # occupant's
+        'ALTER TABLE reserve_parking_spot ADD COLUMN vehicle_type TEXT',
+        lambda conn: _add_archive_vehicle_type(conn),
+        '''
+        UPDATE reserve_parking_spot
+        SET vehicle_type = (SELECT s.vehicle_type FROM parking_spot s WHERE s.id = reserve_parking_spot.spot_id)
+        ''',
+    ],
+]
+
+def _add_archive_vehicle_type(conn):
+    for row in conn.execute('SELECT name FROM booking_archive_partition').fetchall():
+        conn.execute(f'ALTER TABLE {row["name"]} ADD COLUMN vehicle_type TEXT')
+        conn.execute(f'''
+            UPDATE {row["name"]}
+            SET vehicle_type = (SELECT s.vehicle_type FROM parking_spot s WHERE s.id = {row["name"]}.spot_id)
+        ''')
+
+def _bump_lot_version(conn):
+    conn.execute('UPDATE lot_data_version SET version = version + 1 WHERE id = 1')
+
+def invalidate_lot_cache():
+    conn = get_db()
+    _bump_lot_version(conn)
+    conn.commit()
+    close_db(conn)
+    lot_cache.clear()
+
+_lot_change_listeners = []
+
+def add_lot_change_listener(listener):
+    _lot_change_listeners.append(listener)
+
+def _notify_lot_change():
+    for listener in _lot_change_listeners:
+        listener()
+
+def _cached_lot_read(key, loader):
+    conn = get_db()
+    version = conn.execute('SELECT version FROM lot_data_version WHERE id = 1').fetchone()[0]
+    close_db(conn)
+    return lot_cache.get_or_load(key, version, loader)
+
+def get_schema_version(conn):
+    return _backend().get_schema_version(conn)
+
+def migrate(conn):
+    if get_schema_version(conn) >= len(MIGRATIONS):
+        return
+    # Re-check under the write lock so concurrent workers migrate only once
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = get_schema_version(conn)
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            _backend().set_schema_version(conn, number)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def add_new_parking_lot(prime_location_name, price, address, pincode, maximum_number_of_spots,
+                        latitude=None, longitude=None):
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO parking_lot (prime_location_name, price, address, pincode, maximum_number_of_spots)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (prime_location_name, price, address, pincode, maximum_number_of_spots))
+        INSERT INTO parking_lot (prime_location_name, price, address, pincode, maximum_number_of_spots, latitude, longitude)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (prime_location_name, price, address, pincode, maximum_number_of_spots, latitude, longitude))
     lot_id = cursor.lastrowid
-    for i in range(1, maximum_number_of_spots + 1):
-        spot_number = f"A{i}"
+    _insert_spots(cursor, lot_id, maximum_number_of_spots, 'A', 1, None, False)
+    _bump_lot_version(conn)
+    conn.commit()
+    close_db(conn)
+    return lot_id
+
+def _insert_spots(cursor, lot_id, count, prefix, start, vehicle_type, is_handicap_accessible):
+    # Generate the whole numbered range inside the database in a single statement
+    cursor.execute('''
+        WITH RECURSIVE seq(n) AS (
+            SELECT CAST(? AS INTEGER) WHERE ? > 0
+            UNION ALL
+            SELECT n + 1 FROM seq WHERE n < ?
+        )
+        INSERT INTO parking_spot (lot_id, status, spot_number, vehicle_type, is_handicap_accessible)
+        SELECT ?, 'A', ? || n, ?, ? FROM seq
+    ''', (start, count, start + count - 1, lot_id, prefix, vehicle_type, int(is_handicap_accessible)))
+    return max(count, 0)
+
+def add_parking_spots(lot_id, count, prefix='A', start=None, vehicle_type=None, is_handicap_accessible=False):
+    # Numbering continues after the highest existing spot with the same prefix
+    # unless an explicit start is given, e.g. prefix 'F2-R3-' for floor 2 row 3
+    conn = get_db()
+    cursor = conn.cursor()
+    if start is None:
         cursor.execute('''
-            INSERT INTO parking_spot (lot_id, status, spot_number, vehicle_type, is_handicap_accessible)
-            VALUES (?, 'A', ?, NULL, 0)
-        ''', (lot_id, spot_number))
+            SELECT substr(spot_number, ?) AS number
+            FROM parking_spot
+            WHERE lot_id = ? AND substr(spot_number, 1, ?) = ?
+        ''', (len(prefix) + 1, lot_id, len(prefix), prefix))
+        numbers = [re.match(r'\d*', row['number']).group() for row in cursor.fetchall()]
+        start = max((int(number) for number in numbers if number), default=0) + 1
+    added = _insert_spots(cursor, lot_id, count, prefix, start, vehicle_type, is_handicap_accessible)
+    cursor.execute('''
+        UPDATE parking_lot
+        SET maximum_number_of_spots = maximum_number_of_spots + ?
+        WHERE id = ?
+    ''', (added, lot_id))
+    _bump_lot_version(conn)
     conn.commit()
     close_db(conn)
+    return added
 
 def add_user(name, email, password, address, pincode):
     conn = get_db()
@@ -93,40 +543,252 @@ def add_user(name, email, password, address, pincode):
     conn.commit()
     close_db(conn)
 
-def book_parking_spot(lot_id, user_id, spot_number, vehicle_type, cost_per_unit_time):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id FROM parking_spot
-        WHERE lot_id = ? AND status = 'A'
+def _claim_spot(conn, lot_id, user_id, spot_id, vehicle_type, cost_per_unit_time):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        booking_id = _insert_booking(conn, lot_id, user_id, vehicle_type, cost_per_unit_time, spot_id=spot_id)
+        if booking_id is None:
+            conn.rollback()
+            return None
+        _bump_lot_version(conn)
+        conn.commit()
+        return booking_id
+    except Exception:
+        conn.rollback()
+        raise
+
+# A spot is bookable when it is free and its next reservation starts no
+# sooner than the margin after the booking; spots inside the margin are left
+# for that reservation
+BOOKABLE_SPOT = '''
+    s.lot_id = ? AND s.status = 'A'
+    AND COALESCE((
+        SELECT r.start_ts FROM advance_reservation r
+        WHERE r.spot_id = s.id AND r.status = 'R' AND r.end_ts > COALESCE(?, datetime('now','localtime'))
+        ORDER BY r.end_ts
         LIMIT 1
-    ''', (lot_id,))
-    spot = cursor.fetchone()
-    if not spot:
+    ), '9999-99-99') >= datetime(COALESCE(?, datetime('now','localtime')), ?)
+'''
+
+def _insert_booking(conn, lot_id, user_id, vehicle_type, cost_per_unit_time, parking_timestamp=None, spot_id=None):
+    # Claims a free spot and records the booking inside the caller's write
+    # transaction; returns None when the lot has no free spot. A preferred
+    # spot_id is claimed if it is still bookable, any other spot otherwise
+    params = (lot_id, parking_timestamp, parking_timestamp, f'+{RESERVATION_MARGIN_MINUTES} minutes')
+    for preferred in ((spot_id,) if spot_id is not None else ()) + (None,):
+        claimed = conn.execute(f'''
+            UPDATE parking_spot
+            SET status = 'O'
+            WHERE id = (
+                SELECT s.id FROM parking_spot s
+                WHERE {BOOKABLE_SPOT} {'AND s.id = ?' if preferred is not None else ''}
+                LIMIT 1 {_backend().skip_locked}
+            ) AND status = 'A'
+            RETURNING id
+        ''', params + ((preferred,) if preferred is not None else ())).fetchall()
+        if claimed:
+            return _record_booking(conn, claimed[0]['id'], lot_id, user_id, vehicle_type, cost_per_unit_time,
+                                   parking_timestamp)
+    return None
+
+def _record_booking(conn, spot_id, lot_id, user_id, vehicle_type, cost_per_unit_time, parking_timestamp=None):
+    booking_id = conn.execute('''
+        INSERT INTO reserve_parking_spot
+            (spot_id, user_id, vehicle_type, parking_timestamp, parking_cost_per_unit_time, is_active)
+        VALUES (?, ?, ?, COALESCE(?, datetime('now','localtime')), ?, 1)
+    ''', (spot_id, user_id, vehicle_type, parking_timestamp, cost_per_unit_time)).lastrowid
+    conn.execute('''
+        INSERT INTO user_lot_usage_daily (user_id, lot_id, day, bookings)
+        VALUES (?, ?, date(COALESCE(?, datetime('now','localtime'))), 1)
+        ON CONFLICT (user_id, day, lot_id) DO UPDATE SET bookings = user_lot_usage_daily.bookings + 1
+    ''', (user_id, lot_id, parking_timestamp))
+    return booking_id
+
+def book_parking_spot(lot_id, user_id, spot_id, vehicle_type, cost_per_unit_time=None):
+    # Claim and record the spot inside one write transaction so concurrent
+    # workers can never hand out the same spot twice. The spot_id the user
+    # picked is taken if it is still bookable, any free spot otherwise.
+    # Without a rate the booking is quoted now and keeps that rate until it
+    # is released
+    if cost_per_unit_time is None:
+        cost_per_unit_time = quote_parking_rate(lot_id, vehicle_type)
+        if cost_per_unit_time is None:
+            raise Exception("Parking lot not found.")
+    conn = get_db()
+    started = time.perf_counter()
+    try:
+        for attempt in range(BOOKING_RETRIES + 1):
+            try:
+                booking_id = _claim_spot(conn, lot_id, user_id, spot_id, vehicle_type, cost_per_unit_time)
+                break
+            except Exception as e:
+                # Only a locked database is retried and counted as busy
+                busy = isinstance(e, _backend().OperationalError) and is_busy_error(e)
+                if not busy or attempt == BOOKING_RETRIES:
+                    _count_booking('busy' if busy else 'errors')
+                    raise
+                _count_booking('retries')
+                time.sleep(BOOKING_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+    finally:
+        _count_booking('seconds', time.perf_counter() - started)
         close_db(conn)
+    if booking_id is None:
+        _count_booking('sold_out')
         raise Exception("No available parking spots in the selected lot.")
-    spot_id = spot['id']
-    cursor.execute('''
-        UPDATE parking_spot
-        SET status = 'O', vehicle_type = ?, spot_number = ?
-        WHERE id = ?
-    ''', (vehicle_type, spot_number, spot_id))
-    cursor.execute('''
-        INSERT INTO reserve_parking_spot (spot_id, user_id, parking_timestamp, parking_cost_per_unit_time, is_active)
-        VALUES (?, ?, datetime('now','localtime'), ?, 1)
-    ''', (spot_id, user_id, cost_per_unit_time))
-    cursor.execute('''
-        UPDATE parking_lot
-        SET maximum_number_of_spots = maximum_number_of_spots - 1
-        WHERE id = ? AND maximum_number_of_spots > 0
-    ''', (lot_id,))
+    _count_booking('booked')
+    _notify_lot_change()
+    return booking_id
+
+def _free_spot_for_window(conn, lot_id, start_ts, end_ts, lock=False):
+    # A spot is free for [start, end) when its first live reservation ending
+    # after start begins at or after end: one index seek per spot, however
+    # many reservations exist. Occupied spots only qualify for windows that
+    # start beyond the margin. With lock, concurrent reservers on PostgreSQL
+    # skip the spot until this transaction ends.
+    return conn.execute(f'''
+        SELECT s.id, s.spot_number FROM parking_spot s
+        WHERE s.lot_id = ? AND s.status != 'X'
+          AND (s.status = 'A' OR ? >= datetime('now','localtime', ?))
+          AND COALESCE((
+              SELECT r.start_ts FROM advance_reservation r
+              WHERE r.spot_id = s.id AND r.status = 'R' AND r.end_ts > ?
+              ORDER BY r.end_ts
+              LIMIT 1
+          ), '9999-99-99') >= ?
+        LIMIT 1 {_backend().skip_locked if lock else ''}
+    ''', (lot_id, start_ts, f'+{RESERVATION_MARGIN_MINUTES} minutes', start_ts, end_ts)).fetchone()
+
+def find_free_spot_for_window(lot_id, start_ts, end_ts):
+    conn = get_db()
+    spot = _free_spot_for_window(conn, lot_id, start_ts, end_ts)
+    close_db(conn)
+    return spot
+
+def reserve_parking_window(lot_id, user_id, start_ts, end_ts, vehicle_type, cost_per_unit_time=None):
+    # Timestamps are 'YYYY-MM-DD HH:MM:SS' local time, like parking_timestamp.
+    # Without a rate the window is quoted for its start hour
+    if start_ts >= end_ts:
+        raise Exception("A reservation must end after it starts.")
+    if end_ts <= datetime.now().strftime('%Y-%m-%d %H:%M:%S'):
+        raise Exception("The reservation window is already over.")
+    if cost_per_unit_time is None:
+        cost_per_unit_time = quote_parking_rate(lot_id, vehicle_type, start_ts)
+        if cost_per_unit_time is None:
+            raise Exception("Parking lot not found.")
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        spot = _free_spot_for_window(conn, lot_id, start_ts, end_ts, lock=True)
+        if spot is None:
+            raise Exception("No spot in the selected lot is free for that window.")
+        reservation_id = conn.execute('''
+            INSERT INTO advance_reservation (lot_id, spot_id, user_id, start_ts, end_ts, vehicle_type, cost_per_unit_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (lot_id, spot['id'], user_id, start_ts, end_ts, vehicle_type, cost_per_unit_time)).lastrowid
+        # Held reservations count against the lot's free spots
+        _bump_lot_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+    _notify_lot_change()
+    return reservation_id
+
+def cancel_reservation(reservation_id):
+    conn = get_db()
+    cursor = conn.execute("UPDATE advance_reservation SET status = 'C' WHERE id = ? AND status = 'R'",
+                          (reservation_id,))
+    if cursor.rowcount:
+        _bump_lot_version(conn)
     conn.commit()
     close_db(conn)
+    if cursor.rowcount == 0:
+        raise Exception("Reservation not found or no longer active.")
+    _notify_lot_change()
+
+def check_in_reservation(reservation_id):
+    # Turns a reservation into a regular booking on the reserved spot; check-in
+    # opens RESERVATION_MARGIN_MINUTES before the window starts
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        reservation = conn.execute('''
+            SELECT *, datetime('now','localtime') >= datetime(start_ts, ?) AS is_open,
+                   datetime('now','localtime') < end_ts AS is_current
+            FROM advance_reservation
+            WHERE id = ? AND status = 'R'
+        ''', (f'-{RESERVATION_MARGIN_MINUTES} minutes', reservation_id)).fetchone()
+        if reservation is None:
+            raise Exception("Reservation not found or no longer active.")
+        if not reservation['is_open']:
+            raise Exception("Check-in for this reservation has not opened yet.")
+        if not reservation['is_current']:
+            raise Exception("The reservation window is already over.")
+        spot_id = reservation['spot_id']
+        claimed = conn.execute('''
+            UPDATE parking_spot SET status = 'O' WHERE id = ? AND status = 'A' RETURNING id
+        ''', (spot_id,)).fetchall()
+        if not claimed:
+            # Walk-ins are open-ended, so the reserved spot may still be taken:
+            # move the reservation to any spot free until its window ends
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            spot = _free_spot_for_window(conn, reservation['lot_id'], now, reservation['end_ts'], lock=True)
+            claimed = spot and conn.execute('''
+                UPDATE parking_spot SET status = 'O' WHERE id = ? AND status = 'A' RETURNING id
+            ''', (spot['id'],)).fetchall()
+            if not claimed:
+                raise Exception("No spot in the lot is free for the rest of the reservation.")
+            spot_id = spot['id']
+        booking_id = _record_booking(conn, spot_id, reservation['lot_id'], reservation['user_id'],
+                                     reservation['vehicle_type'], reservation['cost_per_unit_time'])
+        conn.execute("UPDATE advance_reservation SET status = 'U', spot_id = ?, booking_id = ? WHERE id = ?",
+                     (spot_id, booking_id, reservation_id))
+        _bump_lot_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+    _notify_lot_change()
+    return booking_id
+
+def fetch_reservations_by_user(user_id):
+    # Upcoming and current reservations, soonest first
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT r.*, p.prime_location_name AS lot_name, s.spot_number
+        FROM advance_reservation r
+        JOIN parking_spot s ON r.spot_id = s.id
+        JOIN parking_lot p ON r.lot_id = p.id
+        WHERE r.user_id = ? AND r.status = 'R' AND r.end_ts > datetime('now','localtime')
+        ORDER BY r.start_ts
+    ''', (user_id,))
+    reservations = cursor.fetchall()
+    close_db(conn)
+    return reservations
+
+def get_reservation_by_id(reservation_id):
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT r.*, p.prime_location_name AS lot_name, s.spot_number
+        FROM advance_reservation r
+        JOIN parking_spot s ON r.spot_id = s.id
+        JOIN parking_lot p ON r.lot_id = p.id
+        WHERE r.id = ?
+    ''', (reservation_id,))
+    reservation = cursor.fetchone()
+    close_db(conn)
+    return reservation
 
 def delete_parking_lot(lot_id):
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM parking_lot WHERE id = ?', (lot_id,))
+    cursor.execute("UPDATE advance_reservation SET status = 'C' WHERE lot_id = ? AND status = 'R'", (lot_id,))
+    _bump_lot_version(conn)
     conn.commit()
     close_db(conn)
 
@@ -138,18 +800,20 @@ def delete_parking_spot(spot_id):
     if result:
         lot_id = result['lot_id']
         cursor.execute("UPDATE parking_spot SET status = 'X' WHERE id = ?", (spot_id,))
+        cursor.execute("UPDATE advance_reservation SET status = 'C' WHERE spot_id = ? AND status = 'R'", (spot_id,))
         cursor.execute('''
             UPDATE parking_lot
             SET maximum_number_of_spots = maximum_number_of_spots - 1
             WHERE id = ? AND maximum_number_of_spots > 0
         ''', (lot_id,))
+        _bump_lot_version(conn)
         conn.commit()
     close_db(conn)
 
 def fetch_active_bookings_by_user(user_id):
     conn = get_db()
     cursor = conn.execute('''
-        SELECT r.id, p.prime_location_name AS lot_name, s.spot_number AS spot_no, r.parking_timestamp
+        SELECT r.*, p.prime_location_name AS lot_name, s.lot_id, s.spot_number, s.spot_number AS spot_no
         FROM reserve_parking_spot r
         JOIN parking_spot s ON r.spot_id = s.id
         JOIN parking_lot p ON s.lot_id = p.id
@@ -160,16 +824,262 @@ def fetch_active_bookings_by_user(user_id):
     return bookings
 
 def fetch_all_parking_lots():
+    return _cached_lot_read(('all_lots',), _load_all_parking_lots)
+
+def _load_all_parking_lots():
     conn = get_db()
-    cursor = conn.execute('''SELECT * FROM parking_lot pl
-        JOIN parking_spot ps ON pl.id = ps.lot_id
-        WHERE ps.status = 'A'
+    cursor = conn.execute('''
+        SELECT pl.*, SUM(a.available) AS availability
+        FROM parking_lot pl
+        JOIN lot_availability a ON pl.id = a.lot_id
         GROUP BY pl.id
+        HAVING SUM(a.available) > 0
     ''')
     lots = cursor.fetchall()
     close_db(conn)
     return lots
 
+def _fts_query(text):
+    # Quote every word so user input can't inject FTS syntax, and match prefixes
+    words = re.findall(r'\w+', text)
+    if _backend().name == 'postgresql':
+        return ' & '.join(f"'{word}':*" for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+# Full-text lot search: FTS5 in SQLite, a tsvector expression index in
+# PostgreSQL; both take the match expression and the limit
+LOT_SEARCH_QUERIES = {
+    'sqlite': '''
+        SELECT pl.*, (SELECT SUM(available) FROM lot_availability WHERE lot_id = pl.id) AS availability
+        FROM parking_lot_fts f
+        JOIN parking_lot pl ON pl.id = f.rowid
+        WHERE parking_lot_fts MATCH ? AND (SELECT SUM(available) FROM lot_availability WHERE lot_id = pl.id) > 0
+        ORDER BY f.rank
+        LIMIT ?
+    ''',
+    'postgresql': '''
+        WITH q AS (SELECT to_tsquery('simple', ?) AS query)
+        SELECT pl.*, (SELECT SUM(available) FROM lot_availability WHERE lot_id = pl.id) AS availability
+        FROM parking_lot pl, q
+        WHERE to_tsvector('simple', pl.prime_location_name || ' ' || pl.address) @@ q.query
+          AND (SELECT SUM(available) FROM lot_availability WHERE lot_id = pl.id) > 0
+        ORDER BY ts_rank(to_tsvector('simple', pl.prime_location_name || ' ' || pl.address), q.query) DESC
+        LIMIT ?
+    ''',
+}
+
+def search_parking_lots(query, limit=50):
+    return _cached_lot_read(('search', query, limit), lambda: _load_search_results(query, limit))
+
+def _load_search_results(query, limit):
+    # Pincode prefix matches rank first, then full-text matches by relevance
+    conn = get_db()
+    lots = []
+    if query.isdigit():
+        cursor = conn.execute('''
+            SELECT pl.*, (SELECT SUM(available) FROM lot_availability WHERE lot_id = pl.id) AS availability
+            FROM parking_lot pl
+            WHERE pl.pincode >= ? AND pl.pincode < ?
+              AND (SELECT SUM(available) FROM lot_availability WHERE lot_id = pl.id) > 0
+            ORDER BY pl.pincode
+            LIMIT ?
+        ''', (query, query + ':', limit))
+        lots.extend(cursor.fetchall())
+    match = _fts_query(query)
+    if match and len(lots) < limit:
+        seen = {lot['id'] for lot in lots}
+        cursor = conn.execute(LOT_SEARCH_QUERIES[_backend().name], (match, limit))
+        lots.extend(lot for lot in cursor.fetchall() if lot['id'] not in seen)
+    close_db(conn)
+    return lots[:limit]
+
+EARTH_RADIUS_KM = 6371.0
+NEAREST_START_RADIUS_KM = 2.0
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def find_nearest_lots(latitude, longitude, limit=5, vehicle_type=None):
+    # Search a bounding box in the R*Tree and double it until it holds enough
+    # lots with free spots; untyped spots suit any vehicle type and types
+    # match whatever their case
+    if vehicle_type is not None:
+        vehicle_type = vehicle_type.lower()
+    conn = get_db()
+    radius = NEAREST_START_RADIUS_KM
+    while True:
+        dlat = math.degrees(radius / EARTH_RADIUS_KM)
+        cos_lat = math.cos(math.radians(latitude))
+        dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+        cursor = conn.execute('''
+            SELECT pl.*, (
+                SELECT SUM(available) FROM lot_availability
+                WHERE lot_id = pl.id AND (? IS NULL OR lower(vehicle_type) IN (?, ''))
+            ) AS availability
+            FROM parking_lot_rtree r
+            JOIN parking_lot pl ON pl.id = r.id
+            WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?
+        ''', (vehicle_type, vehicle_type, latitude + dlat, latitude - dlat, longitude + dlon, longitude - dlon))
+        lots = []
+        for lot in cursor.fetchall():
+            if not lot['availability']:
+                continue
+            distance = _distance_km(latitude, longitude, lot['latitude'], lot['longitude'])
+            if distance <= radius:
+                lots.append(dict(lot, distance_km=round(distance, 3)))
+        if len(lots) >= limit or radius >= math.pi * EARTH_RADIUS_KM:
+            break
+        radius *= 2
+    close_db(conn)
+    lots.sort(key=lambda lot: lot['distance_km'])
+    return lots[:limit]
+
+def locate_pincode(pincode):
+    # Approximate a pincode by the centre of the lots sharing its longest prefix
+    conn = get_db()
+    origin = None
+    for length in range(len(pincode), 0, -1):
+        prefix = pincode[:length]
+        row = conn.execute('''
+            SELECT AVG(latitude), AVG(longitude) FROM parking_lot
+            WHERE pincode >= ? AND pincode < ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+        ''', (prefix, prefix + ':')).fetchone()
+        if row[0] is not None:
+            origin = (row[0], row[1])
+            break
+    close_db(conn)
+    return origin
+
+def fetch_lot_availability(lot_id, vehicle_type=None):
+    # Free spots set up for the vehicle type, whatever its case, or untyped
+    if vehicle_type is not None:
+        vehicle_type = vehicle_type.lower()
+    return _cached_lot_read(('availability', lot_id, vehicle_type),
+                            lambda: _load_lot_availability(lot_id, vehicle_type))
+
+def _load_lot_availability(lot_id, vehicle_type):
+    conn = get_db()
+    if vehicle_type is None:
+        cursor = conn.execute('''
+            SELECT COALESCE(SUM(available), 0) FROM lot_availability WHERE lot_id = ?
+        ''', (lot_id,))
+    else:
+        cursor = conn.execute('''
+            SELECT COALESCE(SUM(available), 0) FROM lot_availability
+            WHERE lot_id = ? AND lower(vehicle_type) IN (?, '')
+        ''', (lot_id, vehicle_type))
+    available = cursor.fetchone()[0]
+    close_db(conn)
+    return available
+
+def quote_parking_rate(lot_id, vehicle_type, at=None):
+    # Per-hour rate for a booking starting at `at` ('YYYY-MM-DD HH:MM:SS',
+    # default now) from the lot's base price and current occupancy; None for
+    # an unknown lot
+    lot = _cached_lot_read(('pricing', lot_id), lambda: _load_lot_pricing(lot_id))
+    if lot is None:
+        return None
+    price, available, total = lot
+    occupancy = (total - available) / total if total else 0.0
+    hour = int(at[11:13]) if at else datetime.now().hour
+    return pricing_policy.rate(price, hour, vehicle_type, occupancy)
+
+def _load_lot_pricing(lot_id):
+    conn = get_db()
+    row = conn.execute('''
+        SELECT pl.price, COALESCE(SUM(a.available), 0), COALESCE(SUM(a.total), 0)
+        FROM parking_lot pl
+        LEFT JOIN lot_availability a ON a.lot_id = pl.id
+        WHERE pl.id = ?
+        GROUP BY pl.id, pl.price
+    ''', (lot_id,)).fetchone()
+    close_db(conn)
+    return (float(row[0] or 0), row[1], row[2]) if row else None
+
+def fetch_free_spots(lot_id):
+    # Bookable (spot id, spot number) pairs of a lot, as a walk-in booking
+    # would see them now
+    return _cached_lot_read(('free_spots', lot_id), lambda: _load_free_spots(lot_id))
+
+def _load_free_spots(lot_id):
+    conn = get_db()
+    spots = conn.execute(f'''
+        SELECT s.id, s.spot_number FROM parking_spot s
+        WHERE {BOOKABLE_SPOT}
+        ORDER BY s.id
+    ''', (lot_id, None, None, f'+{RESERVATION_MARGIN_MINUTES} minutes')).fetchall()
+    close_db(conn)
+    return tuple((spot['id'], spot['spot_number']) for spot in spots)
+
+def reconcile_lot_availability(repair=False):
+    # Compare the trigger-maintained counters with a recount of parking_spot
+    conn = get_db()
+    cursor = conn.execute('''
+        WITH actual AS (
+            SELECT lot_id, COALESCE(vehicle_type, '') AS vehicle_type,
+                   SUM(status = 'A') AS available, SUM(status != 'X') AS total
+            FROM parking_spot
+            GROUP BY lot_id, COALESCE(vehicle_type, '')
+        ),
+        keys AS (
+            SELECT lot_id, vehicle_type FROM actual
+            UNION
+            SELECT lot_id, vehicle_type FROM lot_availability
+        )
+        SELECT k.lot_id, k.vehicle_type,
+               COALESCE(a.available, 0) AS counted_available, COALESCE(c.available, 0) AS actual_available,
+               COALESCE(a.total, 0) AS counted_total, COALESCE(c.total, 0) AS actual_total
+        FROM keys k
+        LEFT JOIN lot_availability a ON a.lot_id = k.lot_id AND a.vehicle_type = k.vehicle_type
+        LEFT JOIN actual c ON c.lot_id = k.lot_id AND c.vehicle_type = k.vehicle_type
+        WHERE COALESCE(a.available, 0) != COALESCE(c.available, 0)
+           OR COALESCE(a.total, 0) != COALESCE(c.total, 0)
+    ''')
+    drift = cursor.fetchall()
+    if drift and repair:
+        conn.execute('DELETE FROM lot_availability')
+        conn.execute('''
+            INSERT INTO lot_availability (lot_id, vehicle_type, available, total)
+            SELECT lot_id, COALESCE(vehicle_type, ''), SUM(status = 'A'), SUM(status != 'X')
+            FROM parking_spot
+            GROUP BY lot_id, COALESCE(vehicle_type, '')
+        ''')
+        _bump_lot_version(conn)
+        conn.commit()
+    close_db(conn)
+    return drift
+
+def reconcile_spot_status(repair=False):
+    # A spot is occupied exactly when it has an active booking. Lists the
+    # spots where parking_spot.status disagrees (occupied with no booking, or
+    # free under one); repair follows the bookings, re-checked per spot at
+    # update time so a booking or release in between is not undone
+    conn = get_db()
+    drift = conn.execute('''
+        SELECT s.id AS spot_id, s.lot_id, s.status, COUNT(r.id) AS active_bookings
+        FROM parking_spot s
+        LEFT JOIN reserve_parking_spot r ON r.spot_id = s.id AND r.is_active = 1
+        WHERE s.status != 'X'
+        GROUP BY s.id, s.lot_id, s.status
+        HAVING (s.status = 'O') != (COUNT(r.id) > 0)
+    ''').fetchall()
+    if drift and repair:
+        conn.executemany('''
+            UPDATE parking_spot
+            SET status = CASE WHEN EXISTS (
+                SELECT 1 FROM reserve_parking_spot r WHERE r.spot_id = parking_spot.id AND r.is_active = 1
+            ) THEN 'O' ELSE 'A' END
+            WHERE id = ? AND status != 'X'
+        ''', [(row['spot_id'],) for row in drift])
+        _bump_lot_version(conn)
+        conn.commit()
+    close_db(conn)
+    if drift and repair:
+        _notify_lot_change()
+    return drift
+
 def fetch_all_users():
     conn = get_db()
     cursor = conn.execute('SELECT * FROM users')
@@ -188,29 +1098,150 @@ def fetch_available_spots():
     close_db(conn)
     return spots
 
-def fetch_booking_history_by_user(user_id):
-    conn = get_db()
+BOOKING_COLUMNS = ('id, spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost_per_unit_time, '
+                   'total_cost, is_active, vehicle_type')
+
+def _booking_tables(conn, start_ts=None, end_ts=None):
+    # The hot table plus the archive partitions holding bookings that started
+    # between start_ts and end_ts, oldest first
     cursor = conn.execute('''
-        SELECT r.*, s.spot_number, s.vehicle_type, p.prime_location_name as lot_name
-        FROM reserve_parking_spot r
-        LEFT JOIN parking_spot s ON r.spot_id = s.id
-        LEFT JOIN parking_lot p ON s.lot_id = p.id
-        WHERE r.user_id = ?
-        ORDER BY r.parking_timestamp DESC
-    ''', (user_id,))
-    history = cursor.fetchall()
+        SELECT name FROM booking_archive_partition
+        WHERE row_count > 0 AND end_ts > COALESCE(?, '0000-00-00') AND start_ts <= COALESCE(?, '9999-99-99')
+        ORDER BY start_ts
+    ''', (start_ts, end_ts))
+    return ['reserve_parking_spot'] + [row['name'] for row in cursor]
+
+def _archive_tables_for_id(conn, booking_id):
+    cursor = conn.execute('''
+        SELECT name FROM booking_archive_partition
+        WHERE row_count > 0 AND ? BETWEEN min_id AND max_id
+        ORDER BY start_ts
+    ''', (booking_id,))
+    return [row['name'] for row in cursor]
+
+def _union_bookings(query, tables):
+    # Repeats a query once per booking table ({bookings} in the query); the
+    # caller repeats its parameters to match and may append an ORDER BY on
+    # result column names
+    return '\nUNION ALL\n'.join(query.replace('{bookings}', table) for table in tables)
+
+def _all_bookings(tables):
+    # A FROM source covering every row of the given booking tables
+    if len(tables) == 1:
+        return tables[0]
+    return '(' + ' UNION ALL '.join(f'SELECT {BOOKING_COLUMNS} FROM {table}' for table in tables) + ')'
+
+HISTORY_QUERY = '''
+    SELECT r.*, s.spot_number, p.prime_location_name as lot_name
+    FROM {bookings} r
+    LEFT JOIN parking_spot s ON r.spot_id = s.id
+    LEFT JOIN parking_lot p ON s.lot_id = p.id
+    WHERE r.user_id = ? AND (r.parking_timestamp, r.id) < (?, ?)
+'''
+
+def fetch_booking_history_by_user(user_id, before=None, limit=-1):
+    # Newest first; `before` is the (parking_timestamp, id) of the last row of
+    # the previous page. A limit of -1 returns the whole history.
+    conn = get_db()
+    before_ts, before_id = before or ('9999-99-99', 0)
+    params = (user_id, before_ts, before_id)
+    order = 'ORDER BY parking_timestamp DESC, id DESC' + (' LIMIT ?' if limit >= 0 else '')
+    page = (limit,) if limit >= 0 else ()
+    history = conn.execute(_union_bookings(HISTORY_QUERY, ['reserve_parking_spot']) + order, params + page).fetchall()
+    # A full page only needs the archive if a partition reaches back past its
+    # last row; a short page needs every partition older than `before`
+    oldest_ts = history[-1]['parking_timestamp'] if limit >= 0 and len(history) == limit else None
+    tables = _booking_tables(conn, oldest_ts, before_ts)
+    if len(tables) > 1:
+        history = conn.execute(_union_bookings(HISTORY_QUERY, tables) + order, params * len(tables) + page).fetchall()
     close_db(conn)
     return history
 
+EXPORT_FETCH_SIZE = 500
+
+def iter_bookings(user_id=None, start_day=None, end_day=None):
+    # Streams bookings oldest first on a dedicated connection, holding only
+    # EXPORT_FETCH_SIZE rows in memory, so it can outlive the request context
+    conn = connect()
+    try:
+        # Archive partitions outside the requested days are left out; the
+        # compound ORDER BY merges the per-table index scans
+        tables = _booking_tables(conn, start_day, end_day)
+        # The user filter is only added when given, so a user's export seeks
+        # idx_reserve_user_time_id instead of scanning the time range
+        user_filter = 'AND r.user_id = ?' if user_id is not None else ''
+        params = (start_day, end_day) + ((user_id,) if user_id is not None else ())
+        cursor = conn.execute(_union_bookings(f'''
+            SELECT r.id AS id, r.user_id, u.email, p.id AS lot_id, p.prime_location_name AS lot_name,
+                   s.spot_number, r.vehicle_type, r.parking_timestamp AS parking_timestamp, r.leaving_timestamp,
+                   r.parking_cost_per_unit_time, r.total_cost, r.is_active
+            FROM {{bookings}} r
+            LEFT JOIN users u ON r.user_id = u.user_id
+            LEFT JOIN parking_spot s ON r.spot_id = s.id
+            LEFT JOIN parking_lot p ON s.lot_id = p.id
+            WHERE r.parking_timestamp >= COALESCE(?, '0000-00-00')
+              AND r.parking_timestamp < COALESCE(date(?, '+1 day'), '9999-99-99')
+              {user_filter}
+        ''', tables) + '''
+            ORDER BY parking_timestamp, id
+        ''', params * len(tables))
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def iter_booking_intervals(start_ts, end_ts, lot_id=None):
+    # Streams (lot_id, parking_timestamp, leaving_timestamp, is_active) for
+    # every booking parked during [start_ts, end_ts) on a dedicated
+    # connection; active bookings run until now. Nothing stays active past
+    # BOOKING_MAX_HOURS, which bounds how early an overlapping booking started
+    since = (datetime.fromisoformat(start_ts) - timedelta(hours=BOOKING_MAX_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = connect()
+    try:
+        tables = _booking_tables(conn, since, end_ts)
+        lot_filter = 'AND s.lot_id = ?' if lot_id is not None else ''
+        params = (since, end_ts, start_ts) + ((lot_id,) if lot_id is not None else ())
+        cursor = conn.execute(_union_bookings(f'''
+            SELECT s.lot_id, r.parking_timestamp,
+                   COALESCE(r.leaving_timestamp, datetime('now','localtime')) AS leaving_timestamp, r.is_active
+            FROM {{bookings}} r
+            JOIN parking_spot s ON r.spot_id = s.id
+            WHERE r.parking_timestamp >= ? AND r.parking_timestamp < ?
+              AND COALESCE(r.leaving_timestamp, datetime('now','localtime')) > ?
+              {lot_filter}
+        ''', tables), params * len(tables))
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def fetch_lot_capacity():
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT p.id AS lot_id, p.prime_location_name AS lot_name, COALESCE(SUM(a.total), 0) AS spots
+        FROM parking_lot p
+        LEFT JOIN lot_availability a ON a.lot_id = p.id
+        GROUP BY p.id, p.prime_location_name
+        ORDER BY p.id
+    ''')
+    lots = cursor.fetchall()
+    close_db(conn)
+    return lots
+
 def fetch_occupancy_data():
     conn = get_db()
     cursor = conn.execute('''
         SELECT p.prime_location_name AS lot_name,
-               COUNT(r.id) AS occupied_count
+               COALESCE(SUM(a.total - a.available), 0) AS occupied_count
         FROM parking_lot p
-        LEFT JOIN parking_spot s ON p.id = s.lot_id
-        LEFT JOIN reserve_parking_spot r ON r.spot_id = s.id AND r.is_active = 1
-        GROUP BY p.prime_location_name
+        LEFT JOIN lot_availability a ON a.lot_id = p.id
+        GROUP BY p.id
     ''')
     occupancy_data = cursor.fetchall()
     close_db(conn)
@@ -238,21 +1269,320 @@ def fetch_parking_spots_by_lot(lot_id):
     close_db(conn)
     return spots
 
-def fetch_parking_usage_summary(user_id):
+def fetch_parking_spots_page(query='', after=0, limit=50):
+    # Keyset page over all spots, filtered by lot name or status in SQL
     conn = get_db()
     cursor = conn.execute('''
-        SELECT p.prime_location_name AS lot_name,
-               COUNT(r.id) AS booking_count
-        FROM reserve_parking_spot r
-        JOIN parking_spot s ON r.spot_id = s.id
+        SELECT s.id, p.prime_location_name AS lot_name, s.status
+        FROM parking_spot s
         JOIN parking_lot p ON s.lot_id = p.id
-        WHERE r.user_id = ?
-        GROUP BY p.prime_location_name
-    ''', (user_id,))
+        WHERE s.id > ?
+          AND (? = '' OR instr(lower(p.prime_location_name), ?) > 0 OR instr(lower(s.status), ?) > 0)
+        ORDER BY s.id
+        LIMIT ?
+    ''', (after, query, query, query, limit))
+    spots = cursor.fetchall()
+    close_db(conn)
+    return spots
+
+def fetch_parking_usage_summary(user_id, start_day='0000-00-00', end_day='9999-99-99'):
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT p.prime_location_name AS lot_name,
+               SUM(u.bookings) AS booking_count
+        FROM user_lot_usage_daily u
+        JOIN parking_lot p ON u.lot_id = p.id
+        WHERE u.user_id = ? AND u.day BETWEEN ? AND ?
+        GROUP BY p.id
+    ''', (user_id, start_day, end_day))
     usage_data = cursor.fetchall()
     close_db(conn)
     return usage_data
 
+def _rollup_released_bookings(conn, where, params, bookings='reserve_parking_spot'):
+    # Split each released booking's stay across the hours it covers; the
+    # booking itself and its revenue count in the hour it started
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS released_hours (
+            lot_id INTEGER, hour TEXT, bookings INTEGER, occupied_minutes REAL, revenue REAL
+        )
+    ''')
+    conn.execute('DELETE FROM temp.released_hours')
+    conn.execute(f'''
+        INSERT INTO temp.released_hours (lot_id, hour, bookings, occupied_minutes, revenue)
+        WITH RECURSIVE span(lot_id, hour, first_hour, start_ts, end_ts, revenue) AS (
+            SELECT s.lot_id, strftime('%Y-%m-%d %H:00:00', r.parking_timestamp),
+                   strftime('%Y-%m-%d %H:00:00', r.parking_timestamp),
+                   r.parking_timestamp, r.leaving_timestamp, COALESCE(r.total_cost, 0)
+            FROM {bookings} r
+            JOIN parking_spot s ON r.spot_id = s.id
+            WHERE r.is_active = 0 AND r.leaving_timestamp IS NOT NULL AND {where}
+            UNION ALL
+            SELECT lot_id, datetime(hour, '+1 hour'), first_hour, start_ts, end_ts, revenue
+            FROM span
+            WHERE datetime(hour, '+1 hour') < end_ts
+        )
+        SELECT lot_id, hour, SUM(hour = first_hour),
+               SUM(MAX(0, julianday(MIN(end_ts, datetime(hour, '+1 hour'))) - julianday(MAX(start_ts, hour))) * 1440),
+               SUM(CASE WHEN hour = first_hour THEN revenue ELSE 0 END)
+        FROM span
+        GROUP BY lot_id, hour
+    ''', params)
+    conn.execute('''
+        INSERT INTO lot_usage_hourly (lot_id, hour, bookings, occupied_minutes, revenue)
+        SELECT lot_id, hour, bookings, occupied_minutes, revenue FROM temp.released_hours WHERE true
+        ON CONFLICT (lot_id, hour) DO UPDATE SET
+            bookings = lot_usage_hourly.bookings + excluded.bookings,
+            occupied_minutes = lot_usage_hourly.occupied_minutes + excluded.occupied_minutes,
+            revenue = lot_usage_hourly.revenue + excluded.revenue
+    ''')
+    conn.execute('''
+        INSERT INTO lot_usage_daily (lot_id, day, bookings, occupied_minutes, revenue)
+        SELECT lot_id, substr(hour, 1, 10), SUM(bookings), SUM(occupied_minutes), SUM(revenue)
+        FROM temp.released_hours
+        GROUP BY lot_id, substr(hour, 1, 10)
+        ON CONFLICT (lot_id, day) DO UPDATE SET
+            bookings = lot_usage_daily.bookings + excluded.bookings,
+            occupied_minutes = lot_usage_daily.occupied_minutes + excluded.occupied_minutes,
+            revenue = lot_usage_daily.revenue + excluded.revenue
+    ''')
+
+def _rebuild_usage_rollups(conn, tables=('reserve_parking_spot',)):
+    bookings = _all_bookings(tables)
+    conn.execute('DELETE FROM lot_usage_hourly')
+    conn.execute('DELETE FROM lot_usage_daily')
+    conn.execute('DELETE FROM user_lot_usage_daily')
+    _rollup_released_bookings(conn, '1 = 1', (), bookings)
+    conn.execute(f'''
+        INSERT INTO user_lot_usage_daily (user_id, lot_id, day, bookings)
+        SELECT r.user_id, s.lot_id, date(r.parking_timestamp), COUNT(*)
+        FROM {bookings} r
+        JOIN parking_spot s ON r.spot_id = s.id
+        GROUP BY r.user_id, s.lot_id, date(r.parking_timestamp)
+    ''')
+
+def rebuild_usage_rollups():
+    conn = get_db()
+    _rebuild_usage_rollups(conn, _booking_tables(conn))
+    conn.commit()
+    close_db(conn)
+
+def _archive_partition(conn, month):
+    # Creates the partition for a 'YYYY-MM' month with the hot table's columns
+    # and history/export indexes, and registers it in the catalog
+    name = 'booking_archive_' + month.replace('-', '_')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY,
+            spot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            parking_timestamp DATETIME NOT NULL,
+            leaving_timestamp DATETIME,
+            parking_cost_per_unit_time REAL NOT NULL,
+            total_cost REAL,
+            is_active BOOLEAN DEFAULT 0,
+            vehicle_type TEXT
+        )
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_user_time_id ON {name} (user_id, parking_timestamp, id)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_time ON {name} (parking_timestamp)')
+    conn.execute('''
+        INSERT OR IGNORE INTO booking_archive_partition (name, start_ts, end_ts)
+        VALUES (?, date(?), date(?, '+1 month'))
+    ''', (name, f'{month}-01', f'{month}-01'))
+    return name
+
+def _archivable_bookings(conn, older_than_days, limit):
+    # Oldest first off idx_reserve_time; active bookings always stay hot
+    return conn.execute('''
+        SELECT id, strftime('%Y-%m', parking_timestamp) AS month
+        FROM reserve_parking_spot
+        WHERE parking_timestamp < datetime('now','localtime', ?) AND is_active = 0
+        ORDER BY parking_timestamp
+        LIMIT ?
+    ''', (f'-{older_than_days} days', limit)).fetchall()
+
+def fetch_archivable_months(older_than_days=None):
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT strftime('%Y-%m', parking_timestamp) AS month, COUNT(*) AS bookings
+        FROM reserve_parking_spot
+        WHERE parking_timestamp < datetime('now','localtime', ?) AND is_active = 0
+        GROUP BY month
+        ORDER BY month
+    ''', (f'-{older_than_days or ARCHIVE_AFTER_DAYS} days',))
+    months = cursor.fetchall()
+    close_db(conn)
+    return months
+
+def archive_closed_bookings(older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    # Moves one batch of closed bookings older than the horizon into their
+    # monthly partitions in a single write transaction; returns how many moved
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        batch = _archivable_bookings(conn, older_than_days or ARCHIVE_AFTER_DAYS, batch_size)
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS archiving_bookings (id INTEGER PRIMARY KEY, month TEXT NOT NULL)')
+        conn.execute('DELETE FROM temp.archiving_bookings')
+        conn.executemany('INSERT INTO temp.archiving_bookings (id, month) VALUES (?, ?)',
+                         [(row['id'], row['month']) for row in batch])
+        for month in sorted({row['month'] for row in batch}):
+            name = _archive_partition(conn, month)
+            conn.execute(f'''
+                INSERT INTO {name} ({BOOKING_COLUMNS})
+                SELECT {BOOKING_COLUMNS} FROM reserve_parking_spot
+                WHERE id IN (SELECT id FROM temp.archiving_bookings WHERE month = ?)
+            ''', (month,))
+            conn.execute(f'''
+                UPDATE booking_archive_partition
+                SET row_count = (SELECT COUNT(*) FROM {name}),
+                    min_id = (SELECT MIN(id) FROM {name}),
+                    max_id = (SELECT MAX(id) FROM {name}),
+                    archived_at = datetime('now','localtime')
+                WHERE name = ?
+            ''', (name,))
+        conn.execute('DELETE FROM reserve_parking_spot WHERE id IN (SELECT id FROM temp.archiving_bookings)')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+    return len(batch)
+
+def fetch_archive_partitions():
+    conn = get_db()
+    cursor = conn.execute('SELECT * FROM booking_archive_partition ORDER BY start_ts')
+    partitions = cursor.fetchall()
+    close_db(conn)
+    return partitions
+
+def fetch_lot_usage_summary(start_day, end_day):
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT p.prime_location_name AS lot_name,
+               SUM(d.bookings) AS bookings,
+               ROUND(SUM(d.occupied_minutes) / 60, 2) AS occupied_hours,
+               ROUND(SUM(d.revenue), 2) AS revenue
+        FROM lot_usage_daily d
+        JOIN parking_lot p ON d.lot_id = p.id
+        WHERE d.day BETWEEN ? AND ?
+        GROUP BY p.id
+    ''', (start_day, end_day))
+    usage = cursor.fetchall()
+    close_db(conn)
+    return usage
+
+def fetch_usage_timeline(start_day, end_day):
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT day,
+               SUM(bookings) AS bookings,
+               ROUND(SUM(occupied_minutes) / 60, 2) AS occupied_hours,
+               ROUND(SUM(revenue), 2) AS revenue
+        FROM lot_usage_daily
+        WHERE day BETWEEN ? AND ?
+        GROUP BY day
+        ORDER BY day
+    ''', (start_day, end_day))
+    timeline = cursor.fetchall()
+    close_db(conn)
+    return timeline
+
+def reprice_bookings(start_day, end_day, policy=None):
+    # What-if billing: prices every closed booking that started between the
+    # two days under `policy` (default the live one) in one set-based query.
+    # A booking's occupancy is its lot's share of spot-hours in use during
+    # its starting hour, from lot_usage_hourly, and its vehicle class comes
+    # from the vehicle type it recorded. Returns billed and repriced totals
+    # per lot.
+    policy = policy or pricing_policy
+    conn = get_db()
+    try:
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS pricing_tariff (
+                hour INTEGER, vehicle_class TEXT, tier_floor REAL, tier_ceiling REAL, multiplier REAL,
+                PRIMARY KEY (hour, vehicle_class, tier_floor)
+            )
+        ''')
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS pricing_vehicle_class (vehicle_type TEXT PRIMARY KEY, vehicle_class TEXT)')
+        conn.execute('DELETE FROM temp.pricing_tariff')
+        conn.execute('DELETE FROM temp.pricing_vehicle_class')
+        conn.executemany('''
+            INSERT INTO temp.pricing_tariff (hour, vehicle_class, tier_floor, tier_ceiling, multiplier)
+            VALUES (?, ?, ?, ?, ?)
+        ''', list(policy.tariff_rows()))
+        tables = _booking_tables(conn, start_day, end_day + ' 23:59:59')
+        vehicle_types = [row[0] for row in conn.execute(f'''
+            SELECT DISTINCT COALESCE(vehicle_type, '') FROM {_all_bookings(tables)} r
+            WHERE r.parking_timestamp >= ? AND r.parking_timestamp < date(?, '+1 day')
+        ''', (start_day, end_day))]
+        conn.executemany('INSERT INTO temp.pricing_vehicle_class (vehicle_type, vehicle_class) VALUES (?, ?)',
+                         [(vehicle_type, policy.vehicle_class(vehicle_type)) for vehicle_type in vehicle_types])
+        cursor = conn.execute(f'''
+            WITH capacity AS (
+                SELECT lot_id, SUM(total) AS spots FROM lot_availability GROUP BY lot_id
+            ),
+            closed AS MATERIALIZED (
+                SELECT s.lot_id, COALESCE(r.vehicle_type, '') AS vehicle_type,
+                       CAST(substr(r.parking_timestamp, 12, 2) AS INTEGER) AS start_hour,
+                       substr(r.parking_timestamp, 1, 13) || ':00:00' AS hour,
+                       (julianday(r.leaving_timestamp) - julianday(r.parking_timestamp)) * 24 AS hours,
+                       COALESCE(r.total_cost, 0) AS billed
+                FROM {_all_bookings(tables)} r
+                JOIN parking_spot s ON r.spot_id = s.id
+                WHERE r.is_active = 0 AND r.leaving_timestamp IS NOT NULL
+                  AND r.parking_timestamp >= ? AND r.parking_timestamp < date(?, '+1 day')
+            ),
+            priced AS (
+                SELECT b.lot_id, b.hours, b.billed, b.start_hour, v.vehicle_class,
+                       MIN(COALESCE(h.occupied_minutes, 0) / 60.0 / MAX(COALESCE(c.spots, 0), 1), 1.0) AS occupancy
+                FROM closed b
+                JOIN temp.pricing_vehicle_class v ON v.vehicle_type = b.vehicle_type
+                LEFT JOIN lot_usage_hourly h ON h.lot_id = b.lot_id AND h.hour = b.hour
+                LEFT JOIN capacity c ON c.lot_id = b.lot_id
+            )
+            SELECT pl.id AS lot_id, pl.prime_location_name AS lot_name, COUNT(*) AS bookings,
+                   ROUND(SUM(p.billed), 2) AS billed,
+                   ROUND(SUM(ROUND(p.hours * ROUND(pl.price * t.multiplier, 2), 2)), 2) AS repriced
+            FROM priced p
+            JOIN parking_lot pl ON pl.id = p.lot_id
+            JOIN temp.pricing_tariff t
+              ON t.hour = p.start_hour AND t.vehicle_class = p.vehicle_class
+             AND p.occupancy >= t.tier_floor AND p.occupancy < t.tier_ceiling
+            GROUP BY pl.id, pl.prime_location_name
+            ORDER BY pl.id
+        ''', (start_day, end_day))
+        repriced = cursor.fetchall()
+        # Only temp tables were written; end the transaction that opened
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+    return repriced
+
+def get_booking_by_id(booking_id):
+    conn = get_db()
+    query = '''
+        SELECT r.*, s.lot_id, s.spot_number, p.prime_location_name AS lot_name
+        FROM {bookings} r
+        LEFT JOIN parking_spot s ON r.spot_id = s.id
+        LEFT JOIN parking_lot p ON s.lot_id = p.id
+        WHERE r.id = ?
+    '''
+    booking = conn.execute(_union_bookings(query, ['reserve_parking_spot']), (booking_id,)).fetchone()
+    # Archived bookings keep their ids; on a miss only the partitions whose id
+    # range covers it are looked at
+    if booking is None:
+        for table in _archive_tables_for_id(conn, booking_id):
+            booking = conn.execute(_union_bookings(query, [table]), (booking_id,)).fetchone()
+            if booking:
+                break
+    close_db(conn)
+    return booking
+
 def get_parking_lot_by_id(lot_id):
     conn = get_db()
     cursor = conn.execute('SELECT * FROM parking_lot WHERE id = ?', (lot_id,))
@@ -288,27 +1618,25 @@ def release_parking_spot(booking_id):
         close_db(conn)
         raise Exception("Booking not found.")
     spot_id = row['spot_id']
-    lot_id = row['lot_id']
     user_id = row['user_id']
 
     cursor.execute('''
         UPDATE reserve_parking_spot
         SET leaving_timestamp = datetime('now','localtime'), is_active = 0
-        WHERE id = ?
+        WHERE id = ? AND is_active = 1
     ''', (booking_id,))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        close_db(conn)
+        raise Exception("Booking already released.")
 
+    # A spot deleted ('X') while occupied stays out of service
     cursor.execute('''
         UPDATE parking_spot
         SET status = 'A'
-        WHERE id = ?
+        WHERE id = ? AND status = 'O'
     ''', (spot_id,))
 
-    cursor.execute('''
-        UPDATE parking_lot
-        SET maximum_number_of_spots = maximum_number_of_spots + 1
-        WHERE id = ?
-    ''', (lot_id,))
-
     cursor.execute('''
         UPDATE reserve_parking_spot
         SET total_cost = ROUND(((julianday(leaving_timestamp) - julianday(parking_timestamp)) * 24) * parking_cost_per_unit_time, 2)
@@ -322,17 +1650,229 @@ def release_parking_spot(booking_id):
         )
         WHERE user_id = ?
     ''', (booking_id, user_id))
+    _rollup_released_bookings(conn, 'r.id = ?', (booking_id,))
+    _bump_lot_version(conn)
     conn.commit()
     close_db(conn)
+    _notify_lot_change()
+
+def _release_bookings(conn, releases):
+    # Settles active bookings set-wise inside the caller's write transaction,
+    # with the same cost computation as release_parking_spot. releases is
+    # [(booking_id, leaving_timestamp)]; returns the ids actually released.
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS released_bookings (
+            booking_id INTEGER PRIMARY KEY, leaving_timestamp TEXT NOT NULL
+        )
+    ''')
+    conn.execute('DELETE FROM temp.released_bookings')
+    conn.executemany('INSERT OR IGNORE INTO temp.released_bookings (booking_id, leaving_timestamp) VALUES (?, ?)',
+                     releases)
+    # is_active is re-checked by the UPDATE itself, so on PostgreSQL a
+    # booking closed by a concurrent transaction drops out here
+    closed = {row['id'] for row in conn.execute('''
+        UPDATE reserve_parking_spot
+        SET leaving_timestamp = MAX(reserve_parking_spot.parking_timestamp, x.leaving_timestamp), is_active = 0
+        FROM temp.released_bookings x
+        WHERE reserve_parking_spot.id = x.booking_id AND reserve_parking_spot.is_active = 1
+        RETURNING reserve_parking_spot.id
+    ''').fetchall()}
+    conn.executemany('DELETE FROM temp.released_bookings WHERE booking_id = ?',
+                     [(booking_id,) for booking_id, _ in releases if booking_id not in closed])
+    conn.execute('''
+        UPDATE reserve_parking_spot
+        SET total_cost = ROUND(((julianday(leaving_timestamp) - julianday(parking_timestamp)) * 24) * parking_cost_per_unit_time, 2)
+        WHERE id IN (SELECT booking_id FROM temp.released_bookings)
+    ''')
+    conn.execute('''
+        UPDATE parking_spot
+        SET status = 'A'
+        WHERE id IN (
+            SELECT r.spot_id FROM reserve_parking_spot r JOIN temp.released_bookings x ON r.id = x.booking_id
+        ) AND status = 'O'
+    ''')
+    conn.execute('''
+        UPDATE users
+        SET revenue = revenue + t.total
+        FROM (
+            SELECT r.user_id, SUM(r.total_cost) AS total
+            FROM reserve_parking_spot r JOIN temp.released_bookings x ON r.id = x.booking_id
+            GROUP BY r.user_id
+        ) t
+        WHERE users.user_id = t.user_id
+    ''')
+    _rollup_released_bookings(conn, 'r.id IN (SELECT booking_id FROM temp.released_bookings)', ())
+    return closed
+
+def _overdue_bookings(conn, limit, max_hours):
+    # Oldest first straight off idx_reserve_active_time (is_active, parking_timestamp)
+    return conn.execute('''
+        SELECT id, parking_timestamp, datetime(parking_timestamp, ?) AS due_timestamp
+        FROM reserve_parking_spot
+        WHERE is_active = 1 AND parking_timestamp < datetime('now','localtime', ?)
+        ORDER BY parking_timestamp
+        LIMIT ?
+    ''', (f'+{max_hours} hours', f'-{max_hours} hours', limit)).fetchall()
+
+def fetch_overdue_bookings(limit=500, max_hours=None):
+    conn = get_db()
+    bookings = _overdue_bookings(conn, limit, max_hours or BOOKING_MAX_HOURS)
+    close_db(conn)
+    return bookings
 
-def update_parking_lot(id, prime_location_name, price, address, pincode, maximum_number_of_spots):
+def release_overdue_bookings(batch_size=500, max_hours=None):
+    # Releases one batch of overdue bookings as if they left at the limit and
+    # records the scheduler heartbeat; returns how many were released
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        overdue = _overdue_bookings(conn, batch_size, max_hours or BOOKING_MAX_HOURS)
+        released = _release_bookings(conn, [(row['id'], row['due_timestamp']) for row in overdue])
+        conn.execute('''
+            UPDATE expiry_scheduler_state
+            SET last_run_at = datetime('now','localtime'), released_total = released_total + ?
+            WHERE id = 1
+        ''', (len(released),))
+        if released:
+            _bump_lot_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+    if released:
+        _notify_lot_change()
+    return len(released)
+
+def fetch_expiry_status(max_hours=None):
+    # Backlog of the expiry scheduler: overdue bookings, how far past its limit
+    # the oldest one is, and how long ago the scheduler last ran
+    max_hours = max_hours or BOOKING_MAX_HOURS
+    conn = get_db()
+    overdue = conn.execute('''
+        SELECT COUNT(*) AS overdue,
+               (julianday('now','localtime') - julianday(datetime(MIN(parking_timestamp), ?))) * 86400 AS lag_seconds
+        FROM reserve_parking_spot
+        WHERE is_active = 1 AND parking_timestamp < datetime('now','localtime', ?)
+    ''', (f'+{max_hours} hours', f'-{max_hours} hours')).fetchone()
+    state = conn.execute('''
+        SELECT released_total, (julianday('now','localtime') - julianday(last_run_at)) * 86400 AS last_run_age_seconds
+        FROM expiry_scheduler_state
+        WHERE id = 1
+    ''').fetchone()
+    close_db(conn)
+    return {
+        'overdue': overdue['overdue'],
+        'lag_seconds': overdue['lag_seconds'] or 0.0,
+        'last_run_age_seconds': state['last_run_age_seconds'],
+        'released_total': state['released_total'],
+    }
+
+def apply_gate_events(events):
+    # Applies one batch of normalised gate events in a single write
+    # transaction: entries claim spots one by one, exits are settled together
+    # with set-based updates. Returns (event_id, status, booking_id) per event.
+    # An entry naming a spot_id gets that spot while it is still bookable.
+    # Entries without a rate are quoted for their hour before the write lock
+    # is taken, once per lot, vehicle type and hour in the batch
+    rates = {}
+    for event in events:
+        if event['type'] == 'entry' and event.get('cost_per_unit_time') is None:
+            key = (event['lot_id'], event['vehicle_type'], event['timestamp'][:13])
+            if key not in rates:
+                rates[key] = quote_parking_rate(event['lot_id'], event['vehicle_type'], event['timestamp'])
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        event_ids = [event['event_id'] for event in events]
+        placeholders = ','.join('?' * len(event_ids))
+        seen = {row['event_id'] for row in conn.execute(
+            f'SELECT event_id FROM gate_event_log WHERE event_id IN ({placeholders})', event_ids)}
+        results = []
+        log = []
+        entry_bookings = {}
+        exits = []
+        for event in events:
+            event_id = event['event_id']
+            if event_id in seen:
+                results.append([event_id, 'duplicate', None])
+                continue
+            seen.add(event_id)
+            if event['type'] == 'entry':
+                cost_per_unit_time = event.get('cost_per_unit_time')
+                if cost_per_unit_time is None:
+                    cost_per_unit_time = rates[(event['lot_id'], event['vehicle_type'], event['timestamp'][:13])]
+                booking_id = None
+                if cost_per_unit_time is not None:
+                    booking_id = _insert_booking(conn, event['lot_id'], event['user_id'], event['vehicle_type'],
+                                                 cost_per_unit_time, event['timestamp'], event.get('spot_id'))
+                status = 'applied' if booking_id else 'rejected'
+                entry_bookings[event_id] = booking_id
+                results.append([event_id, status, booking_id])
+                log.append((event_id, 'entry', booking_id, status))
+                continue
+            booking_id = event.get('booking_id')
+            entry_event_id = event.get('entry_event_id')
+            if booking_id is None and entry_event_id is not None:
+                booking_id = entry_bookings.get(entry_event_id)
+                if booking_id is None:
+                    row = conn.execute('SELECT booking_id FROM gate_event_log WHERE event_id = ?',
+                                       (entry_event_id,)).fetchone()
+                    booking_id = row['booking_id'] if row else None
+            result = [event_id, 'rejected', booking_id]
+            results.append(result)
+            exits.append((event_id, booking_id, event['timestamp'], result))
+
+        # The first exit event for a booking settles it; later ones in the
+        # batch are rejected like exits for bookings that are already closed
+        owners = {}
+        for event_id, booking_id, timestamp, _ in exits:
+            if booking_id is not None:
+                owners.setdefault(booking_id, (event_id, timestamp))
+        released = _release_bookings(conn, [(booking_id, timestamp) for booking_id, (_, timestamp) in owners.items()])
+        for event_id, booking_id, _, result in exits:
+            if booking_id in released and owners[booking_id][0] == event_id:
+                result[1] = 'applied'
+            log.append((event_id, 'exit', booking_id, result[1]))
+
+        conn.executemany('''
+            INSERT INTO gate_event_log (event_id, event_type, booking_id, status) VALUES (?, ?, ?, ?)
+        ''', log)
+        _bump_lot_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+    _notify_lot_change()
+    return [tuple(result) for result in results]
+
+def fetch_gate_events(event_ids):
+    # How already-processed events were applied: {event_id: (status, booking_id)}
+    if not event_ids:
+        return {}
+    conn = get_db()
+    placeholders = ','.join('?' * len(event_ids))
+    rows = conn.execute(f'''
+        SELECT event_id, status, booking_id FROM gate_event_log WHERE event_id IN ({placeholders})
+    ''', list(event_ids)).fetchall()
+    close_db(conn)
+    return {row['event_id']: (row['status'], row['booking_id']) for row in rows}
+
+def update_parking_lot(id, prime_location_name, price, address, pincode, maximum_number_of_spots,
+                       latitude=None, longitude=None):
+    # Coordinates left as None keep their current values
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE parking_lot
-        SET prime_location_name = ?, price = ?, address = ?, pincode = ?, maximum_number_of_spots = ?
+        SET prime_location_name = ?, price = ?, address = ?, pincode = ?, maximum_number_of_spots = ?,
+            latitude = COALESCE(?, latitude), longitude = COALESCE(?, longitude)
         WHERE id = ?
-    ''', (prime_location_name, price, address, pincode, maximum_number_of_spots, id))
+    ''', (prime_location_name, price, address, pincode, maximum_number_of_spots, latitude, longitude, id))
+    _bump_lot_version(conn)
     conn.commit()
     close_db(conn)
 
@@ -357,3 +1897,9 @@ def update_user_password(user_id, new_password):
     ''', (new_password, user_id))
     conn.commit()
     close_db(conn)
+
+# Time every model call and label its SQL with the function name; connection
+# plumbing and the stats getters are called too often to be worth a series
+instrument_functions(globals(), __name__, exclude=(
+    'get_db', 'close_db', 'close_backend', 'get_pool_stats', 'get_db_pool_stats', 'get_booking_stats',
+    'get_cache_stats'))
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# bcrypt releases the GIL while hashing, so a small thread pool keeps the
+# work off request threads; the queue limit turns overload into fast 503s
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE', os.cpu_count() or 2))
+BCRYPT_QUEUE_LIMIT = int(os.environ.get('BCRYPT_QUEUE_LIMIT', 4 * BCRYPT_POOL_SIZE))
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float('inf'))
+
+class PasswordHasherBusy(Exception):
+    pass
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_POOL_SIZE, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(BCRYPT_QUEUE_LIMIT)
+_stats_lock = threading.Lock()
+_stats = {
+    operation: {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+    for operation in ('hash', 'check')
+}
+_rejected = {'count': 0}
+
+def _observe(operation, seconds):
+    with _stats_lock:
+        histogram = _stats[operation]
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+
+def _run(operation, func, *args):
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _rejected['count'] += 1
+        raise PasswordHasherBusy("Too many password operations in progress.")
+    started = time.perf_counter()
+    try:
+        return _executor.submit(func, *args).result()
+    finally:
+        _slots.release()
+        _observe(operation, time.perf_counter() - started)
+
+def _to_bytes(value):
+    return value if isinstance(value, bytes) else value.encode('utf-8')
+
+def hash_password(password):
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return _run('hash', bcrypt.hashpw, _to_bytes(password), salt).decode('utf-8')
+
+def check_password(password, hashed):
+    return _run('check', bcrypt.checkpw, _to_bytes(password), _to_bytes(hashed))
+
+def needs_rehash(hashed):
+    # bcrypt hashes look like $2b$<rounds>$<salt+digest>
+    try:
+        return int(_to_bytes(hashed).split(b'$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def get_hash_stats():
+    with _stats_lock:
+        stats = {operation: {'buckets': list(zip(LATENCY_BUCKETS, histogram['buckets'])),
+                             'count': histogram['count'], 'sum': histogram['sum']}
+                 for operation, histogram in _stats.items()}
+        stats['rejected'] = _rejected['count']
+    return stats
@@ -0,0 +1,286 @@
+# PostgreSQL counterpart of the SQLite schema in parking_model.py (base
+# tables plus every entry of MIGRATIONS). Timestamps stay 'YYYY-MM-DD
+# HH:MM:SS' text and flags stay integers, so the model's comparisons and
+# sentinels ('9999-99-99') mean the same on both backends. Foreign keys are
+# left out as in SQLite, which never enforced them.
+
+# Version of MIGRATIONS this schema matches; bump it together with a new
+# migration once its PostgreSQL statements are added below
+SCHEMA_VERSION = 12
+
+# Same-named stand-ins for the SQLite functions the model calls; the SQL
+# translator renames datetime()/date()/julianday()/strftime() to these
+COMPAT_FUNCTIONS = '''
+-- Applies SQLite date modifiers ('+1 hour', '-24 hours', ...) in order;
+-- times are already local, so 'localtime' and 'utc' are no-ops
+CREATE OR REPLACE FUNCTION sqlite_modify(moment timestamp, modifiers text[]) RETURNS timestamp AS $$
+DECLARE
+    modifier text;
+BEGIN
+    FOREACH modifier IN ARRAY modifiers LOOP
+        IF modifier NOT IN ('localtime', 'utc') THEN
+            moment := moment + modifier::interval;
+        END IF;
+    END LOOP;
+    RETURN moment;
+END
+$$ LANGUAGE plpgsql STABLE;
+
+-- Plain expressions from here on, so the planner inlines them into the
+-- calling query and folds the modifier checks; the common no-modifier and
+-- single-modifier calls never reach plpgsql
+CREATE OR REPLACE FUNCTION sqlite_moment(value text) RETURNS timestamp AS $$
+    SELECT CASE WHEN value = 'now' THEN date_trunc('second', localtimestamp) ELSE value::timestamp END
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION sqlite_shift(moment timestamp, modifiers text[]) RETURNS timestamp AS $$
+    SELECT CASE
+               WHEN modifiers = '{}' OR modifiers = '{localtime}' THEN moment
+               WHEN cardinality(modifiers) = 1 THEN moment + modifiers[1]::interval
+               ELSE sqlite_modify(moment, modifiers)
+           END
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION sqlite_datetime(value text, VARIADIC modifiers text[] DEFAULT '{}') RETURNS text AS $$
+    SELECT to_char(sqlite_shift(sqlite_moment(value), modifiers), 'YYYY-MM-DD HH24:MI:SS')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION sqlite_date(value text, VARIADIC modifiers text[] DEFAULT '{}') RETURNS text AS $$
+    SELECT to_char(sqlite_shift(sqlite_moment(value), modifiers), 'YYYY-MM-DD')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION sqlite_julianday(value text, VARIADIC modifiers text[] DEFAULT '{}')
+RETURNS double precision AS $$
+    SELECT extract(epoch FROM sqlite_shift(sqlite_moment(value), modifiers))::double precision / 86400 + 2440587.5
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION sqlite_strftime(format text, value text, VARIADIC modifiers text[] DEFAULT '{}')
+RETURNS text AS $$
+    SELECT to_char(sqlite_shift(sqlite_moment(value), modifiers),
+                   replace(replace(replace(replace(replace(replace(format,
+                       '%Y', 'YYYY'), '%m', 'MM'), '%d', 'DD'), '%H', 'HH24'), '%M', 'MI'), '%S', 'SS'))
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION instr(haystack text, needle text) RETURNS integer AS $$
+    SELECT strpos(haystack, needle)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION round(value double precision, digits integer) RETURNS double precision AS $$
+    SELECT round(value::numeric, digits)::double precision
+$$ LANGUAGE sql IMMUTABLE;
+
+-- SUM(status = 'A') counts matching rows, as in SQLite
+CREATE OR REPLACE FUNCTION sqlite_sum_bool(total bigint, value boolean) RETURNS bigint AS $$
+    SELECT total + COALESCE(value::integer, 0)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE AGGREGATE sum(boolean) (SFUNC = sqlite_sum_bool, STYPE = bigint, INITCOND = '0');
+'''
+
+TABLES = '''
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    address TEXT NOT NULL,
+    pincode TEXT CHECK (length(pincode) = 6 AND pincode ~ '^[0-9]') NOT NULL,
+    revenue DOUBLE PRECISION DEFAULT 0.0
+);
+
+CREATE TABLE IF NOT EXISTS parking_lot (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    prime_location_name TEXT NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    address TEXT NOT NULL,
+    pincode TEXT CHECK (length(pincode) = 6 AND pincode ~ '^[0-9]') NOT NULL,
+    maximum_number_of_spots INTEGER NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION
+);
+CREATE INDEX IF NOT EXISTS idx_parking_lot_pincode ON parking_lot (pincode);
+CREATE INDEX IF NOT EXISTS idx_parking_lot_search ON parking_lot
+    USING GIN (to_tsvector('simple', prime_location_name || ' ' || address));
+CREATE INDEX IF NOT EXISTS idx_parking_lot_position ON parking_lot (latitude, longitude);
+
+-- Stands in for the SQLite R*Tree: one point box per located lot
+CREATE OR REPLACE VIEW parking_lot_rtree AS
+    SELECT id, latitude AS min_lat, latitude AS max_lat, longitude AS min_lon, longitude AS max_lon
+    FROM parking_lot
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS parking_spot (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    lot_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'A',
+    spot_number TEXT NOT NULL,
+    vehicle_type TEXT,
+    is_handicap_accessible INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_parking_spot_lot_status ON parking_spot (lot_id, status);
+CREATE INDEX IF NOT EXISTS idx_parking_spot_status ON parking_spot (status, lot_id);
+
+CREATE TABLE IF NOT EXISTS reserve_parking_spot (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    spot_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    parking_timestamp TEXT NOT NULL,
+    leaving_timestamp TEXT,
+    parking_cost_per_unit_time DOUBLE PRECISION NOT NULL,
+    total_cost DOUBLE PRECISION,
+    is_active INTEGER DEFAULT 1,
+    vehicle_type TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reserve_user_active ON reserve_parking_spot (user_id, is_active);
+CREATE INDEX IF NOT EXISTS idx_reserve_spot_active ON reserve_parking_spot (spot_id, is_active);
+CREATE INDEX IF NOT EXISTS idx_reserve_active_time ON reserve_parking_spot (is_active, parking_timestamp);
+CREATE INDEX IF NOT EXISTS idx_reserve_user_time_id ON reserve_parking_spot (user_id, parking_timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_reserve_time ON reserve_parking_spot (parking_timestamp);
+
+CREATE TABLE IF NOT EXISTS lot_availability (
+    lot_id INTEGER NOT NULL,
+    vehicle_type TEXT NOT NULL DEFAULT '',
+    available INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (lot_id, vehicle_type)
+);
+
+CREATE OR REPLACE FUNCTION trg_spot_availability() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE lot_availability
+        SET available = available - (OLD.status = 'A')::integer, total = total - (OLD.status != 'X')::integer
+        WHERE lot_id = OLD.lot_id AND vehicle_type = COALESCE(OLD.vehicle_type, '');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO lot_availability (lot_id, vehicle_type, available, total)
+        VALUES (NEW.lot_id, COALESCE(NEW.vehicle_type, ''), (NEW.status = 'A')::integer, (NEW.status != 'X')::integer)
+        ON CONFLICT (lot_id, vehicle_type) DO UPDATE
+        SET available = lot_availability.available + excluded.available,
+            total = lot_availability.total + excluded.total;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_spot_availability ON parking_spot;
+CREATE TRIGGER trg_spot_availability AFTER INSERT OR DELETE OR UPDATE OF lot_id, status, vehicle_type
+    ON parking_spot FOR EACH ROW EXECUTE FUNCTION trg_spot_availability();
+
+CREATE TABLE IF NOT EXISTS lot_data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT INTO lot_data_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS lot_usage_hourly (
+    lot_id INTEGER NOT NULL,
+    hour TEXT NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    occupied_minutes DOUBLE PRECISION NOT NULL DEFAULT 0,
+    revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (lot_id, hour)
+);
+
+CREATE TABLE IF NOT EXISTS lot_usage_daily (
+    lot_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    occupied_minutes DOUBLE PRECISION NOT NULL DEFAULT 0,
+    revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (lot_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_lot_usage_daily_day ON lot_usage_daily (day, lot_id);
+
+CREATE TABLE IF NOT EXISTS user_lot_usage_daily (
+    user_id INTEGER NOT NULL,
+    lot_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, lot_id)
+);
+
+CREATE TABLE IF NOT EXISTS gate_event_log (
+    event_id TEXT PRIMARY KEY,
+    event_type TEXT NOT NULL,
+    booking_id INTEGER,
+    status TEXT NOT NULL,
+    processed_at TEXT NOT NULL DEFAULT to_char(localtimestamp, 'YYYY-MM-DD HH24:MI:SS')
+);
+
+CREATE TABLE IF NOT EXISTS advance_reservation (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    lot_id INTEGER NOT NULL,
+    spot_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    start_ts TEXT NOT NULL,
+    end_ts TEXT NOT NULL,
+    vehicle_type TEXT,
+    cost_per_unit_time DOUBLE PRECISION NOT NULL,
+    status TEXT NOT NULL DEFAULT 'R',
+    booking_id INTEGER,
+    created_at TEXT NOT NULL DEFAULT to_char(localtimestamp, 'YYYY-MM-DD HH24:MI:SS'),
+    CHECK (start_ts < end_ts)
+);
+CREATE INDEX IF NOT EXISTS idx_advance_spot_end ON advance_reservation (spot_id, end_ts) WHERE status = 'R';
+CREATE INDEX IF NOT EXISTS idx_advance_user_start ON advance_reservation (user_id, start_ts);
+
+CREATE TABLE IF NOT EXISTS expiry_scheduler_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_run_at TEXT,
+    released_total INTEGER NOT NULL DEFAULT 0
+);
+INSERT INTO expiry_scheduler_state (id, released_total) VALUES (1, 0) ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS booking_archive_partition (
+    name TEXT PRIMARY KEY,
+    start_ts TEXT NOT NULL,
+    end_ts TEXT NOT NULL,
+    min_id INTEGER,
+    max_id INTEGER,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    archived_at TEXT
+);
+
+-- Bookings record the occupant's vehicle (version 12). Databases created
+-- earlier get the column on every booking table, filled from the spot's
+-- current type, which was the last occupant's
+DO $$
+DECLARE
+    partition text;
+    upgrading boolean := COALESCE((SELECT version < 12 FROM schema_version WHERE id = 1), false);
+BEGIN
+    FOR partition IN SELECT 'reserve_parking_spot' UNION ALL SELECT name FROM booking_archive_partition LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS vehicle_type TEXT', partition);
+        IF upgrading THEN
+            EXECUTE format('UPDATE %I r SET vehicle_type = s.vehicle_type FROM parking_spot s WHERE s.id = r.spot_id',
+                           partition);
+        END IF;
+    END LOOP;
+END
+$$;
+'''
+
+def create_schema(conn, migrations):
+    if migrations > SCHEMA_VERSION:
+        raise RuntimeError(f"Schema version {migrations} has no PostgreSQL counterpart yet "
+                           f"(models/postgres_schema.py is at {SCHEMA_VERSION}).")
+    conn.execute('BEGIN')
+    try:
+        # Serialises workers starting together; the loser finds the schema done
+        conn.execute('SELECT pg_advisory_xact_lock(7283)')
+        conn.executescript(COMPAT_FUNCTIONS)
+        conn.executescript(TABLES)
+        conn.execute('''
+            INSERT INTO schema_version (id, version) VALUES (1, ?)
+            ON CONFLICT (id) DO UPDATE SET version = excluded.version
+        ''', (SCHEMA_VERSION,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,91 @@
+import bisect
+import functools
+import json
+import os
+import re
+
+# A per-hour rate is the lot's base price times three multipliers: the
+# time-of-day band of the booking's start hour, the vehicle class and the
+# occupancy tier the lot is in. Multipliers are precomputed per
+# (hour, class, tier) and rate tables per base price are cached, so a quote
+# is a few list lookups.
+
+# (first hour, multiplier); each band runs until the next one starts
+TIME_BANDS = [(0, 0.8), (7, 1.0), (8, 1.25), (11, 1.0), (17, 1.3), (21, 0.9)]
+VEHICLE_MULTIPLIERS = {'bike': 0.5, 'car': 1.0, 'suv': 1.2, 'ev': 0.9}
+# Vehicle types are free text; words not listed here price as DEFAULT_VEHICLE_CLASS
+VEHICLE_ALIASES = {'motorcycle': 'bike', 'motorbike': 'bike', 'scooter': 'bike', 'sedan': 'car',
+                   'hatchback': 'car', 'jeep': 'suv', 'van': 'suv', 'truck': 'suv', 'electric': 'ev'}
+DEFAULT_VEHICLE_CLASS = 'car'
+# (lowest occupied share, multiplier)
+OCCUPANCY_TIERS = [(0.0, 1.0), (0.6, 1.1), (0.8, 1.25), (0.9, 1.5)]
+
+TARIFF_CACHE_SIZE = int(os.environ.get('TARIFF_CACHE_SIZE', 1024))
+
+class PricingPolicy:
+    def __init__(self, time_bands=TIME_BANDS, vehicle_multipliers=VEHICLE_MULTIPLIERS,
+                 occupancy_tiers=OCCUPANCY_TIERS, vehicle_aliases=VEHICLE_ALIASES):
+        self.time_bands = sorted((int(hour), float(multiplier)) for hour, multiplier in time_bands)
+        self.occupancy_tiers = sorted((float(floor), float(multiplier)) for floor, multiplier in occupancy_tiers)
+        self.vehicle_multipliers = {name.lower(): float(value) for name, value in vehicle_multipliers.items()}
+        self.vehicle_aliases = {name.lower(): value.lower() for name, value in vehicle_aliases.items()}
+        if not self.time_bands or self.time_bands[0][0] != 0:
+            raise ValueError("The first time band must start at hour 0.")
+        if not self.occupancy_tiers or self.occupancy_tiers[0][0] != 0:
+            raise ValueError("The first occupancy tier must start at 0.")
+        if DEFAULT_VEHICLE_CLASS not in self.vehicle_multipliers:
+            raise ValueError(f"A multiplier for '{DEFAULT_VEHICLE_CLASS}' is required.")
+        self.classes = sorted(self.vehicle_multipliers)
+        self._class_index = {name: index for index, name in enumerate(self.classes)}
+        self._tier_floors = [floor for floor, _ in self.occupancy_tiers]
+        starts = [hour for hour, _ in self.time_bands]
+        self.hour_multipliers = [self.time_bands[bisect.bisect_right(starts, hour) - 1][1] for hour in range(24)]
+        # multipliers[hour][class][tier]
+        self.multipliers = [[[hour_multiplier * self.vehicle_multipliers[name] * tier_multiplier
+                              for _, tier_multiplier in self.occupancy_tiers]
+                             for name in self.classes]
+                            for hour_multiplier in self.hour_multipliers]
+        self.tariff = functools.lru_cache(maxsize=TARIFF_CACHE_SIZE)(self._tariff)
+
+    @classmethod
+    def from_file(cls, path):
+        # JSON with any of time_bands, vehicle_multipliers, occupancy_tiers and
+        # vehicle_aliases; missing keys keep the defaults
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config.get('time_bands', TIME_BANDS), config.get('vehicle_multipliers', VEHICLE_MULTIPLIERS),
+                   config.get('occupancy_tiers', OCCUPANCY_TIERS), config.get('vehicle_aliases', VEHICLE_ALIASES))
+
+    def vehicle_class(self, vehicle_type):
+        for word in re.findall(r'[a-z]+', (vehicle_type or '').lower()):
+            if word in self.vehicle_multipliers:
+                return word
+            if self.vehicle_aliases.get(word) in self.vehicle_multipliers:
+                return self.vehicle_aliases[word]
+        return DEFAULT_VEHICLE_CLASS
+
+    def tier(self, occupancy):
+        return max(bisect.bisect_right(self._tier_floors, occupancy) - 1, 0)
+
+    def _tariff(self, price):
+        # Every rate for one base price, indexed like multipliers
+        return tuple(tuple(tuple(round(price * multiplier, 2) for multiplier in tiers) for tiers in classes)
+                     for classes in self.multipliers)
+
+    def rate(self, price, hour, vehicle_type, occupancy):
+        return self.tariff(price)[hour][self._class_index[self.vehicle_class(vehicle_type)]][self.tier(occupancy)]
+
+    def tariff_rows(self):
+        # (hour, class, lowest occupancy, occupancy ceiling, multiplier) for
+        # pricing in SQL; the last tier has no real ceiling
+        ceilings = self._tier_floors[1:] + [1e9]
+        for hour, classes in enumerate(self.multipliers):
+            for name, tiers in zip(self.classes, classes):
+                for floor, ceiling, multiplier in zip(self._tier_floors, ceilings, tiers):
+                    yield hour, name, floor, ceiling, multiplier
+
+def load_policy(path=None):
+    return PricingPolicy.from_file(path) if path else PricingPolicy()
+
+# The live policy; PRICING_POLICY points at a JSON file overriding the defaults
+policy = load_policy(os.environ.get('PRICING_POLICY'))
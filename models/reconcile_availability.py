@@ -0,0 +1,22 @@
+import sys
+
+from models.parking_model import reconcile_lot_availability, reconcile_spot_status
+
+if __name__ == "__main__":
+    repair = '--repair' in sys.argv[1:]
+    # Spots first: repairing them moves the counters checked next
+    spots = reconcile_spot_status(repair=repair)
+    for row in spots:
+        print(f"[x] spot {row['spot_id']} in lot {row['lot_id']}: status '{row['status']}' "
+              f"with {row['active_bookings']} active bookings")
+    drift = reconcile_lot_availability(repair=repair)
+    for row in drift:
+        print(f"[x] lot {row['lot_id']} type '{row['vehicle_type']}': "
+              f"available {row['counted_available']} vs {row['actual_available']}, "
+              f"total {row['counted_total']} vs {row['actual_total']}")
+    if not spots and not drift:
+        print("[✓] Spot status matches the active bookings and lot availability matches parking_spot.")
+    elif repair:
+        print("[✓] Spot status and lot availability rebuilt.")
+    else:
+        sys.exit(1)
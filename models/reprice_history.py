@@ -0,0 +1,31 @@
+import argparse
+import time
+from datetime import date, timedelta
+
+from models.parking_model import init_db, reprice_bookings
+from models.pricing import load_policy
+
+# Re-bills closed bookings under a pricing policy (the live one, or a JSON
+# file given with --policy) and compares the result with what was billed.
+# Archived months are included; nothing is written back.
+
+if __name__ == "__main__":
+    today = date.today()
+    parser = argparse.ArgumentParser(description="Compare billed revenue with a pricing policy over past bookings.")
+    parser.add_argument('--start', default=(today - timedelta(days=90)).isoformat(), help="first day, YYYY-MM-DD")
+    parser.add_argument('--end', default=today.isoformat(), help="last day, YYYY-MM-DD")
+    parser.add_argument('--policy', help="JSON pricing policy to try instead of the live one")
+    args = parser.parse_args()
+    init_db()
+    started = time.perf_counter()
+    lots = reprice_bookings(args.start, args.end, load_policy(args.policy) if args.policy else None)
+    elapsed = time.perf_counter() - started
+    for lot in lots:
+        print(f"{lot['lot_id']:>6} {lot['lot_name'][:30]:<30} {lot['bookings']:>8} bookings  "
+              f"billed {lot['billed']:>12.2f}  repriced {lot['repriced']:>12.2f}  "
+              f"delta {lot['repriced'] - lot['billed']:>+12.2f}")
+    bookings = sum(lot['bookings'] for lot in lots)
+    billed = sum(lot['billed'] for lot in lots)
+    repriced = sum(lot['repriced'] for lot in lots)
+    print(f"[✓] {bookings} bookings in {len(lots)} lots from {args.start} to {args.end} in {elapsed:.2f}s: "
+          f"billed {billed:.2f}, repriced {repriced:.2f} ({repriced - billed:+.2f})")
@@ -1,22 +1,50 @@
-import sqlite3
+from models.parking_model import DATABASE, connect
+from models.storage import get_backend
 
-DATABASE = 'models/database.db'
+def restart_ids(conn, table):
+    # New rows are numbered from 1 again
+    if get_backend(DATABASE).name == 'postgresql':
+        conn.execute(f"ALTER TABLE {table} ALTER COLUMN id RESTART")
+    else:
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
 
 def reset_parking_tables():
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
+    conn = connect()
+
+    # Ids start over below, so everything keyed by a lot, spot or booking id
+    # goes too: a new lot must not inherit an old lot's reservations, rollups
+    # or processed gate events
+    print("[*] Resetting gate_event_log...")
+    conn.execute("DELETE FROM gate_event_log")
+
+    print("[*] Resetting advance_reservation...")
+    conn.execute("DELETE FROM advance_reservation")
+    restart_ids(conn, 'advance_reservation')
 
     print("[*] Resetting reserve_parking_spot...")
-    cursor.execute("DELETE FROM reserve_parking_spot")
-    cursor.execute("DELETE FROM sqlite_sequence WHERE name='reserve_parking_spot'")
+    conn.execute("DELETE FROM reserve_parking_spot")
+    restart_ids(conn, 'reserve_parking_spot')
+
+    print("[*] Dropping booking archive partitions...")
+    for (name,) in conn.execute("SELECT name FROM booking_archive_partition").fetchall():
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+    conn.execute("DELETE FROM booking_archive_partition")
+
+    print("[*] Resetting usage rollups...")
+    for table in ('lot_usage_hourly', 'lot_usage_daily', 'user_lot_usage_daily'):
+        conn.execute(f"DELETE FROM {table}")
 
     print("[*] Resetting parking_spot...")
-    cursor.execute("DELETE FROM parking_spot")
-    cursor.execute("DELETE FROM sqlite_sequence WHERE name='parking_spot'")
+    conn.execute("DELETE FROM parking_spot")
+    restart_ids(conn, 'parking_spot')
 
     print("[*] Resetting parking_lot...")
-    cursor.execute("DELETE FROM parking_lot")
-    cursor.execute("DELETE FROM sqlite_sequence WHERE name='parking_lot'")
+    conn.execute("DELETE FROM parking_lot")
+    conn.execute("DELETE FROM lot_availability")
+    restart_ids(conn, 'parking_lot')
+
+    # Workers drop their cached lot reads on the next request
+    conn.execute("UPDATE lot_data_version SET version = version + 1 WHERE id = 1")
 
     conn.commit()
     conn.close()
@@ -0,0 +1,359 @@
+import functools
+import os
+import re
+import sqlite3
+import threading
+
+from models.instrumentation import InstrumentedConnection, count_rows, statement_timer
+
+# DATABASE is either a SQLite file path or a postgresql:// URL; the model layer
+# talks to both through the sqlite3 connection API (execute, executemany,
+# cursor, commit, rollback, close, lastrowid, rowcount, rows by name or index)
+
+# SQLite connection tuning, overridable per deployment
+JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 0))
+
+# PostgreSQL connection pool per worker process
+PG_POOL_MIN_SIZE = int(os.environ.get('PG_POOL_MIN_SIZE', 1))
+PG_POOL_MAX_SIZE = int(os.environ.get('PG_POOL_MAX_SIZE', 10))
+PG_POOL_TIMEOUT = float(os.environ.get('PG_POOL_TIMEOUT', 30))
+
+class SQLiteBackend:
+    name = 'sqlite'
+    # Writers are serialised by BEGIN IMMEDIATE, so there is nothing to skip
+    skip_locked = ''
+    OperationalError = sqlite3.OperationalError
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT / 1000, factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT}')
+        if JOURNAL_MODE:
+            conn.execute(f'PRAGMA journal_mode = {JOURNAL_MODE}')
+        if SYNCHRONOUS:
+            conn.execute(f'PRAGMA synchronous = {SYNCHRONOUS}')
+        if MMAP_SIZE:
+            conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        return conn
+
+    def get_schema_version(self, conn):
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_schema_version(self, conn, version):
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+
+    def pool_stats(self):
+        # Every connection is opened and closed directly
+        return {}
+
+    def close(self):
+        pass
+
+class PostgresBackend:
+    name = 'postgresql'
+    # Concurrent bookings claim different free spots instead of queueing on
+    # the first one
+    skip_locked = 'FOR UPDATE SKIP LOCKED'
+
+    def __init__(self, url):
+        import psycopg
+        self.url = url
+        self.OperationalError = psycopg.OperationalError
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # A pool inherited across fork (gunicorn preload) shares sockets with
+        # the parent, so each process opens its own
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                import psycopg
+                from psycopg_pool import ConnectionPool
+                self._pool = ConnectionPool(self.url, min_size=PG_POOL_MIN_SIZE, max_size=PG_POOL_MAX_SIZE,
+                                            timeout=PG_POOL_TIMEOUT, open=True,
+                                            kwargs={'autocommit': True, 'cursor_factory': psycopg.ClientCursor})
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def connect(self):
+        pool = self._get_pool()
+        return PostgresConnection(pool, pool.getconn())
+
+    def get_schema_version(self, conn):
+        row = conn.execute("SELECT to_regclass('schema_version') IS NOT NULL").fetchone()
+        if not row[0]:
+            return 0
+        row = conn.execute('SELECT version FROM schema_version WHERE id = 1').fetchone()
+        return row[0] if row else 0
+
+    def set_schema_version(self, conn, version):
+        conn.execute('''
+            INSERT INTO schema_version (id, version) VALUES (1, ?)
+            ON CONFLICT (id) DO UPDATE SET version = excluded.version
+        ''', (int(version),))
+
+    def pool_stats(self):
+        return self._get_pool().get_stats()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.close()
+            self._pool = None
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(database):
+    with _backends_lock:
+        backend = _backends.get(database)
+        if backend is None:
+            if database.startswith(('postgresql://', 'postgres://')):
+                backend = PostgresBackend(database)
+            else:
+                backend = SQLiteBackend(database)
+            _backends[database] = backend
+        return backend
+
+def connect(database):
+    return get_backend(database).connect()
+
+class Row:
+    # sqlite3.Row look-alike: index by position or column name, dict(row) works
+    __slots__ = ('_columns', '_values')
+
+    def __init__(self, columns, values):
+        self._columns = columns
+        self._values = values
+
+    def keys(self):
+        return list(self._columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._values[self._columns[key]]
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        return isinstance(other, Row) and self._values == other._values
+
+    def __hash__(self):
+        return hash(self._values)
+
+    def __repr__(self):
+        return f'<Row {dict(zip(self._columns, self._values))}>'
+
+def _row_factory(cursor):
+    columns = {}
+    for index, column in enumerate(cursor.description or ()):
+        columns.setdefault(column.name, index)
+    return lambda values: Row(columns, tuple(values))
+
+# Tables whose inserts report the new id through lastrowid
+SERIAL_TABLES = {'users', 'parking_lot', 'parking_spot', 'reserve_parking_spot', 'advance_reservation'}
+SERIAL_KEYS = {'users': 'user_id'}
+
+_WRITE_STATEMENT = re.compile(r'^\s*(?:INSERT|UPDATE|DELETE|REPLACE)\b|^\s*WITH\b.*\b(?:INSERT|UPDATE|DELETE)\b',
+                              re.IGNORECASE | re.DOTALL)
+_INSERT_INTO = re.compile(r'^\s*INSERT\s+INTO\s+(\w+)', re.IGNORECASE)
+_DATE_FUNCTION = re.compile(r'\b(datetime|date|julianday|strftime)\s*\(', re.IGNORECASE)
+_GLOB = re.compile(r"\bGLOB\s*'((?:[^']|'')*)'", re.IGNORECASE)
+_MIN_MAX = re.compile(r'\b(MAX|MIN)\s*\(', re.IGNORECASE)
+_COLUMN_TYPES = [(re.compile(r'\bDATETIME\b', re.IGNORECASE), 'TEXT'),
+                 (re.compile(r'\bREAL\b', re.IGNORECASE), 'DOUBLE PRECISION'),
+                 (re.compile(r'\bBOOLEAN\b', re.IGNORECASE), 'INTEGER')]
+
+def _split_literals(sql):
+    # Alternating code and '...' literal segments, so rewrites skip literals
+    return re.split(r"('(?:[^']|'')*')", sql)
+
+def _glob_to_regex(match):
+    # GLOB is anchored and case sensitive; ~ is a case-sensitive regex match
+    pattern = match.group(1)
+    regex = ''.join('.*' if char == '*' else '.' if char == '?' else
+                    char if char in '[]^-' or char.isalnum() else '\\' + char for char in pattern)
+    return f"~ '^{regex}$'"
+
+def _scalar_min_max(sql):
+    # SQLite's two-argument MAX/MIN are GREATEST/LEAST in PostgreSQL; the
+    # one-argument aggregates are left alone
+    for match in reversed(list(_MIN_MAX.finditer(sql))):
+        depth, quoted, commas = 0, False, 0
+        for char in sql[match.end():]:
+            if char == "'":
+                quoted = not quoted
+            elif quoted:
+                continue
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                if depth == 0:
+                    break
+                depth -= 1
+            elif char == ',' and depth == 0:
+                commas += 1
+        if commas:
+            name = 'GREATEST' if match.group(1).upper() == 'MAX' else 'LEAST'
+            sql = sql[:match.start()] + name + '(' + sql[match.end():]
+    return sql
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql, returning=True):
+    # Rewrites the SQLite dialect the model uses into PostgreSQL. Returns the
+    # statement and whether it was extended with RETURNING for lastrowid.
+    segments = _split_literals(_GLOB.sub(_glob_to_regex, sql))
+    for i in range(0, len(segments), 2):
+        code = segments[i]
+        code = code.replace('%', '%%').replace('?', '%s')
+        code = _DATE_FUNCTION.sub(lambda m: f'sqlite_{m.group(1).lower()}(', code)
+        # instr(haystack, needle) is strpos in PostgreSQL, 1-based, 0 when absent
+        code = re.sub(r'\binstr\s*\(', 'strpos(', code, flags=re.IGNORECASE)
+        code = re.sub(r'\bBEGIN\s+IMMEDIATE\b', 'BEGIN', code, flags=re.IGNORECASE)
+        code = re.sub(r'\btemp\.', 'pg_temp.', code, flags=re.IGNORECASE)
+        segments[i] = code
+    for i in range(1, len(segments), 2):
+        segments[i] = segments[i].replace('%', '%%')
+    statement = _scalar_min_max(''.join(segments))
+
+    if re.match(r'\s*CREATE\s+(?:TEMP\s+|TEMPORARY\s+)?TABLE\b', statement, re.IGNORECASE):
+        for pattern, replacement in _COLUMN_TYPES:
+            statement = pattern.sub(replacement, statement)
+
+    ignore = re.match(r'\s*INSERT\s+OR\s+IGNORE\s+INTO\b', statement, re.IGNORECASE)
+    if ignore:
+        statement = 'INSERT INTO' + statement[ignore.end():]
+    returning_clause = re.search(r'\bRETURNING\b', statement, re.IGNORECASE)
+    insert = _INSERT_INTO.match(statement)
+    returns_id = False
+    if ignore:
+        tail = ' ON CONFLICT DO NOTHING '
+        statement = (statement[:returning_clause.start()] + tail + statement[returning_clause.start():]
+                     if returning_clause else statement.rstrip().rstrip(';') + tail)
+    elif (returning and insert and not returning_clause and insert.group(1) in SERIAL_TABLES
+          and 'ON CONFLICT' not in statement.upper()):
+        statement = statement.rstrip().rstrip(';') + f' RETURNING {SERIAL_KEYS.get(insert.group(1), "id")}'
+        returns_id = True
+    return statement, returns_id
+
+class PostgresCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.raw.cursor(row_factory=_row_factory)
+        self.lastrowid = None
+        self.function = '-'
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _begin_if_needed(self, statement):
+        # Like sqlite3: data changes open a transaction that lasts until
+        # commit(); reads and DDL outside one run in autocommit
+        if not self.connection.in_transaction and _WRITE_STATEMENT.match(statement):
+            self.connection.raw.execute('BEGIN')
+
+    def execute(self, sql, parameters=()):
+        statement, returns_id = translate(sql)
+        with statement_timer(sql) as function:
+            self.function = function
+            self._begin_if_needed(statement)
+            self._cursor.execute(statement, tuple(parameters))
+        if returns_id:
+            rows = self._cursor.fetchall()
+            self.lastrowid = rows[-1][0] if rows else None
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # lastrowid is undefined after executemany, as in sqlite3
+        statement, _ = translate(sql, returning=False)
+        with statement_timer(sql) as function:
+            self.function = function
+            self._begin_if_needed(statement)
+            self._cursor.executemany(statement, [tuple(parameters) for parameters in seq_of_parameters])
+        return self
+
+    def fetchone(self):
+        if self._cursor.description is None:
+            return None
+        row = self._cursor.fetchone()
+        if row is not None:
+            count_rows(self.function, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        if self._cursor.description is None:
+            return []
+        rows = self._cursor.fetchmany(size or 1)
+        count_rows(self.function, len(rows))
+        return rows
+
+    def fetchall(self):
+        if self._cursor.description is None:
+            return []
+        rows = self._cursor.fetchall()
+        count_rows(self.function, len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+class PostgresConnection:
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self.raw = raw
+
+    @property
+    def in_transaction(self):
+        import psycopg
+        return self.raw.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+
+    def cursor(self):
+        return PostgresCursor(self)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql):
+        # Runs PostgreSQL DDL as is, without the SQLite translation
+        self.raw.execute(sql)
+
+    def commit(self):
+        if self.in_transaction:
+            self.raw.execute('COMMIT')
+
+    def rollback(self):
+        if self.in_transaction:
+            self.raw.execute('ROLLBACK')
+
+    def close(self):
+        # Back to the pool; like sqlite3, uncommitted changes are discarded
+        if self.raw is None:
+            return
+        try:
+            self.rollback()
+        finally:
+            self._pool.putconn(self.raw)
+            self.raw = None